@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from file_lock import atomic_write
+
+# Ограничения размера кэша (по размеру результатов в JSON), байт
+MEMORY_LIMIT = 8 * 1024 * 1024
+DISK_LIMIT = 64 * 1024 * 1024
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def iter_normalized(chunks):
+    """Приводит текст, поданный кусками, к нижнему регистру и схлопывает пробельные символы
+
+    Пробелы в начале и в конце текста отбрасываются; результат не зависит от того,
+    как текст разбит на куски."""
+    started = False
+    pending_space = False
+    for chunk in chunks:
+        text = WHITESPACE_RE.sub(" ", chunk.lower())
+        core = text.strip(" ")
+        if not core:
+            pending_space = pending_space or bool(text)
+            continue
+        if started and (pending_space or text[0] == " "):
+            core = " " + core
+        yield core
+        started = True
+        pending_space = text[-1] == " "
+
+
+class NormalizedText:
+    """Нормализует куски текста (см. iter_normalized) и одновременно считает хэш результата"""
+
+    def __init__(self):
+        self._digest = hashlib.sha256()
+
+    def feed(self, chunks):
+        for chunk in iter_normalized(chunks):
+            self._digest.update(chunk.encode("utf-8"))
+            yield chunk
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+
+class AnalysisCache:
+    """LRU-кэш результатов анализа в памяти и, если указана папка, на диске
+
+    Ключ строится из хэша нормализованного текста, режима поиска и отпечатка базы
+    знаний (make_key), поэтому изменение базы делает старые записи недостижимыми, а
+    invalidate() удаляет их. Размер записей оценивается по длине их JSON; при
+    превышении лимита вытесняются давно не использованные записи."""
+
+    def __init__(self, max_bytes=MEMORY_LIMIT, disk_dir=None, disk_max_bytes=DISK_LIMIT):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._lock = threading.Lock()
+        # Ключ -> (результат, размер), от давно использованных к недавним
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Записи на диске: ключ -> размер; читается при первом обращении
+        self._disk_entries = None
+        self._disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(text_digest, mode, kb_fingerprint):
+        return f"{kb_fingerprint[:16]}-{mode}-{text_digest}"
+
+    def get(self, key):
+        """Возвращает результат анализа по ключу или None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            value = self._disk_get(key)
+            if value is not None:
+                self.disk_hits += 1
+                self._memory_put(key, value, len(json.dumps(value, ensure_ascii=False)))
+                return value
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Сохраняет результат анализа (словарь, сериализуемый в JSON)"""
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._memory_put(key, value, len(data))
+            self._disk_put(key, data)
+
+    def _memory_put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    # Кэш на диске
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key + ".json")
+
+    def _load_disk_entries(self):
+        if self._disk_entries is not None:
+            return self._disk_entries
+        self._disk_entries = OrderedDict()
+        self._disk_bytes = 0
+        os.makedirs(self.disk_dir, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                files.append((stat.st_mtime_ns, entry.name[:-len(".json")], stat.st_size))
+        # Порядок вытеснения - по времени последнего использования
+        for _, key, size in sorted(files):
+            self._disk_entries[key] = size
+            self._disk_bytes += size
+        return self._disk_entries
+
+    def _disk_get(self, key):
+        if not self.disk_dir or key not in self._load_disk_entries():
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(path)
+        except (OSError, json.JSONDecodeError):
+            self._disk_bytes -= self._disk_entries.pop(key)
+            return None
+        self._disk_entries.move_to_end(key)
+        return value
+
+    def _disk_put(self, key, data):
+        if not self.disk_dir:
+            return
+        entries = self._load_disk_entries()
+        try:
+            atomic_write(self._disk_path(key), lambda f: f.write(data))
+        except OSError as e:
+            print(f"Ошибка при сохранении кэша анализа: {e}")
+            return
+        size = len(data.encode("utf-8"))
+        self._disk_bytes += size - entries.pop(key, 0)
+        entries[key] = size
+        while self._disk_bytes > self.disk_max_bytes and len(entries) > 1:
+            evicted_key, evicted_size = entries.popitem(last=False)
+            self._disk_bytes -= evicted_size
+            self.evictions += 1
+            self._remove_disk_file(evicted_key)
+
+    def _remove_disk_file(self, key):
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+    # Управление
+
+    def invalidate(self, kb_fingerprint=None):
+        """Удаляет записи, построенные по другой базе знаний (или все записи, если отпечаток не указан)"""
+        prefix = kb_fingerprint[:16] + "-" if kb_fingerprint else None
+        with self._lock:
+            for key in [key for key in self._entries if not prefix or not key.startswith(prefix)]:
+                self._bytes -= self._entries.pop(key)[1]
+            if self.disk_dir:
+                entries = self._load_disk_entries()
+                for key in [key for key in entries if not prefix or not key.startswith(prefix)]:
+                    self._disk_bytes -= entries.pop(key)
+                    self._remove_disk_file(key)
+
+    def stats(self):
+        """Возвращает число попаданий и промахов, вытеснений и занятый объем"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "disk_entries": len(self._disk_entries) if self._disk_entries is not None else None,
+                "disk_bytes": self._disk_bytes
+            }
@@ -1,32 +1,36 @@
 from datetime import datetime, timedelta
 
+from instrumentation import timed
+
+# Целевой mastery темы в плане занятий, %
+TARGET_MASTERY = 80
+
 class Analytics:
     def __init__(self, progress_manager):
         self.progress_manager = progress_manager
     
+    @timed("analytics.get_weekly_report")
     def get_weekly_report(self):
         """Генерирует недельный отчет"""
         week_ago = datetime.now() - timedelta(days=7)
-        recent_sessions = []
-        
-        for session in self.progress_manager.progress_data["sessions"]:
-            session_date = datetime.fromisoformat(session["date"])
-            if session_date >= week_ago:
-                recent_sessions.append(session)
         
         # Анализ активных тем
-        topic_activity = {}
-        for session in recent_sessions:
-            for topic in session["found_topics"]:
-                topic_activity[topic] = topic_activity.get(topic, 0) + 1
+        sessions_count, topic_activity = self.progress_manager.get_recent_activity(week_ago)
         
         return {
-            "sessions_count": len(recent_sessions),
+            "sessions_count": sessions_count,
             "active_topics": len(topic_activity),
             "most_problematic_topics": sorted(topic_activity.items(), key=lambda x: x[1], reverse=True)[:3],
             "total_topics_worked": self.progress_manager.progress_data["statistics"]["topics_worked"]
         }
     
+    def get_weekly_plan(self, now=None):
+        """Составляет план на неделю по срокам повторения тем (см. repetition_scheduler)
+
+        Возвращает список словарей с ключами day, date, topic (None - повторение), mastery и due."""
+        with self.progress_manager.lock:
+            return self.progress_manager.get_scheduler().plan(now)
+    
     def get_recommendations(self):
         """Выдает рекомендации для ученика"""
         weak_topics = self.progress_manager.get_weak_topics()
@@ -44,10 +48,8 @@ class Analytics:
         
         # Рекомендация по частоте занятий
         if summary["total_sessions"] > 5:
-            last_session_date = datetime.fromisoformat(
-                self.progress_manager.progress_data["sessions"][-1]["date"]
-            )
-            days_since_last = (datetime.now() - last_session_date).days
+            last_session_date = self.progress_manager.get_last_session_date()
+            days_since_last = (datetime.now() - last_session_date).days if last_session_date else 0
             
             if days_since_last > 7:
                 recommendations.append("⏰ Вы не занимались больше недели. Рекомендуем регулярные тренировки!")
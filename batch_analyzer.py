@@ -0,0 +1,208 @@
+"""Пакетный анализ сохраненных работ учеников без графического интерфейса
+
+Работы, уже учтенные в прогрессе ученика (при прошлом запуске или при анализе в
+приложении), пропускаются по отметкам progress_data["processed_works"], поэтому
+повторный запуск не удваивает сессии.
+
+Пример запуска:
+    python batch_analyzer.py --workers 4 --chunk-size 64
+    python batch_analyzer.py old_works_folder --work-type homework
+"""
+import argparse
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import nullcontext
+from datetime import datetime
+
+from knowledge_base import analyze_stream, get_tasks_for_topics
+from progress_records import remember_tasks
+from student_progress import StudentProgress
+from work_store import LEGACY_WORK_FILE_RE, WorkStore, get_default_work_store
+
+# Из текста работы в сессию попадает только начало (см. progress_records.session_record)
+EXCERPT_LENGTH = 101
+
+
+def iter_work_files(folder, work_type=None):
+    """Перебирает файлы работ в папке, не составляя полный список заранее
+
+    Элементы - (путь к файлу, ученик, дата, отметка работы); отметка файла - его дата."""
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            match = LEGACY_WORK_FILE_RE.match(entry.name)
+            if not match or (work_type is not None and match.group("work_type") != work_type):
+                continue
+            try:
+                date = datetime.strptime(match.group("date"), "%Y%m%d_%H%M%S")
+            except ValueError:
+                continue
+            yield entry.path, match.group("student"), date, {"file_date": date.isoformat()}
+
+
+def iter_store_works(store, work_type=None):
+    """Перебирает сдачи из хранилища работ по индексам учеников; отметка сдачи - ее номер"""
+    for entry in store.iter_all_works():
+        if work_type is None or entry["work_type"] == work_type:
+            yield entry["hash"], entry["student"], datetime.fromisoformat(entry["date"]), {"id": entry["id"]}
+
+
+def is_processed(processed_works, work):
+    """Проверяет, что работа уже учтена в сессиях ученика (ее отметка не больше сохраненной)"""
+    return all(processed_works.get(key) is not None and value <= processed_works[key]
+               for key, value in work.items())
+
+
+# Хранилища работ, открытые в процессе-исполнителе, по папкам
+_worker_stores = {}
+
+
+def _open_work(source, store_root):
+    """Открывает работу для чтения по частям: файл или блоб хранилища работ"""
+    if store_root is None:
+        return open(source, 'r', encoding='utf-8')
+    if store_root not in _worker_stores:
+        _worker_stores[store_root] = WorkStore(store_root)
+    return nullcontext(_worker_stores[store_root].iter_text(source))
+
+
+def iter_chunks(items, chunk_size):
+    """Группирует элементы в пачки по chunk_size"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def analyze_chunk(chunk, mode=None, store_root=None):
+    """Анализирует пачку работ в процессе-исполнителе
+
+    Элементы пачки - (путь к файлу или хэш работы в хранилище store_root, ученик, дата, отметка).
+    Возвращает список кортежей (ученик, дата, начало текста, найденные темы, отметка)."""
+    results = []
+    # Одинаковые тексты в хранилище имеют один хэш и анализируются один раз
+    analyzed = {}
+    for source, student_name, date, work in chunk:
+        analysis = analyzed.get(source)
+        if analysis is None:
+            try:
+                # Работа читается по частям, поэтому большие работы не загружаются в память целиком
+                with _open_work(source, store_root) as stream:
+                    analysis = analyze_stream(stream, mode, excerpt_length=EXCERPT_LENGTH)
+            except (OSError, UnicodeDecodeError, KeyError) as e:
+                print(f"Ошибка при чтении работы {source}: {e}")
+                continue
+            analyzed[source] = analysis
+        results.append((student_name, date, analysis["excerpt"], analysis["topics"], work))
+    return results
+
+
+def run_batch(folder=None, workers=None, chunk_size=64, work_type=None, mode=None, store=None, work_store=None):
+    """Анализирует все работы и сохраняет сессии учеников
+
+    folder - папка с работами в отдельных файлах старого формата; по умолчанию
+    работы берутся из хранилища работ. store и work_store - хранилища прогресса
+    и работ (по умолчанию - хранилища приложения).
+
+    Возвращает словарь со статистикой: число файлов, пропущенных (уже учтенных) работ,
+    учеников и файлов в секунду."""
+    started = time.perf_counter()
+    results_by_student = {}
+    progress_by_student = {}
+    files_count = 0
+    skipped_count = 0
+
+    def pending_works(items):
+        """Отбрасывает работы, уже учтенные в прогрессе учеников"""
+        nonlocal skipped_count
+        for item in items:
+            student_name, work = item[1], item[3]
+            progress = progress_by_student.get(student_name)
+            if progress is None:
+                progress = progress_by_student[student_name] = StudentProgress(student_name, store=store,
+                                                                               work_store=work_store)
+            if is_processed(progress.get_processed_works(), work):
+                skipped_count += 1
+                continue
+            yield item
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Ограничиваем число пачек в работе, чтобы не читать всю папку заранее
+        max_pending = workers * 2
+        pending = set()
+
+        def collect(done):
+            nonlocal files_count
+            for future in done:
+                for student_name, date, excerpt, found_topics, work in future.result():
+                    results_by_student.setdefault(student_name, []).append((date, excerpt, found_topics, work))
+                    files_count += 1
+
+        if folder is None:
+            work_store = work_store or get_default_work_store()
+            items, store_root = iter_store_works(work_store, work_type), work_store.root_dir
+        else:
+            items, store_root = iter_work_files(folder, work_type), None
+
+        for chunk in iter_chunks(pending_works(items), chunk_size):
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(analyze_chunk, chunk, mode, store_root))
+
+        done, _ = wait(pending)
+        collect(done)
+
+    # Одна запись в хранилище на ученика
+    for student_name, results in results_by_student.items():
+        progress = progress_by_student[student_name]
+        sessions = []
+        # Недавние задания обновляем по ходу, чтобы работы одной пачки не получали одинаковых заданий
+        recent_tasks = {topic: list(tasks) for topic, tasks in progress.progress_data["recent_tasks"].items()}
+        for date, excerpt, found_topics, work in sorted(results, key=lambda result: result[0]):
+            difficulties = {
+                topic: progress.progress_data["topics"].get(topic, {}).get("difficulty_level", "medium")
+                for topic in found_topics
+            }
+            recommended_tasks = get_tasks_for_topics(
+                [(topic, difficulties[topic]) for topic in found_topics], recent_tasks
+            )
+            remember_tasks(recent_tasks, recommended_tasks)
+            sessions.append((excerpt, found_topics, recommended_tasks, date, work))
+        progress.add_sessions(sessions)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "files": files_count,
+        "skipped": skipped_count,
+        "students": len(results_by_student),
+        "seconds": elapsed,
+        "files_per_second": files_count / elapsed if elapsed else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетный анализ сохраненных работ учеников")
+    parser.add_argument("folder", nargs="?", default=None,
+                        help="папка с работами в отдельных файлах (по умолчанию - хранилище работ)")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию - число ядер)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="число файлов в одной пачке")
+    parser.add_argument("--work-type", default=None, help="анализировать только работы этого типа (например, homework)")
+    parser.add_argument("--mode", choices=("morphology", "substring"), default=None, help="режим поиска тем")
+    args = parser.parse_args()
+
+    stats = run_batch(args.folder, args.workers, args.chunk_size, args.work_type, args.mode)
+    print(f"Обработано работ: {stats['files']}, пропущено уже учтенных: {stats['skipped']}, "
+          f"учеников: {stats['students']}")
+    print(f"Время: {stats['seconds']:.2f} с, скорость: {stats['files_per_second']:.1f} файлов/с")
+
+
+if __name__ == "__main__":
+    main()
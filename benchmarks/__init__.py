@@ -0,0 +1,4 @@
+"""Бенчмарки производительности: генераторы синтетических данных и замеры времени
+
+Запуск: python -m benchmarks.run --output bench.json
+"""
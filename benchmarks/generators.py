@@ -0,0 +1,118 @@
+"""Генераторы синтетических баз знаний, текстов работ и хранилищ прогресса"""
+import json
+import random
+from datetime import datetime, timedelta
+
+SYLLABLES = ("ка", "ро", "ни", "ме", "ла", "ту", "пе", "ст", "во", "да", "ри", "мо", "за", "би", "ле",
+             "на", "го", "ве", "ди", "са", "пра", "кон", "стр", "тель", "ние", "ость", "ить", "ать")
+ENDINGS = ("", "а", "ы", "е", "у", "ом", "ами", "ах", "ой", "ей", "ов")
+DIFFICULTIES = ("easy", "medium", "hard")
+
+
+def make_word(rng, min_syllables=2, max_syllables=4):
+    """Возвращает случайное слово, похожее на русское"""
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(min_syllables, max_syllables)))
+
+
+def generate_knowledge_base(topics=100, keywords_per_topic=10, tasks_per_level=5, seed=0):
+    """Строит базу знаний того же формата, что и KNOWLEDGE_BASE: topics тем по keywords_per_topic слов"""
+    rng = random.Random(seed)
+    knowledge_base = {}
+    used = set()
+    for index in range(topics):
+        keywords = []
+        while len(keywords) < keywords_per_topic:
+            # Часть ключевых слов - фразы из нескольких слов
+            keyword = " ".join(make_word(rng) for _ in range(rng.choice((1, 1, 1, 2))))
+            if keyword not in used:
+                used.add(keyword)
+                keywords.append(keyword)
+        knowledge_base[f"Тема {index}"] = {
+            "keywords": keywords,
+            "tasks": {
+                level: [f"Задание {level} {task} по теме {index}" for task in range(tasks_per_level)]
+                for level in DIFFICULTIES
+            },
+            "description": f"Описание темы {index}"
+        }
+    return knowledge_base
+
+
+def generate_text(knowledge_base, words=1000, keyword_rate=0.02, seed=0):
+    """Возвращает текст из words слов; доля keyword_rate слов берется из ключевых слов базы"""
+    rng = random.Random(seed)
+    keywords = [keyword for data in knowledge_base.values() for keyword in data["keywords"]]
+    parts = []
+    for _ in range(words):
+        if keywords and rng.random() < keyword_rate:
+            parts.append(rng.choice(keywords))
+        else:
+            parts.append(make_word(rng, 1, 4) + rng.choice(ENDINGS))
+        if rng.random() < 0.08:
+            parts[-1] += "."
+    return " ".join(parts)
+
+
+def generate_progress(topic_names, sessions=100, topics_per_session=3, days=90, seed=0, now=None):
+    """Строит данные одного ученика в формате progress_data"""
+    rng = random.Random(seed)
+    now = now or datetime.now()
+    progress = {
+        "topics": {},
+        "sessions": [],
+        "statistics": {"total_sessions": 0, "total_works_analyzed": 0, "topics_worked": 0}
+    }
+
+    dates = sorted(now - timedelta(seconds=rng.randint(0, days * 86400)) for _ in range(sessions))
+    for date in dates:
+        found_topics = rng.sample(topic_names, min(topics_per_session, len(topic_names)))
+        progress["sessions"].append({
+            "date": date.isoformat(),
+            "analyzed_text": make_word(rng, 10, 30)[:100],
+            "found_topics": found_topics,
+            "recommended_tasks": {topic: f"Задание по теме {topic}" for topic in found_topics}
+        })
+        progress["statistics"]["total_sessions"] += 1
+        progress["statistics"]["total_works_analyzed"] += 1
+        for topic in found_topics:
+            topic_data = progress["topics"].get(topic)
+            if topic_data is None:
+                topic_data = progress["topics"][topic] = {
+                    "first_encounter": date.isoformat(),
+                    "encounter_count": 0,
+                    "last_practiced": date.isoformat(),
+                    "difficulty_level": "medium",
+                    "mastery_score": 0
+                }
+                progress["statistics"]["topics_worked"] += 1
+            topic_data["encounter_count"] += 1
+            topic_data["last_practiced"] = date.isoformat()
+            topic_data["mastery_score"] = rng.randint(0, 100)
+            topic_data["difficulty_level"] = rng.choice(DIFFICULTIES)
+    return progress
+
+
+def generate_progress_file(path, students=100, sessions_per_student=100, topic_names=None, seed=0):
+    """Записывает общий progress.json (формат до разделения на шарды) со многими учениками"""
+    topic_names = topic_names or [f"Тема {index}" for index in range(50)]
+    all_data = {
+        f"Ученик {index}": generate_progress(topic_names, sessions_per_student, seed=seed + index)
+        for index in range(students)
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(all_data, f, ensure_ascii=False)
+    return list(all_data)
+
+
+def generate_topic_rows(students=1000, topics=100, topics_per_student=20, days=90, seed=0, now=None):
+    """Возвращает строки (ученик, тема, число встреч, последняя практика, mastery) для аналитики по классу"""
+    rng = random.Random(seed)
+    now = now or datetime.now()
+    topic_names = [f"Тема {index}" for index in range(topics)]
+    rows = []
+    for index in range(students):
+        for topic in rng.sample(topic_names, min(topics_per_student, topics)):
+            last_practiced = now - timedelta(seconds=rng.randint(0, days * 86400))
+            rows.append((f"Ученик {index}", topic, rng.randint(1, 20), last_practiced.isoformat(),
+                         rng.randint(0, 100)))
+    return rows
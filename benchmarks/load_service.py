@@ -0,0 +1,216 @@
+"""Нагрузочная проверка HTTP-сервиса (web_service.py): запросов в секунду и задержки
+
+Клиенты держат постоянные соединения и отправляют смесь запросов: анализ работы
+с сохранением в прогресс, слабые темы, статистика, недельный отчет и план.
+С --spawn сервис запускается в отдельном процессе с данными во временной папке.
+
+Пример запуска:
+    python -m benchmarks.load_service --spawn --connections 32 --requests 5000
+    python -m benchmarks.load_service --port 8080 --students 200 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+from benchmarks.generators import generate_text
+from knowledge_base import KNOWLEDGE_BASE
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEB_SERVICE = os.path.join(BASE_DIR, "web_service.py")
+
+# Доли запросов в смеси
+REQUEST_MIX = (
+    ("analyze", 0.2),
+    ("weak-topics", 0.2),
+    ("stats", 0.2),
+    ("weekly-report", 0.2),
+    ("plan", 0.2)
+)
+
+
+def percentile(values, percent):
+    """Возвращает процентиль по отсортированному списку значений"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class Connection:
+    """Постоянное соединение с сервисом"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        """Отправляет запрос; возвращает код ответа и разобранный JSON"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode("latin-1") + body)
+        await self.writer.drain()
+
+        response_head = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(response_head[0].split(" ")[1])
+        headers = {}
+        for line in response_head[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        data = json.loads(await self.reader.readexactly(int(headers.get("content-length", 0))))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, data
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+            self.reader = self.writer = None
+
+
+def make_request(rng, kind, students, texts):
+    student_name = f"Ученик {rng.randrange(students)}"
+    if kind == "analyze":
+        return "POST", "/analyze", {"student": student_name, "text": rng.choice(texts)}
+    return "GET", f"/students/{quote(student_name)}/{kind}", None
+
+
+async def run_client(client_id, host, port, queue, students, texts, latencies, errors):
+    rng = random.Random(client_id)
+    kinds, weights = zip(*REQUEST_MIX)
+    connection = Connection(host, port)
+    try:
+        while True:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            kind = rng.choices(kinds, weights)[0]
+            method, path, payload = make_request(rng, kind, students, texts)
+            started = time.perf_counter()
+            try:
+                status, _ = await connection.request(method, path, payload)
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                errors[kind] = errors.get(kind, 0) + 1
+                print(f"Ошибка запроса {kind}: {e}")
+                await connection.close()
+                continue
+            latencies.setdefault(kind, []).append(time.perf_counter() - started)
+            if status != 200:
+                errors[kind] = errors.get(kind, 0) + 1
+    finally:
+        await connection.close()
+
+
+async def run_load(host, port, connections, requests, students, texts):
+    """Отправляет requests запросов через connections соединений; возвращает результаты"""
+    queue = asyncio.Queue()
+    for index in range(requests):
+        queue.put_nowait(index)
+    latencies = {}
+    errors = {}
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_client(client_id, host, port, queue, students, texts, latencies, errors)
+        for client_id in range(connections)
+    ))
+    elapsed = time.perf_counter() - started
+
+    def summarize(values):
+        values = sorted(values)
+        return {
+            "count": len(values),
+            "mean": statistics.mean(values) if values else 0.0,
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90),
+            "p99": percentile(values, 99),
+            "max": values[-1] if values else 0.0
+        }
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "connections": connections,
+        "requests": len(all_latencies),
+        "errors": errors,
+        "seconds": elapsed,
+        "requests_per_second": len(all_latencies) / elapsed if elapsed else 0.0,
+        "total": summarize(all_latencies),
+        "endpoints": {kind: summarize(values) for kind, values in sorted(latencies.items())}
+    }
+
+
+async def wait_for_service(host, port, timeout=30):
+    """Ждет, пока сервис начнет отвечать на /health"""
+    deadline = time.monotonic() + timeout
+    while True:
+        connection = Connection(host, port)
+        try:
+            status, _ = await connection.request("GET", "/health")
+            if status == 200:
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+        finally:
+            await connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочная проверка HTTP-сервиса School Helper")
+    parser.add_argument("--host", default="127.0.0.1", help="адрес сервиса")
+    parser.add_argument("--port", type=int, default=8080, help="порт сервиса")
+    parser.add_argument("--spawn", action="store_true",
+                        help="запустить сервис в отдельном процессе с данными во временной папке")
+    parser.add_argument("--connections", type=int, default=32, help="число одновременных соединений")
+    parser.add_argument("--requests", type=int, default=2000, help="общее число запросов")
+    parser.add_argument("--students", type=int, default=50, help="число разных учеников в запросах")
+    parser.add_argument("--words", type=int, default=300, help="число слов в тексте работы")
+    parser.add_argument("--output", help="файл для результатов в JSON")
+    args = parser.parse_args()
+
+    texts = [generate_text(KNOWLEDGE_BASE, args.words, seed=seed) for seed in range(20)]
+
+    process = None
+    with tempfile.TemporaryDirectory() as data_dir:
+        if args.spawn:
+            process = subprocess.Popen([sys.executable, WEB_SERVICE, "--host", args.host, "--port", str(args.port),
+                                        "--data-dir", data_dir], cwd=BASE_DIR)
+        try:
+            asyncio.run(wait_for_service(args.host, args.port))
+            results = asyncio.run(run_load(args.host, args.port, args.connections, args.requests,
+                                           args.students, texts))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+
+    print(f"Запросов: {results['requests']}, ошибок: {sum(results['errors'].values())}, "
+          f"время: {results['seconds']:.2f} с")
+    print(f"Скорость: {results['requests_per_second']:.1f} запросов/с")
+    print(f"{'запрос':<15} {'число':>7} {'p50':>9} {'p90':>9} {'p99':>9} {'макс':>9}")
+    for kind, timing in list(results["endpoints"].items()) + [("всего", results["total"])]:
+        print(f"{kind:<15} {timing['count']:>7} " + " ".join(
+            f"{timing[key] * 1000:>9.2f}" for key in ("p50", "p90", "p99", "max")
+        ))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""Замеры производительности основных операций с результатами в JSON
+
+Пример запуска:
+    python -m benchmarks.run --topics 500 --keywords 20 --students 200 --output bench.json
+    python -m benchmarks.run --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import cohort_analytics
+import instrumentation
+import knowledge_base
+import repetition_scheduler
+import session_archive
+from analytics import Analytics
+from keyword_matcher import KeywordMatcher
+from mastery_history import MasteryHistory
+from morphology import TokenIndex
+from benchmarks.generators import (generate_knowledge_base, generate_progress, generate_progress_file,
+                                   generate_text, generate_topic_rows)
+from progress_store import ShardedProgressStore
+from student_progress import StudentProgress
+from work_store import WorkStore
+
+
+def measure(func, repeat=5, number=1):
+    """Выполняет func number раз в каждом из repeat замеров; возвращает время одного вызова в секундах"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started) / number)
+    return {
+        "repeat": repeat,
+        "number": number,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "max": max(timings)
+    }
+
+
+@contextmanager
+def use_knowledge_base(kb):
+    """Временно подменяет базу знаний"""
+    original = knowledge_base.KNOWLEDGE_BASE
+    knowledge_base.KNOWLEDGE_BASE = kb
+    try:
+        yield
+    finally:
+        knowledge_base.KNOWLEDGE_BASE = original
+
+
+def make_store(backend, root_dir, legacy_file):
+    """Создает хранилище указанного типа и переносит в него синтетический progress.json"""
+    if backend == "sqlite":
+        from sqlite_store import SQLiteProgressStore
+        store = SQLiteProgressStore(os.path.join(root_dir, "progress.sqlite3"))
+        store.import_students(ShardedProgressStore(os.path.join(root_dir, "shards"), legacy_file).iter_students())
+        return store
+    return ShardedProgressStore(os.path.join(root_dir, "shards"), legacy_file)
+
+
+def bench_keywords(args, results):
+    kb = generate_knowledge_base(args.topics, args.keywords, seed=args.seed)
+    text = generate_text(kb, args.words, seed=args.seed)
+
+    with use_knowledge_base(kb):
+        patterns = [(keyword, topic) for topic, data in kb.items() for keyword in data["keywords"]]
+        results["TokenIndex.build"] = measure(lambda: TokenIndex(patterns), repeat=args.repeat)
+        results["KeywordMatcher.build"] = measure(lambda: KeywordMatcher(patterns), repeat=args.repeat)
+        for mode in (knowledge_base.MATCH_MODE_MORPHOLOGY, knowledge_base.MATCH_MODE_SUBSTRING):
+            knowledge_base.get_topics_by_keywords(text, mode)
+            results[f"get_topics_by_keywords[{mode}]"] = measure(
+                lambda: knowledge_base.get_topics_by_keywords(text, mode), repeat=args.repeat
+            )
+            results[f"analyze_stream[{mode}]"] = measure(
+                lambda: knowledge_base.analyze_stream(text, mode, use_cache=False), repeat=args.repeat
+            )
+            # Повторный анализ того же текста: хэш текста и результат из кэша
+            results[f"analyze_stream[{mode}, cached]"] = measure(
+                lambda: knowledge_base.analyze_stream(text, mode), repeat=args.repeat
+            )
+
+
+def bench_progress(args, results):
+    with tempfile.TemporaryDirectory() as root_dir:
+        legacy_file = os.path.join(root_dir, "progress.json")
+        students = generate_progress_file(legacy_file, args.students, args.sessions, seed=args.seed)
+        store = make_store(args.backend, root_dir, legacy_file)
+        student_name = students[len(students) // 2]
+        progress = StudentProgress(student_name, store=store)
+        analytics = Analytics(progress)
+
+        results["StudentProgress.load_progress"] = measure(progress.load_progress, repeat=args.repeat)
+        results["StudentProgress.save_progress"] = measure(progress.save_progress, repeat=args.repeat)
+        results["StudentProgress.add_session"] = measure(
+            lambda: progress.add_session("синтетический текст работы", ["Тема 1", "Тема 2"], {"Тема 1": "Задание"}),
+            repeat=args.repeat, number=10
+        )
+        results["Analytics.get_weekly_report"] = measure(analytics.get_weekly_report, repeat=args.repeat, number=10)
+        results["StudentProgress.get_weak_topics"] = measure(progress.get_weak_topics, repeat=args.repeat, number=10)
+        results["Analytics.get_weekly_plan"] = measure(analytics.get_weekly_plan, repeat=args.repeat, number=10)
+        # Планы всех учеников за один проход по хранилищу
+        results["repetition_scheduler.iter_plans"] = measure(
+            lambda: sum(1 for _ in repetition_scheduler.iter_plans(store)), repeat=args.repeat
+        )
+
+
+def bench_works(args, results):
+    kb = generate_knowledge_base(args.topics, args.keywords, seed=args.seed)
+    texts = [generate_text(kb, 500, seed=args.seed + index) for index in range(20)]
+    with tempfile.TemporaryDirectory() as root_dir:
+        store = WorkStore(root_dir)
+        counter = iter(range(10 ** 9))
+        # Тексты повторяются по кругу, поэтому большинство сдач - повторные (проверка дедупликации)
+        results["WorkStore.put"] = measure(
+            lambda: store.put("Ученик", texts[next(counter) % len(texts)]), repeat=args.repeat, number=100
+        )
+        results["WorkStore.list_works"] = measure(lambda: store.list_works("Ученик"), repeat=args.repeat)
+        digest = store.list_works("Ученик")[-1]["hash"]
+        results["WorkStore.read_text"] = measure(lambda: store.read_text(digest), repeat=args.repeat, number=10)
+
+
+def bench_scheduler(args, results):
+    # Изменение срока одной темы в очереди из cohort_topics тем
+    rows = [(f"Тема {index}", index * 10 ** 9, index % 100) for index in range(args.cohort_topics)]
+    scheduler = repetition_scheduler.RepetitionScheduler.from_rows(rows)
+    counter = iter(range(10 ** 9))
+    results["RepetitionScheduler.from_rows"] = measure(
+        lambda: repetition_scheduler.RepetitionScheduler.from_rows(rows), repeat=args.repeat
+    )
+    results["RepetitionScheduler.schedule"] = measure(
+        lambda: scheduler.schedule(f"Тема {next(counter) % len(rows)}", next(counter) * 10 ** 6, 50),
+        repeat=args.repeat, number=1000
+    )
+    results["RepetitionScheduler.plan"] = measure(scheduler.plan, repeat=args.repeat, number=100)
+
+
+def bench_history(args, results):
+    # История 50 тем: оценка каждые 2 часа в течение двух лет, старые точки прорежены
+    now = datetime.now()
+    start = now - timedelta(days=730)
+    evaluations = [(f"Тема {index % 50}", start + timedelta(hours=2 * index), index % 100)
+                   for index in range(730 * 12)]
+
+    def build():
+        history = MasteryHistory()
+        for topic, date, mastery_score in evaluations:
+            history.add(topic, date, mastery_score)
+        return history
+
+    results["MasteryHistory.add[x8760]"] = measure(build, repeat=args.repeat)
+    history = build()
+    results["MasteryHistory.topic_trend[30 days]"] = measure(
+        lambda: history.topic_trend("Тема 7", 30, now), repeat=args.repeat, number=100
+    )
+    results["MasteryHistory.student_trend[30 days]"] = measure(
+        lambda: history.student_trend(30, now), repeat=args.repeat, number=10
+    )
+
+
+def bench_archive(args, results):
+    # Ученик с двумя годами сессий: загрузка до и после переноса старых сессий в архив
+    now = datetime.now()
+    topic_names = [f"Тема {index}" for index in range(50)]
+    with tempfile.TemporaryDirectory() as root_dir:
+        legacy_file = os.path.join(root_dir, "progress.json")
+        store = make_store(args.backend, root_dir, legacy_file)
+        archive = session_archive.SessionArchive(os.path.join(root_dir, "archive"))
+        store.save("Ученик", generate_progress(topic_names, sessions=args.sessions * 10, days=730,
+                                                seed=args.seed, now=now))
+        progress = StudentProgress("Ученик", store=store, session_archive=archive)
+        since = now - timedelta(days=365)
+
+        results["StudentProgress.load_progress[2 years]"] = measure(progress.load_progress, repeat=args.repeat)
+        results["session_archive.run_archival"] = measure(
+            lambda: session_archive.run_archival(store, archive, now=now), repeat=1
+        )
+        results["StudentProgress.load_progress[archived]"] = measure(progress.load_progress, repeat=args.repeat)
+        results["StudentProgress.get_recent_activity[365 days, archived]"] = measure(
+            lambda: progress.get_recent_activity(since), repeat=args.repeat, number=10
+        )
+
+
+def bench_cohort(args, results):
+    if not args.cohort_students:
+        return
+    if cohort_analytics.np is None:
+        print("numpy не установлен, замеры аналитики по классу пропущены")
+        return
+
+    rows = generate_topic_rows(args.cohort_students, args.cohort_topics, args.cohort_topics_per_student,
+                               seed=args.seed)
+    build = lambda: cohort_analytics.CohortMatrix.from_rows(rows)
+    results["CohortMatrix.from_rows"] = measure(build, repeat=args.repeat)
+    cohort = cohort_analytics.CohortAnalytics(build())
+    results["CohortAnalytics.topic_averages"] = measure(cohort.topic_averages, repeat=args.repeat)
+    results["CohortAnalytics.weakest_topics"] = measure(cohort.weakest_topics, repeat=args.repeat)
+    results["CohortAnalytics.topic_percentiles"] = measure(cohort.topic_percentiles, repeat=args.repeat)
+    results["CohortAnalytics.student_percentiles"] = measure(cohort.student_percentiles, repeat=args.repeat)
+    results["CohortAnalytics.at_risk_students"] = measure(cohort.at_risk_students, repeat=args.repeat)
+
+
+def bench_instrumentation(args, results):
+    # Накладные расходы обертки timed на один вызов пустой функции
+    noop = instrumentation.timed("benchmark.noop")(lambda: None)
+    was_enabled = instrumentation.is_enabled()
+    try:
+        for enabled in (False, True):
+            instrumentation.enable(enabled)
+            state = "enabled" if enabled else "disabled"
+            results[f"instrumentation.timed[{state}]"] = measure(noop, repeat=args.repeat, number=100000)
+    finally:
+        instrumentation.enable(was_enabled)
+        instrumentation.reset()
+
+
+def compare(previous_path, results):
+    """Печатает отношение медиан текущего запуска к сохраненному"""
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = json.load(f)["results"]
+    print(f"{'Операция':45} {'было, мс':>10} {'стало, мс':>10} {'x':>6}")
+    for name, timing in results.items():
+        if name in previous:
+            before, after = previous[name]["median"], timing["median"]
+            ratio = after / before if before else float("inf")
+            print(f"{name:45} {before * 1000:10.3f} {after * 1000:10.3f} {ratio:6.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности School Helper")
+    parser.add_argument("--topics", type=int, default=200, help="число тем синтетической базы знаний")
+    parser.add_argument("--keywords", type=int, default=10, help="число ключевых слов в теме")
+    parser.add_argument("--words", type=int, default=5000, help="длина синтетической работы в словах")
+    parser.add_argument("--students", type=int, default=200, help="число учеников в хранилище")
+    parser.add_argument("--sessions", type=int, default=200, help="число сессий у ученика")
+    parser.add_argument("--backend", choices=("shards", "sqlite"), default="shards", help="хранилище прогресса")
+    parser.add_argument("--cohort-students", type=int, default=10000,
+                        help="число учеников для аналитики по классу (0 - не замерять)")
+    parser.add_argument("--cohort-topics", type=int, default=1000, help="число тем для аналитики по классу")
+    parser.add_argument("--cohort-topics-per-student", type=int, default=50,
+                        help="число тем, встреченных каждым учеником")
+    parser.add_argument("--repeat", type=int, default=5, help="число повторов каждого замера")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="файл для результатов в JSON")
+    parser.add_argument("--compare", help="JSON предыдущего запуска для сравнения")
+    args = parser.parse_args()
+
+    results = {}
+    bench_keywords(args, results)
+    bench_progress(args, results)
+    bench_works(args, results)
+    bench_scheduler(args, results)
+    bench_history(args, results)
+    bench_archive(args, results)
+    bench_cohort(args, results)
+    bench_instrumentation(args, results)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+        },
+        "results": results
+    }
+
+    for name, timing in results.items():
+        print(f"{name:45} {timing['median'] * 1000:10.3f} мс")
+    if args.compare:
+        compare(args.compare, results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Замер времени запуска приложения до готовности окна (time-to-first-interactive)
+
+Каждый замер - отдельный процесс: gui_app.py запускается с --exit-after-startup,
+сообщает время этапов запуска и сразу закрывается. Отдельно замеряется время
+импорта gui_app, которому не нужен дисплей.
+
+Пример запуска:
+    python -m benchmarks.startup --repeat 10 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUI_APP = os.path.join(BASE_DIR, "gui_app.py")
+
+
+def summarize(values):
+    return {
+        "repeat": len(values),
+        "min": min(values),
+        "median": statistics.median(values),
+        "mean": statistics.mean(values),
+        "max": max(values)
+    }
+
+
+def run_process(args):
+    """Запускает Python в отдельном процессе; возвращает (время работы процесса, вывод)"""
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable] + args, cwd=BASE_DIR, capture_output=True, text=True, timeout=60)
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else
+                           f"код возврата {completed.returncode}")
+    return elapsed, completed.stdout
+
+
+def bench_import(repeat, results):
+    timings = [run_process(["-c", "import gui_app"])[0] for _ in range(repeat)]
+    results["process[import gui_app]"] = summarize(timings)
+
+
+def bench_window(repeat, results):
+    """Запускает окно repeat раз; возвращает False, если окно не открывается (например, нет дисплея)"""
+    stages = {}
+    wall = []
+    for _ in range(repeat):
+        try:
+            elapsed, output = run_process([GUI_APP, "--exit-after-startup"])
+        except RuntimeError as e:
+            print(f"Ошибка при запуске окна: {e}")
+            return False
+        wall.append(elapsed)
+        for name, seconds in json.loads(output.strip().splitlines()[-1]).items():
+            stages.setdefault(name, []).append(seconds)
+    results["process[gui_app --exit-after-startup]"] = summarize(wall)
+    for name, values in stages.items():
+        results[f"startup.{name}"] = summarize(values)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время запуска School Helper")
+    parser.add_argument("--repeat", type=int, default=5, help="число запусков")
+    parser.add_argument("--output", help="файл для результатов в JSON")
+    args = parser.parse_args()
+
+    results = {}
+    bench_import(args.repeat, results)
+    bench_window(args.repeat, results)
+
+    for name, timing in results.items():
+        print(f"{name:45} {timing['median'] * 1000:10.3f} мс")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Нагрузочная проверка хранилища прогресса при одновременной записи из нескольких процессов
+
+Каждый процесс держит в памяти своих StudentProgress (как отдельный экземпляр
+приложения), добавляет сессии, иногда полностью сохраняет прогресс поверх чужих
+изменений и перечитывает его. В конце проверяется, что ни одна сессия не потеряна.
+
+Пример запуска:
+    python -m benchmarks.stress_store --processes 8 --operations 200 --students 4
+    python -m benchmarks.stress_store --backend sqlite
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from progress_store import ShardedProgressStore
+from student_progress import StudentProgress
+
+TOPICS = ("Дроби", "Уравнения", "Проценты", "Орфография")
+
+
+def open_store(backend, root_dir, compact_threshold):
+    if backend == "sqlite":
+        from sqlite_store import SQLiteProgressStore
+        return SQLiteProgressStore(os.path.join(root_dir, "progress.sqlite3"))
+    return ShardedProgressStore(os.path.join(root_dir, "shards"), None, compact_threshold=compact_threshold)
+
+
+def worker(backend, root_dir, worker_id, operations, students, save_rate, reload_rate, compact_threshold):
+    """Выполняет операции одного процесса; возвращает число добавленных сессий по ученикам и темам"""
+    rng = random.Random(worker_id)
+    store = open_store(backend, root_dir, compact_threshold)
+    progress_by_student = {}
+    expected = {}
+    for operation in range(operations):
+        student_name = f"Ученик {rng.randrange(students)}"
+        progress = progress_by_student.get(student_name)
+        if progress is None or rng.random() < reload_rate:
+            progress = progress_by_student[student_name] = StudentProgress(student_name, store=store)
+
+        topics = rng.sample(TOPICS, 2)
+        progress.add_session(f"Работа {worker_id}-{operation}", topics, {})
+        counts = expected.setdefault(student_name, {"sessions": 0, "topics": {}})
+        counts["sessions"] += 1
+        for topic in topics:
+            counts["topics"][topic] = counts["topics"].get(topic, 0) + 1
+
+        if rng.random() < save_rate:
+            # Полное сохранение данных, которые могли устареть из-за записей других процессов
+            progress.save_progress()
+    return expected
+
+
+def verify(store, expected):
+    """Сравнивает данные в хранилище с ожидаемыми; возвращает список расхождений"""
+    problems = []
+    for student_name, counts in sorted(expected.items()):
+        progress_data = store.load(student_name)
+        statistics = progress_data["statistics"]
+        if len(progress_data["sessions"]) != counts["sessions"]:
+            problems.append(f"{student_name}: сессий {len(progress_data['sessions'])}, ожидалось {counts['sessions']}")
+        if statistics["total_sessions"] != counts["sessions"]:
+            problems.append(f"{student_name}: total_sessions {statistics['total_sessions']}, "
+                            f"ожидалось {counts['sessions']}")
+        for topic, count in counts["topics"].items():
+            actual = progress_data["topics"].get(topic, {}).get("encounter_count", 0)
+            if actual != count:
+                problems.append(f"{student_name}: {topic} встречалась {actual} раз, ожидалось {count}")
+    return problems
+
+
+def run(backend, root_dir, processes, operations, students=4, save_rate=0.1, reload_rate=0.05,
+        compact_threshold=20):
+    """Запускает процессы-писатели над хранилищем в root_dir; возвращает расхождения и время работы"""
+    # Схема базы создается заранее, до запуска процессов; соединение закрывается,
+    # чтобы процессы пула не унаследовали его при fork
+    store = open_store(backend, root_dir, compact_threshold)
+    if hasattr(store, "close"):
+        store.close()
+    started = time.perf_counter()
+    expected = {}
+    with ProcessPoolExecutor(processes) as executor:
+        futures = [
+            executor.submit(worker, backend, root_dir, worker_id, operations, students,
+                            save_rate, reload_rate, compact_threshold)
+            for worker_id in range(processes)
+        ]
+        for future in futures:
+            for student_name, counts in future.result().items():
+                total = expected.setdefault(student_name, {"sessions": 0, "topics": {}})
+                total["sessions"] += counts["sessions"]
+                for topic, count in counts["topics"].items():
+                    total["topics"][topic] = total["topics"].get(topic, 0) + count
+    elapsed = time.perf_counter() - started
+
+    store = open_store(backend, root_dir, compact_threshold)
+    try:
+        return verify(store, expected), elapsed
+    finally:
+        if hasattr(store, "close"):
+            store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Одновременная запись прогресса из нескольких процессов")
+    parser.add_argument("--backend", choices=("shards", "sqlite"), default="shards")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--operations", type=int, default=200, help="число сессий, добавляемых каждым процессом")
+    parser.add_argument("--students", type=int, default=4, help="число учеников, общих для всех процессов")
+    parser.add_argument("--save-rate", type=float, default=0.1, help="доля операций с полным сохранением")
+    parser.add_argument("--reload-rate", type=float, default=0.05, help="доля операций с перечитыванием ученика")
+    parser.add_argument("--compact-threshold", type=int, default=20, help="длина журнала до сжатия")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root_dir:
+        problems, elapsed = run(args.backend, root_dir, args.processes, args.operations, args.students,
+                                args.save_rate, args.reload_rate, args.compact_threshold)
+
+    operations = args.processes * args.operations
+    print(f"{operations} операций в {args.processes} процессах за {elapsed:.2f} с "
+          f"({operations / elapsed:.0f} операций/с)")
+    if problems:
+        print("Потерянные изменения:")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("Потерянных изменений нет")
+
+
+if __name__ == "__main__":
+    main()
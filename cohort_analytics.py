@@ -0,0 +1,184 @@
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    # numpy нужен только для аналитики по классу; остальное приложение работает без него
+    np = None
+
+# Тема требует повторения при mastery ниже порога и достаточном числе встреч (как в get_weak_topics)
+WEAK_MASTERY = 70
+WEAK_MIN_ENCOUNTERS = 2
+
+# Ученик в группе риска, если его средний mastery ниже порога, слабых тем слишком много
+# или он давно не занимался
+AT_RISK_MASTERY = 50
+AT_RISK_WEAK_TOPICS = 3
+AT_RISK_INACTIVE_DAYS = 14
+
+SECONDS_PER_DAY = 86400
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Для аналитики по классу нужен пакет numpy (pip install numpy)")
+
+
+def _to_epoch(iso_dates):
+    """Переводит список ISO-дат в секунды (локальное время без пояса); пустые даты дают 0"""
+    dates = np.array([value or "NaT" for value in iso_dates], dtype="datetime64[s]")
+    return np.where(np.isnat(dates), 0, dates.astype(np.int64))
+
+
+def _now_epoch(now=None):
+    return int(np.datetime64(now or datetime.now(), "s").astype(np.int64))
+
+
+class CohortMatrix:
+    """Плотная матрица ученики × темы для аналитики по классу
+
+    mastery - оценки усвоения (NaN, если ученик тему не встречал), encounters - число
+    встреч с темой, last_practiced - время последней практики в секундах (0 - не было)."""
+
+    def __init__(self, students, topics, mastery, encounters, last_practiced):
+        _require_numpy()
+        self.students = list(students)
+        self.topics = list(topics)
+        self.mastery = mastery
+        self.encounters = encounters
+        self.last_practiced = last_practiced
+
+    @classmethod
+    def from_rows(cls, rows, students=()):
+        """Строит матрицу по строкам (ученик, тема, число встреч, последняя практика ISO, mastery)
+
+        students - ученики, которые должны попасть в матрицу даже без единой темы."""
+        _require_numpy()
+        student_ids = {name: index for index, name in enumerate(students)}
+        topic_ids = {}
+        student_index, topic_index, counts, dates, scores = [], [], [], [], []
+        for student_name, topic, encounter_count, last_practiced, mastery_score in rows:
+            student_index.append(student_ids.setdefault(student_name, len(student_ids)))
+            topic_index.append(topic_ids.setdefault(topic, len(topic_ids)))
+            counts.append(encounter_count)
+            dates.append(last_practiced)
+            scores.append(mastery_score)
+
+        shape = (len(student_ids), len(topic_ids))
+        mastery = np.full(shape, np.nan, dtype=np.float32)
+        encounters = np.zeros(shape, dtype=np.int32)
+        last_practiced = np.zeros(shape, dtype=np.int64)
+        if student_index:
+            cells = (np.array(student_index), np.array(topic_index))
+            mastery[cells] = scores
+            encounters[cells] = counts
+            last_practiced[cells] = _to_epoch(dates)
+        return cls(student_ids, topic_ids, mastery, encounters, last_practiced)
+
+    @classmethod
+    def from_store(cls, store):
+        """Загружает темы всех учеников из хранилища прогресса за один проход"""
+        if hasattr(store, "iter_topic_rows"):
+            return cls.from_rows(store.iter_topic_rows(), store.student_names())
+
+        students = []
+
+        def rows():
+            for student_name, progress_data in store.iter_students():
+                students.append(student_name)
+                for topic, data in progress_data["topics"].items():
+                    yield (student_name, topic, data["encounter_count"], data["last_practiced"],
+                           data["mastery_score"])
+
+        # Список учеников заполняется во время перебора, поэтому строки собираются заранее
+        matrix_rows = list(rows())
+        return cls.from_rows(matrix_rows, students)
+
+
+class CohortAnalytics:
+    """Аналитика по классу: средние, слабые темы, процентили и группа риска"""
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self._encountered = ~np.isnan(matrix.mastery)
+
+    def _weak_mask(self):
+        matrix = self.matrix
+        return (matrix.encounters >= WEAK_MIN_ENCOUNTERS) & (matrix.mastery < WEAK_MASTERY)
+
+    def _column_means(self, values):
+        counts = self._encountered.sum(axis=0)
+        totals = np.where(self._encountered, values, 0).sum(axis=0, dtype=np.float64)
+        return np.divide(totals, counts, out=np.full(len(counts), np.nan), where=counts > 0)
+
+    def _student_means(self):
+        counts = self._encountered.sum(axis=1)
+        totals = np.where(self._encountered, self.matrix.mastery, 0).sum(axis=1, dtype=np.float64)
+        return np.divide(totals, counts, out=np.full(len(counts), np.nan), where=counts > 0)
+
+    def class_average(self):
+        """Возвращает средний mastery по всем встреченным темам всех учеников"""
+        if not self._encountered.any():
+            return None
+        return float(self.matrix.mastery[self._encountered].mean(dtype=np.float64))
+
+    def topic_averages(self):
+        """Возвращает средний mastery по каждой теме среди учеников, встречавших ее"""
+        return dict(zip(self.matrix.topics, self._column_means(self.matrix.mastery).tolist()))
+
+    def weakest_topics(self, limit=10):
+        """Возвращает темы, которые требуют повторения у наибольшей доли учеников
+
+        Элементы списка - кортежи (тема, доля учеников со слабой темой, средний mastery)."""
+        encountered = self._encountered.sum(axis=0)
+        weak_share = np.divide(self._weak_mask().sum(axis=0), encountered,
+                               out=np.zeros(len(encountered)), where=encountered > 0)
+        averages = self._column_means(self.matrix.mastery)
+        # Сначала доля слабых, при равенстве - более низкий средний mastery
+        order = np.lexsort((averages, -weak_share))[:limit]
+        return [(self.matrix.topics[index], float(weak_share[index]), float(averages[index]))
+                for index in order]
+
+    def topic_percentiles(self, percentiles=(10, 50, 90)):
+        """Возвращает процентили mastery по каждой теме: тема -> список значений"""
+        mastery = self.matrix.mastery
+        # NaN при сортировке уходят в конец столбца, поэтому значения учеников идут первыми
+        ordered = np.sort(mastery, axis=0)
+        counts = self._encountered.sum(axis=0)
+        columns = np.arange(mastery.shape[1])
+        result = []
+        for percentile in percentiles:
+            position = np.maximum(counts - 1, 0) * (percentile / 100)
+            lower = np.floor(position).astype(np.int64)
+            upper = np.minimum(lower + 1, np.maximum(counts - 1, 0))
+            fraction = position - lower
+            values = ordered[lower, columns] * (1 - fraction) + ordered[upper, columns] * fraction
+            result.append(np.where(counts > 0, values, np.nan))
+        return dict(zip(self.matrix.topics, np.column_stack(result).tolist()))
+
+    def student_percentiles(self):
+        """Возвращает место каждого ученика в классе по среднему mastery (процентиль от 0 до 100)"""
+        means = self._student_means()
+        valid = ~np.isnan(means)
+        ranks = np.full(len(means), np.nan)
+        if valid.any():
+            valid_means = means[valid]
+            # Доля учеников со средним mastery не выше, чем у данного ученика
+            ranks[valid] = np.searchsorted(np.sort(valid_means), valid_means, side="right") * 100 / len(valid_means)
+        return dict(zip(self.matrix.students, ranks.tolist()))
+
+    def at_risk_students(self, now=None):
+        """Возвращает учеников группы риска, начиная с самого низкого среднего mastery
+
+        Элементы списка - кортежи (ученик, средний mastery, число слабых тем, дней без занятий)."""
+        means = self._student_means()
+        weak_counts = self._weak_mask().sum(axis=1)
+        last_activity = self.matrix.last_practiced.max(axis=1, initial=0)
+        inactive_days = np.where(last_activity > 0, (_now_epoch(now) - last_activity) // SECONDS_PER_DAY, -1)
+
+        at_risk = ((means < AT_RISK_MASTERY) | (weak_counts >= AT_RISK_WEAK_TOPICS)
+                   | (inactive_days > AT_RISK_INACTIVE_DAYS))
+        indexes = np.flatnonzero(at_risk)
+        indexes = indexes[np.argsort(np.nan_to_num(means[indexes], nan=-1), kind="stable")]
+        return [(self.matrix.students[index], float(means[index]), int(weak_counts[index]),
+                 int(inactive_days[index])) for index in indexes]
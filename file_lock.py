@@ -0,0 +1,106 @@
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """Рекомендательная межпроцессная блокировка через служебный файл
+
+    На Unix используется flock, на Windows - msvcrt.locking. Блокировка не
+    реентерабельна: повторный захват в том же процессе до освобождения ждет вечно."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        """Ждет и захватывает блокировку"""
+        f = open(self.path, 'a+b')
+        try:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                while True:
+                    # LK_LOCK сам повторяет попытки около 10 секунд, затем выбрасывает OSError
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+        except BaseException:
+            f.close()
+            raise
+        self._file = f
+
+    def release(self):
+        """Освобождает блокировку"""
+        f, self._file = self._file, None
+        try:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            f.close()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def atomic_write(path, write, fsync=False, mode='w', encoding='utf-8'):
+    """Записывает файл через временный файл и переименование
+
+    write(f) записывает содержимое. При сбое на месте остается прежняя версия файла."""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, mode, encoding=None if 'b' in mode else encoding) as f:
+            write(f)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def append_lines(path, lines, fsync=False):
+    """Дописывает строки (байты, каждая с переводом строки) в конец файла одной записью
+
+    Недописанная последняя строка, оставшаяся после сбоя, сначала отрезается, чтобы
+    новые строки не склеились с ней. Вызывается под блокировкой файла. Возвращает
+    новый размер файла."""
+    with open(path, 'ab'):
+        pass
+    with open(path, 'r+b') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position:
+            start = max(0, position - 4096)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            f.truncate(position)
+        f.seek(position)
+        f.write(b"".join(lines))
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+        return f.tell()
@@ -1,14 +1,34 @@
+import time
+
+# Начало запуска приложения - для замера времени до готовности окна
+STARTED = time.perf_counter()
+
+import queue
+import sys
+import threading
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-import os
-from datetime import datetime
-from knowledge_base import get_topics_by_keywords, get_task_for_topic, get_topic_description
-from student_progress import StudentProgress
-from analytics import Analytics
+import instrumentation
+from instrumentation import timed
+from virtual_table import VirtualTable
+
+# База знаний, прогресс и аналитика импортируются при первом использовании, чтобы окно
+# появлялось быстрее; после показа окна они загружаются в фоне (см. _warm_up)
+
+# Индексы вкладок
+ANALYSIS_TAB, PRACTICE_TAB, STATS_TAB, PLAN_TAB, DIAGNOSTICS_TAB = range(5)
+
+# Период опроса очереди результатов фонового анализа, мс
+POLL_INTERVAL = 50
 
 class SchoolHelperApp:
-    def __init__(self, root):
+    def __init__(self, root, import_timer=None, exit_after_startup=False):
         self.root = root
+        # Этапы запуска: (название, время от STARTED)
+        self.startup_marks = [("imports", time.perf_counter() - STARTED)]
+        self.startup_timings = None
+        self.import_timer = import_timer
+        self.exit_after_startup = exit_after_startup
         self.root.title("🎓 ИИ-Помощник для Школьника")
         self.root.geometry("900x700")
         self.root.configure(bg='#f0f8ff')
@@ -21,9 +41,85 @@ class SchoolHelperApp:
         self.style.configure('Custom.TButton', font=('Arial', 10), background='#2196F3')
         
         self.setup_ui()
+        self.startup_marks.append(("setup_ui", time.perf_counter() - STARTED))
         self.current_student = None
         self.progress_manager = None
         self.analytics = None
+        
+        # Изменения прогресса сохраняются пачками в фоне; при закрытии окна - сразу.
+        # Объект записи создается вместе с первой сессией
+        self.writer = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # Анализ выполняется в фоновом потоке, результаты приходят через очередь
+        self.executor = None
+        self.ui_queue = queue.Queue()
+        self.current_job = None
+        self._job_counter = 0
+        
+        # Вкладки, данные которых изменились, пока они были скрыты
+        self._dirty_tabs = set()
+        self._tab_refreshers = {
+            PRACTICE_TAB: self.update_topics_list,
+            STATS_TAB: self._refresh_stats,
+            PLAN_TAB: self.generate_plan
+        }
+        # Темы, изменившиеся с последнего обновления таблицы статистики (None - перерисовать все)
+        self._stats_changed_topics = None
+        
+        # Окно готово к вводу, когда Tk обработал отложенную отрисовку
+        self.root.after_idle(self._on_first_idle)
+    
+    def _on_first_idle(self):
+        """Замеряет время до готовности окна и начинает загрузку модулей в фоне"""
+        self.root.update_idletasks()
+        self.startup_marks.append(("first_interactive", time.perf_counter() - STARTED))
+        
+        # Длительность каждого этапа: от конца предыдущего
+        self.startup_timings = {}
+        previous = 0.0
+        for name, moment in self.startup_marks:
+            self.startup_timings[name] = moment - previous
+            previous = moment
+        self.startup_timings["total"] = previous
+        if instrumentation.is_enabled():
+            for name, seconds in self.startup_timings.items():
+                instrumentation.record(f"startup.{name}", seconds)
+        
+        if self.import_timer:
+            print(self.format_startup_report())
+        if self.exit_after_startup:
+            import json
+            # Строка для benchmarks/startup.py
+            print(json.dumps(self.startup_timings))
+            self.on_close()
+            return
+        
+        self.get_executor().submit(self._warm_up)
+    
+    def format_startup_report(self):
+        """Возвращает время этапов запуска и, если оно замерялось, время импорта модулей"""
+        lines = ["Запуск, мс:"]
+        for name, seconds in (self.startup_timings or {}).items():
+            lines.append(f"  {name:<20} {seconds * 1000:9.2f}")
+        if self.import_timer:
+            lines.append(f"\nИмпорт модулей с начала замера: {self.import_timer.total() * 1000:.2f} мс")
+            lines.append(self.import_timer.format_report())
+        return "\n".join(lines)
+    
+    def _warm_up(self):
+        """Импортирует модули анализа и прогресса в фоне, пока пользователь вводит имя"""
+        import analytics
+        import knowledge_base
+        import student_progress
+        import write_behind
+    
+    def get_executor(self):
+        """Возвращает поток фонового анализа, создавая его при первом обращении"""
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis")
+        return self.executor
     
     def setup_ui(self):
         """Создает интерфейс приложения"""
@@ -51,27 +147,45 @@ class SchoolHelperApp:
         # Notebook для вкладок
         self.notebook = ttk.Notebook(main_frame)
         self.notebook.pack(fill=tk.BOTH, expand=True, pady=10)
-        
-        # Вкладка анализа работы
-        self.setup_analysis_tab()
-        
-        # Вкладка тренировки
-        self.setup_practice_tab()
-        
-        # Вкладка статистики
-        self.setup_stats_tab()
-        
-        # Вкладка плана занятий
-        self.setup_plan_tab()
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+        # Скрытая вкладка диагностики открывается по Ctrl+Shift+D
+        self.diagnostics_frame = None
+        self.root.bind('<Control-Shift-D>', self.toggle_diagnostics_tab)
+        self.root.bind('<Control-Shift-d>', self.toggle_diagnostics_tab)
+        
+        # Вкладки; содержимое скрытых вкладок создается при первом переходе на них
+        self.tab_frames = {}
+        self._tab_builders = {
+            ANALYSIS_TAB: self.setup_analysis_tab,
+            PRACTICE_TAB: self.setup_practice_tab,
+            STATS_TAB: self.setup_stats_tab,
+            PLAN_TAB: self.setup_plan_tab
+        }
+        tab_titles = {
+            ANALYSIS_TAB: "📝 Анализ работы",
+            PRACTICE_TAB: "📚 Тренировка",
+            STATS_TAB: "📈 Статистика",
+            PLAN_TAB: "🎯 План занятий"
+        }
+        for tab, title in tab_titles.items():
+            self.tab_frames[tab] = ttk.Frame(self.notebook)
+            self.notebook.add(self.tab_frames[tab], text=title)
+        
+        # Вкладка анализа работы видна сразу
+        self.ensure_tab_built(ANALYSIS_TAB)
         
         # Изначально отключаем вкладки до ввода имени
         self.disable_tabs()
     
-    def setup_analysis_tab(self):
+    def ensure_tab_built(self, tab):
+        """Создает содержимое вкладки, если оно еще не создано"""
+        builder = self._tab_builders.pop(tab, None)
+        if builder:
+            with instrumentation.measure(f"render.build_tab.{tab}"):
+                builder(self.tab_frames[tab])
+    
+    def setup_analysis_tab(self, analysis_frame):
         """Создает вкладку анализа работы"""
-        analysis_frame = ttk.Frame(self.notebook)
-        self.notebook.add(analysis_frame, text="📝 Анализ работы")
-        
         # Текстовая область для ввода работы
         ttk.Label(analysis_frame, text="Введите текст вашей работы:", 
                  font=('Arial', 11, 'bold')).pack(anchor=tk.W, pady=(10, 5))
@@ -86,10 +200,26 @@ class SchoolHelperApp:
         
         ttk.Button(button_frame, text="Загрузить демо-текст", 
                   command=self.load_demo_text).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="📊 Проанализировать", 
-                  command=self.analyze_work, style='Custom.TButton').pack(side=tk.LEFT, padx=5)
+        self.analyze_button = ttk.Button(button_frame, text="📊 Проанализировать", 
+                                         command=self.analyze_work, style='Custom.TButton')
+        self.analyze_button.pack(side=tk.LEFT, padx=5)
+        self.analyze_file_button = ttk.Button(button_frame, text="📂 Анализ файла...", 
+                                              command=self.analyze_file)
+        self.analyze_file_button.pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Очистить", 
                   command=self.clear_text).pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="Отмена", 
+                                        command=self.cancel_analysis, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        
+        # Ход анализа
+        progress_frame = ttk.Frame(analysis_frame)
+        progress_frame.pack(fill=tk.X)
+        
+        self.analysis_progress = ttk.Progressbar(progress_frame, maximum=100, length=200)
+        self.analysis_progress.pack(side=tk.LEFT, padx=5)
+        self.analysis_status = ttk.Label(progress_frame, text="")
+        self.analysis_status.pack(side=tk.LEFT, padx=5)
         
         # Область для результатов
         ttk.Label(analysis_frame, text="Результаты анализа:", 
@@ -100,11 +230,8 @@ class SchoolHelperApp:
                                                      state=tk.DISABLED)
         self.results_text.pack(fill=tk.BOTH, expand=True)
     
-    def setup_practice_tab(self):
+    def setup_practice_tab(self, practice_frame):
         """Создает вкладку тренировки"""
-        practice_frame = ttk.Frame(self.notebook)
-        self.notebook.add(practice_frame, text="📚 Тренировка")
-        
         # Список слабых тем
         ttk.Label(practice_frame, text="Слабые темы для тренировки:", 
                  font=('Arial', 11, 'bold')).pack(anchor=tk.W, pady=(10, 5))
@@ -150,30 +277,37 @@ class SchoolHelperApp:
         ttk.Button(eval_frame, text="Отправить оценку", 
                   command=self.submit_evaluation).pack(side=tk.LEFT, padx=20)
     
-    def setup_stats_tab(self):
+    def setup_stats_tab(self, stats_frame):
         """Создает вкладку статистики"""
-        stats_frame = ttk.Frame(self.notebook)
-        self.notebook.add(stats_frame, text="📈 Статистика")
-        
         # Общая статистика
         stats_header = ttk.Label(stats_frame, text="Общая статистика", 
                                 font=('Arial', 12, 'bold'))
         stats_header.pack(pady=10)
         
-        self.stats_text = scrolledtext.ScrolledText(stats_frame, height=12, 
+        self.stats_text = scrolledtext.ScrolledText(stats_frame, height=9, 
                                                    font=('Arial', 10), wrap=tk.WORD,
                                                    state=tk.DISABLED)
-        self.stats_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.stats_text.pack(fill=tk.X, padx=10, pady=5)
+        
+        # Прогресс по темам: в таблице создаются только видимые строки, сортировка - по щелчку на заголовке
+        ttk.Label(stats_frame, text="Прогресс по темам", 
+                 font=('Arial', 11, 'bold')).pack(pady=(5, 0))
+        from progress_model import to_datetime
+        self.topics_table = VirtualTable(stats_frame, [
+            ("Тема", 260, None),
+            ("Mastery, %", 90, lambda mastery: f"{mastery:.1f}"),
+            ("Встречалась", 90, None),
+            ("Уровень", 80, None),
+            ("Последняя практика", 130, lambda epoch: to_datetime(epoch).strftime("%d.%m.%Y"))
+        ], sort_column=1)
+        self.topics_table.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
         # Кнопка обновления
         ttk.Button(stats_frame, text="Обновить статистику", 
-                  command=self.update_stats).pack(pady=10)
+                  command=lambda: self.update_stats()).pack(pady=10)
     
-    def setup_plan_tab(self):
+    def setup_plan_tab(self, plan_frame):
         """Создает вкладку плана занятий"""
-        plan_frame = ttk.Frame(self.notebook)
-        self.notebook.add(plan_frame, text="🎯 План занятий")
-        
         ttk.Label(plan_frame, text="Индивидуальный план на неделю:", 
                  font=('Arial', 12, 'bold')).pack(pady=10)
         
@@ -185,6 +319,83 @@ class SchoolHelperApp:
         ttk.Button(plan_frame, text="Сгенерировать план", 
                   command=self.generate_plan).pack(pady=10)
     
+    def setup_diagnostics_tab(self):
+        """Создает вкладку диагностики: замеры времени этапов и профилирование анализа"""
+        self.diagnostics_frame = ttk.Frame(self.notebook)
+        self.notebook.add(self.diagnostics_frame, text="🛠 Диагностика")
+        
+        options_frame = ttk.Frame(self.diagnostics_frame)
+        options_frame.pack(fill=tk.X, pady=(10, 5))
+        
+        self.timings_var = tk.BooleanVar(value=instrumentation.is_enabled())
+        ttk.Checkbutton(options_frame, text="Собирать замеры", variable=self.timings_var,
+                        command=lambda: instrumentation.enable(self.timings_var.get())).pack(side=tk.LEFT, padx=5)
+        self.profile_var = tk.BooleanVar(value=instrumentation.profile_requested())
+        ttk.Checkbutton(options_frame, text="Профилировать следующий анализ (cProfile)", variable=self.profile_var,
+                        command=lambda: instrumentation.request_profile(self.profile_var.get())).pack(side=tk.LEFT, padx=5)
+        
+        self.diagnostics_text = scrolledtext.ScrolledText(self.diagnostics_frame, height=15,
+                                                         font=('Courier', 9), wrap=tk.NONE,
+                                                         state=tk.DISABLED)
+        self.diagnostics_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        button_frame = ttk.Frame(self.diagnostics_frame)
+        button_frame.pack(fill=tk.X, pady=10)
+        
+        ttk.Button(button_frame, text="Обновить",
+                   command=self.update_diagnostics).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Сбросить",
+                   command=self.reset_diagnostics).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Сохранить в JSON",
+                   command=self.dump_diagnostics).pack(side=tk.LEFT, padx=5)
+    
+    def toggle_diagnostics_tab(self, event=None):
+        """Показывает или скрывает вкладку диагностики"""
+        if self.diagnostics_frame is None:
+            self.setup_diagnostics_tab()
+        elif self.notebook.tab(DIAGNOSTICS_TAB, "state") == "hidden":
+            self.notebook.add(self.diagnostics_frame)
+        else:
+            self.notebook.hide(DIAGNOSTICS_TAB)
+            return
+        self.notebook.select(DIAGNOSTICS_TAB)
+    
+    def update_diagnostics(self):
+        """Показывает накопленные замеры и отчет последнего профилирования"""
+        self.profile_var.set(instrumentation.profile_requested())
+        
+        self.diagnostics_text.config(state=tk.NORMAL)
+        self.diagnostics_text.delete(1.0, tk.END)
+        if self.startup_timings:
+            self.diagnostics_text.insert(tk.END, self.format_startup_report() + "\n\n")
+        stages = instrumentation.snapshot()
+        if stages:
+            self.diagnostics_text.insert(tk.END, "Время этапов, мс:\n\n" + instrumentation.format_report(stages) + "\n")
+        elif instrumentation.is_enabled():
+            self.diagnostics_text.insert(tk.END, "Замеров пока нет.\n")
+        else:
+            self.diagnostics_text.insert(tk.END, "Сбор замеров выключен.\n")
+        
+        profile = instrumentation.last_profile()
+        if profile:
+            path, report = profile
+            self.diagnostics_text.insert(tk.END, f"\nПрофиль последнего анализа ({path}):\n{report}")
+        self.diagnostics_text.config(state=tk.DISABLED)
+    
+    def reset_diagnostics(self):
+        """Удаляет накопленные замеры"""
+        instrumentation.reset()
+        self.update_diagnostics()
+    
+    def dump_diagnostics(self):
+        """Сохраняет замеры в JSON-файл"""
+        try:
+            path = instrumentation.dump_json()
+        except OSError as e:
+            messagebox.showerror("Ошибка", f"Не удалось сохранить замеры: {e}")
+            return
+        messagebox.showinfo("Успех", f"Замеры сохранены в файл:\n{path}")
+    
     def disable_tabs(self):
         """Отключает вкладки до ввода имени"""
         for i in range(1, 4):  # Вкладки 1, 2, 3 (индексы 1, 2, 3)
@@ -202,17 +413,28 @@ class SchoolHelperApp:
             messagebox.showwarning("Внимание", "Пожалуйста, введите ваше имя!")
             return
         
+        if self.current_job:
+            messagebox.showwarning("Внимание", "Дождитесь окончания анализа работы!")
+            return
+        
+        from analytics import Analytics
+        from student_progress import StudentProgress
+        from write_behind import get_default_writer
+        
         self.current_student = name
-        self.progress_manager = StudentProgress(name)
+        self._stats_changed_topics = None
+        if self.progress_manager:
+            self.progress_manager.flush()
+        if self.writer is None:
+            self.writer = get_default_writer()
+        self.progress_manager = StudentProgress(name, write_behind=self.writer)
         self.analytics = Analytics(self.progress_manager)
         
         # Включаем вкладки
         self.enable_tabs()
         
         # Обновляем интерфейс
-        self.update_topics_list()
-        self.update_stats()
-        self.generate_plan()
+        self.mark_tabs_changed({PRACTICE_TAB, STATS_TAB, PLAN_TAB})
         
         messagebox.showinfo("Успех", f"Добро пожаловать, {name}! Сессия начата.")
     
@@ -234,48 +456,182 @@ class SchoolHelperApp:
         self.results_text.config(state=tk.DISABLED)
     
     def analyze_work(self):
-        """Анализирует работу ученика"""
+        """Запускает анализ работы ученика в фоновом потоке"""
         if not self.current_student:
             messagebox.showwarning("Внимание", "Сначала введите ваше имя!")
             return
         
+        if self.current_job:
+            return
+        
         work_text = self.work_text.get(1.0, tk.END).strip()
         if not work_text:
             messagebox.showwarning("Внимание", "Введите текст работы для анализа!")
             return
         
+        self._start_analysis(work_text)
+    
+    def analyze_file(self):
+        """Анализирует работу из файла, не загружая ее в окно (подходит для очень больших работ)"""
+        if not self.current_student:
+            messagebox.showwarning("Внимание", "Сначала введите ваше имя!")
+            return
+        
+        if self.current_job:
+            return
+        
+        from tkinter import filedialog
+        
+        path = filedialog.askopenfilename(title="Выберите файл работы",
+                                          filetypes=[("Текстовые файлы", "*.txt"), ("Все файлы", "*.*")])
+        if path:
+            self._start_analysis(path, from_file=True)
+    
+    def _start_analysis(self, source, from_file=False):
+        """Запускает фоновый анализ текста или файла (source - текст или путь к файлу)"""
+        self._job_counter += 1
+        cancel_event = threading.Event()
+        self.current_job = (self._job_counter, cancel_event)
+        self._set_busy(True)
+        
+        self.get_executor().submit(self._analysis_job, self._job_counter, cancel_event,
+                             self.progress_manager, source, from_file)
+        self.root.after(POLL_INTERVAL, self._poll_queue)
+    
+    def _analysis_job(self, job_id, cancel_event, progress_manager, source, from_file=False):
+        """Анализирует работу и сохраняет результат (выполняется в фоновом потоке, без обращений к Tk)"""
+        from knowledge_base import analyze_stream, get_tasks_for_topics
+        
+        def report(value, text):
+            self.ui_queue.put(("progress", job_id, value, text))
+        
         try:
-            # Сохраняем работу
-            success = self.progress_manager.save_student_work(work_text)
-            if not success:
-                messagebox.showwarning("Внимание", "Не удалось сохранить работу, но анализ продолжается...")
+            report(10, "Поиск тем...")
+            # Текст разбирается по частям; файл при этом не загружается в память целиком.
+            # Если на вкладке диагностики запрошено профилирование, оно охватывает поиск тем
+            with instrumentation.profile_if_requested("analysis"):
+                if from_file:
+                    with open(source, 'r', encoding='utf-8') as f:
+                        analysis = analyze_stream(f, cancelled=cancel_event.is_set)
+                else:
+                    analysis = analyze_stream(source, cancelled=cancel_event.is_set)
+            if analysis is None or cancel_event.is_set():
+                self.ui_queue.put(("cancelled", job_id))
+                return
+            found_topics = analysis["topics"]
             
-            # Анализируем
-            found_topics = get_topics_by_keywords(work_text)
-            recommended_tasks = {}
+            report(40, "Подбор заданий...")
+            difficulties, recent_tasks = progress_manager.get_task_context(found_topics)
+            recommended_tasks = get_tasks_for_topics(
+                [(topic, difficulties[topic]) for topic in found_topics], recent_tasks
+            )
+            if cancel_event.is_set():
+                self.ui_queue.put(("cancelled", job_id))
+                return
             
-            for topic in found_topics:
-                difficulty = self.progress_manager.progress_data["topics"].get(topic, {}).get("difficulty_level", "medium")
-                task = get_task_for_topic(topic, difficulty)
-                if task:
-                    recommended_tasks[topic] = task
+            # Дальше начинается сохранение, отменить его уже нельзя
+            report(60, "Сохранение работы...")
+            if from_file:
+                saved = progress_manager.save_student_work_file(source)
+            else:
+                saved = progress_manager.save_student_work(source)
+            
+            report(80, "Сохранение прогресса...")
+            with progress_manager.lock:
+                weak_before = progress_manager.get_weak_topics()
+                progress_manager.add_session(analysis["excerpt"], found_topics, recommended_tasks,
+                                             saved["id"] if saved else None)
+                weak_changed = progress_manager.get_weak_topics() != weak_before
             
-            # Сохраняем сессию
-            self.progress_manager.add_session(work_text, found_topics, recommended_tasks)
+            self.ui_queue.put(("done", job_id, found_topics, recommended_tasks, saved, weak_changed))
+        except Exception as e:
+            self.ui_queue.put(("error", job_id, str(e)))
+    
+    def _poll_queue(self):
+        """Забирает сообщения фонового анализа и обновляет интерфейс"""
+        try:
+            while True:
+                self._handle_message(self.ui_queue.get_nowait())
+        except queue.Empty:
+            pass
+        
+        if self.current_job:
+            self.root.after(POLL_INTERVAL, self._poll_queue)
+    
+    def _handle_message(self, message):
+        """Обрабатывает одно сообщение фонового анализа"""
+        kind, job_id = message[0], message[1]
+        if not self.current_job or job_id != self.current_job[0]:
+            return
+        
+        if kind == "progress":
+            self.analysis_progress["value"] = message[2]
+            self.analysis_status.config(text=message[3])
+            return
+        
+        self.current_job = None
+        self._set_busy(False)
+        
+        if kind == "cancelled":
+            self.analysis_status.config(text="Анализ отменен")
+        elif kind == "error":
+            self.analysis_status.config(text="")
+            messagebox.showerror("Ошибка", f"Произошла ошибка при анализе: {message[2]}")
+        elif kind == "done":
+            found_topics, recommended_tasks, saved, weak_changed = message[2:]
+            self.analysis_status.config(text="Готово")
+            if not saved:
+                messagebox.showwarning("Внимание", "Не удалось сохранить работу, но анализ выполнен.")
             
             # Показываем результаты
             self.show_results(found_topics, recommended_tasks)
             
-            # Обновляем другие вкладки
-            self.update_topics_list()
-            self.update_stats()
-            self.generate_plan()
-            
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Произошла ошибка при анализе: {str(e)}")
+            # Статистика и сроки повторения меняются после каждой сессии, список слабых тем - не всегда
+            self._note_topics_changed(found_topics)
+            changed_tabs = {STATS_TAB, PLAN_TAB}
+            if weak_changed:
+                changed_tabs.add(PRACTICE_TAB)
+            self.mark_tabs_changed(changed_tabs)
+    
+    def _set_busy(self, busy):
+        """Переключает кнопки и индикатор на время анализа"""
+        self.analyze_button.config(state=tk.DISABLED if busy else tk.NORMAL)
+        self.analyze_file_button.config(state=tk.DISABLED if busy else tk.NORMAL)
+        self.cancel_button.config(state=tk.NORMAL if busy else tk.DISABLED)
+        self.analysis_progress["value"] = 0 if busy else 100
+    
+    def cancel_analysis(self):
+        """Отменяет текущий анализ, если сохранение еще не началось"""
+        if self.current_job:
+            self.current_job[1].set()
+            self.analysis_status.config(text="Отмена...")
+    
+    def mark_tabs_changed(self, tabs):
+        """Обновляет открытую вкладку сразу, а скрытые - при переходе на них"""
+        current = self.notebook.index(self.notebook.select())
+        for tab in tabs:
+            if tab == current:
+                self.ensure_tab_built(tab)
+                self._tab_refreshers[tab]()
+            else:
+                self._dirty_tabs.add(tab)
+    
+    def on_tab_changed(self, event=None):
+        """Обновляет вкладку при переходе на нее, если ее данные изменились"""
+        current = self.notebook.index(self.notebook.select())
+        if current == DIAGNOSTICS_TAB:
+            self.update_diagnostics()
+            return
+        self.ensure_tab_built(current)
+        if current in self._dirty_tabs:
+            self._dirty_tabs.discard(current)
+            self._tab_refreshers[current]()
     
+    @timed("render.show_results")
     def show_results(self, found_topics, recommended_tasks):
         """Показывает результаты анализа"""
+        from knowledge_base import get_topic_description
+        
         self.results_text.config(state=tk.NORMAL)
         self.results_text.delete(1.0, tk.END)
         
@@ -296,21 +652,23 @@ class SchoolHelperApp:
         
         self.results_text.config(state=tk.DISABLED)
     
+    @timed("render.update_topics_list")
     def update_topics_list(self):
         """Обновляет список слабых тем"""
         if not self.current_student:
             return
         
-        self.topics_listbox.delete(0, tk.END)
-        weak_topics = self.progress_manager.get_weak_topics()
+        with self.progress_manager.lock:
+            weak_topics = [(topic, self.progress_manager.progress_data["topics"][topic]["mastery_score"])
+                           for topic in self.progress_manager.get_weak_topics()]
         
+        self.topics_listbox.delete(0, tk.END)
         if not weak_topics:
             self.topics_listbox.insert(tk.END, "🎉 Нет слабых тем для тренировки!")
             return
         
-        for topic in weak_topics:
-            topic_data = self.progress_manager.progress_data["topics"][topic]
-            display_text = f"{topic} (mastery: {topic_data['mastery_score']:.1f}%)"
+        for topic, mastery in weak_topics:
+            display_text = f"{topic} (mastery: {mastery:.1f}%)"
             self.topics_listbox.insert(tk.END, display_text)
     
     def select_topic(self):
@@ -340,8 +698,12 @@ class SchoolHelperApp:
     
     def show_task(self, topic):
         """Показывает задание по выбранной теме"""
+        from knowledge_base import get_task_for_topic, get_topic_description
+        
         difficulty = self.progress_manager.progress_data["topics"][topic]["difficulty_level"]
-        task = get_task_for_topic(topic, difficulty)
+        task = get_task_for_topic(topic, difficulty, self.progress_manager.get_recent_tasks(topic))
+        if task:
+            self.progress_manager.remember_task(topic, task)
         
         self.current_topic = topic
         
@@ -373,98 +735,143 @@ class SchoolHelperApp:
         else:
             success_rate = 30
         
+        weak_before = self.progress_manager.get_weak_topics()
         self.progress_manager.update_mastery(self.current_topic, success_rate)
+        weak_after = self.progress_manager.get_weak_topics()
         
         messagebox.showinfo("Успех", 
                           f"Mastery темы '{self.current_topic}' обновлен: "
                           f"{self.progress_manager.progress_data['topics'][self.current_topic]['mastery_score']:.1f}%")
         
-        # Обновляем интерфейс
-        self.update_topics_list()
-        self.update_stats()
-        self.generate_plan()
+        # Обновляем интерфейс: mastery меняет срок повторения темы, а список - только для слабых тем
+        self._note_topics_changed([self.current_topic])
+        changed_tabs = {STATS_TAB, PLAN_TAB}
+        if self.current_topic in weak_before or self.current_topic in weak_after:
+            changed_tabs.add(PRACTICE_TAB)
+        self.mark_tabs_changed(changed_tabs)
+    
+    def _note_topics_changed(self, topics):
+        """Запоминает темы, строки которых нужно обновить в таблице статистики"""
+        if self._stats_changed_topics is not None:
+            self._stats_changed_topics.update(topics)
     
-    def update_stats(self):
-        """Обновляет статистику"""
+    def _refresh_stats(self):
+        """Обновляет статистику, перерисовывая в таблице только изменившиеся темы"""
+        changed_topics = self._stats_changed_topics
+        self._stats_changed_topics = set()
+        self.update_stats(changed_topics)
+    
+    @timed("render.update_stats")
+    def update_stats(self, changed_topics=None):
+        """Обновляет статистику; changed_topics - темы, изменившиеся с прошлого обновления (None - все)"""
         if not self.current_student:
             return
         
-        weekly_report = self.analytics.get_weekly_report()
-        stats = self.progress_manager.get_progress_summary()
+        with self.progress_manager.lock:
+            weekly_report = self.analytics.get_weekly_report()
+            stats = dict(self.progress_manager.get_progress_summary())
+            all_topics = self.progress_manager.progress_data["topics"]
+            names = all_topics if changed_topics is None else [topic for topic in changed_topics if topic in all_topics]
+            rows = {}
+            for topic in names:
+                data = all_topics[topic]
+                rows[topic] = (topic, data.mastery_score, data.encounter_count, data.difficulty_level, data.last_seen)
+        
+        # Общая статистика и недельный отчет
+        lines = [
+            "📊 ОБЩАЯ СТАТИСТИКА:\n",
+            f"• Всего проанализировано работ: {stats['total_works_analyzed']}",
+            f"• Изучено тем: {stats['topics_worked']}",
+            f"• Всего сессий: {stats['total_sessions']}\n",
+            "📅 ОТЧЕТ ЗА НЕДЕЛЮ:\n",
+            f"• Сессий: {weekly_report['sessions_count']}",
+            f"• Активных тем: {weekly_report['active_topics']}"
+        ]
+        if weekly_report['most_problematic_topics']:
+            lines.append("\n📈 САМЫЕ ПРОБЛЕМНЫЕ ТЕМЫ:\n")
+            lines.extend(f"• {topic}: {count} раз(а)" for topic, count in weekly_report['most_problematic_topics'])
         
         self.stats_text.config(state=tk.NORMAL)
         self.stats_text.delete(1.0, tk.END)
-        
-        # Общая статистика
-        self.stats_text.insert(tk.END, "📊 ОБЩАЯ СТАТИСТИКА:\n\n")
-        self.stats_text.insert(tk.END, f"• Всего проанализировано работ: {stats['total_works_analyzed']}\n")
-        self.stats_text.insert(tk.END, f"• Изучено тем: {stats['topics_worked']}\n")
-        self.stats_text.insert(tk.END, f"• Всего сессий: {stats['total_sessions']}\n\n")
-        
-        # Недельный отчет
-        self.stats_text.insert(tk.END, "📅 ОТЧЕТ ЗА НЕДЕЛЮ:\n\n")
-        self.stats_text.insert(tk.END, f"• Сессий: {weekly_report['sessions_count']}\n")
-        self.stats_text.insert(tk.END, f"• Активных тем: {weekly_report['active_topics']}\n\n")
-        
-        if weekly_report['most_problematic_topics']:
-            self.stats_text.insert(tk.END, "📈 САМЫЕ ПРОБЛЕМНЫЕ ТЕМЫ:\n\n")
-            for topic, count in weekly_report['most_problematic_topics']:
-                self.stats_text.insert(tk.END, f"• {topic}: {count} раз(а)\n")
+        self.stats_text.insert(tk.END, "\n".join(lines))
+        self.stats_text.config(state=tk.DISABLED)
         
         # Прогресс по темам
-        self.stats_text.insert(tk.END, "\n🎯 ПРОГРЕСС ПО ТЕМАМ:\n\n")
-        for topic, data in self.progress_manager.progress_data["topics"].items():
-            last_practiced = datetime.fromisoformat(data["last_practiced"]).strftime("%d.%m.%Y")
-            self.stats_text.insert(tk.END, f"• {topic}:\n")
-            self.stats_text.insert(tk.END, f"  Mastery: {data['mastery_score']:.1f}%\n")
-            self.stats_text.insert(tk.END, f"  Встречалась: {data['encounter_count']} раз\n")
-            self.stats_text.insert(tk.END, f"  Уровень: {data['difficulty_level']}\n\n")
-        
-        self.stats_text.config(state=tk.DISABLED)
+        if changed_topics is None:
+            self.topics_table.set_rows(rows)
+        else:
+            self.topics_table.update_rows(rows)
     
+    @timed("render.generate_plan")
     def generate_plan(self):
         """Генерирует индивидуальный план занятий"""
         if not self.current_student:
             return
         
-        weak_topics = self.progress_manager.get_weak_topics()
+        from analytics import TARGET_MASTERY
         
-        self.plan_text.config(state=tk.NORMAL)
-        self.plan_text.delete(1.0, tk.END)
+        plan = self.analytics.get_weekly_plan()
+        planned_topics = [entry["topic"] for entry in plan if entry["topic"] is not None]
         
-        if not weak_topics:
-            self.plan_text.insert(tk.END, "🎉 У ВАС НЕТ СЛАБЫХ ТЕМ!\n\n")
-            self.plan_text.insert(tk.END, "Продолжайте в том же духе! Вы отлично справляетесь!\n\n")
-            self.plan_text.insert(tk.END, "Рекомендации для поддержания уровня:\n")
-            self.plan_text.insert(tk.END, "1. Решайте задачи повышенной сложности\n")
-            self.plan_text.insert(tk.END, "2. Помогайте одноклассникам\n")
-            self.plan_text.insert(tk.END, "3. Изучайте смежные темы")
-        else:
-            self.plan_text.insert(tk.END, "📚 ИНДИВИДУАЛЬНЫЙ ПЛАН НА НЕДЕЛЮ:\n\n")
-            
-            days_plan = [
-                "Понедельник", "Вторник", "Среда", "Четверг", 
-                "Пятница", "Суббота", "Воскресенье"
+        if not planned_topics:
+            lines = [
+                "🎉 НА ЭТОЙ НЕДЕЛЕ НЕТ ТЕМ ДЛЯ ПОВТОРЕНИЯ!\n",
+                "Продолжайте в том же духе! Вы отлично справляетесь!\n",
+                "Рекомендации для поддержания уровня:",
+                "1. Решайте задачи повышенной сложности",
+                "2. Помогайте одноклассникам",
+                "3. Изучайте смежные темы"
             ]
+        else:
+            lines = ["📚 ИНДИВИДУАЛЬНЫЙ ПЛАН НА НЕДЕЛЮ:\n"]
             
-            for i, day in enumerate(days_plan):
-                if i < len(weak_topics):
-                    topic = weak_topics[i]
-                    mastery = self.progress_manager.progress_data["topics"][topic]["mastery_score"]
-                    self.plan_text.insert(tk.END, f"📅 {day}: {topic}\n")
-                    self.plan_text.insert(tk.END, f"   Текущий mastery: {mastery:.1f}%\n")
-                    self.plan_text.insert(tk.END, f"   Цель: повысить до 80%\n\n")
+            for entry in plan:
+                if entry["topic"] is None:
+                    lines.append(f"📅 {entry['day']}, {entry['date']}: Повторение пройденного материала\n")
+                    continue
+                lines.append(f"📅 {entry['day']}, {entry['date']}: {entry['topic']}")
+                lines.append(f"   Текущий mastery: {entry['mastery']:.1f}%")
+                # Усвоенные темы попадают в план по сроку повторения, поднимать их mastery не нужно
+                if entry["mastery"] >= TARGET_MASTERY:
+                    lines.append("   Цель: повторение, чтобы не забыть\n")
                 else:
-                    self.plan_text.insert(tk.END, f"📅 {day}: Повторение пройденного материала\n\n")
+                    lines.append(f"   Цель: повысить до {TARGET_MASTERY}%\n")
             
-            self.plan_text.insert(tk.END, f"🎯 ГЛАВНАЯ ЦЕЛЬ НЕДЕЛИ:\n")
-            self.plan_text.insert(tk.END, f"Повысить mastery темы '{weak_topics[0]}' до 80%")
-        
+            # Главная цель - самая слабая из запланированных тем, а не тема с самым ранним сроком
+            weakest = min((entry for entry in plan if entry["topic"] is not None), key=lambda entry: entry["mastery"])
+            lines.append(f"🎯 ГЛАВНАЯ ЦЕЛЬ НЕДЕЛИ:")
+            if weakest["mastery"] < TARGET_MASTERY:
+                lines.append(f"Повысить mastery темы '{weakest['topic']}' до {TARGET_MASTERY}%")
+            else:
+                lines.append("Сохранить уровень: все темы недели уже усвоены, их нужно только повторить")
+        
+        # Текст собирается целиком и вставляется одной операцией
+        self.plan_text.config(state=tk.NORMAL)
+        self.plan_text.delete(1.0, tk.END)
+        self.plan_text.insert(tk.END, "\n".join(lines))
         self.plan_text.config(state=tk.DISABLED)
 
+    def on_close(self):
+        """Сохраняет отложенные изменения и закрывает приложение"""
+        if self.current_job:
+            self.current_job[1].set()
+        # Дожидаемся начатого сохранения, чтобы не потерять сессию
+        if self.executor:
+            self.executor.shutdown(wait=True)
+        if self.writer:
+            self.writer.flush()
+        self.root.destroy()
+
 def main():
+    # --startup-report: вывести время запуска и импорта модулей;
+    # --exit-after-startup: закрыть окно сразу после запуска (для benchmarks/startup.py)
+    import_timer = None
+    if "--startup-report" in sys.argv[1:]:
+        import_timer = instrumentation.ImportTimer()
+        import_timer.start()
+    
     root = tk.Tk()
-    app = SchoolHelperApp(root)
+    app = SchoolHelperApp(root, import_timer, exit_after_startup="--exit-after-startup" in sys.argv[1:])
     root.mainloop()
 
 if __name__ == "__main__":
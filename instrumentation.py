@@ -0,0 +1,340 @@
+"""Замеры времени этапов анализа, сохранения и отрисовки
+
+Замеры выключены по умолчанию: обернутая функция тогда только проверяет флаг и
+вызывает исходную. Включаются переменной окружения SCHOOL_HELPER_TIMINGS=1 или
+enable(). Для каждого этапа копится число вызовов и гистограмма задержек.
+"""
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from file_lock import atomic_write
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIAGNOSTICS_DIR = os.path.join(BASE_DIR, "data", "diagnostics")
+
+TIMINGS_ENV_VAR = "SCHOOL_HELPER_TIMINGS"
+
+# Верхние границы корзин гистограммы, секунды: от 10 мкс с шагом в два раза (до ~170 с)
+BUCKET_BOUNDS = tuple(0.00001 * 2 ** i for i in range(25))
+
+# Сколько строк отчета cProfile сохранять для показа
+PROFILE_REPORT_LINES = 30
+
+_enabled = os.environ.get(TIMINGS_ENV_VAR, "") not in ("", "0")
+_lock = threading.Lock()
+_histograms = {}
+
+
+class Histogram:
+    """Гистограмма задержек одного этапа в корзинах с границами BUCKET_BOUNDS"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        # Последняя корзина - для значений больше всех границ
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+
+    def percentile(self, percent):
+        """Возвращает оценку процентиля: верхнюю границу корзины, в которую он попал"""
+        if not self.count:
+            return 0.0
+        rank = self.count * percent / 100
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                bound = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min or 0.0,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            # Непустые корзины: верхняя граница (None - больше всех границ) и число замеров
+            "buckets": [[BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else None, count]
+                        for index, count in enumerate(self.buckets) if count]
+        }
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(flag=True):
+    """Включает или выключает сбор замеров"""
+    global _enabled
+    _enabled = bool(flag)
+
+
+def record(stage, seconds):
+    """Добавляет замер этапа"""
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = Histogram()
+        histogram.add(seconds)
+
+
+def timed(stage):
+    """Декоратор: замеряет каждый вызов функции как этап stage, если замеры включены"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(stage, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+class _Timer:
+    """Контекстный менеджер одного замера"""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class _NullTimer:
+    """Контекстный менеджер, который ничего не замеряет (замеры выключены)"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def measure(stage):
+    """Контекстный менеджер: замеряет блок кода как этап stage, если замеры включены"""
+    return _Timer(stage) if _enabled else _NULL_TIMER
+
+
+def snapshot():
+    """Возвращает замеры по этапам: число вызовов, суммарное и среднее время, процентили, корзины"""
+    with _lock:
+        return {stage: _histograms[stage].to_dict() for stage in sorted(_histograms)}
+
+
+def reset():
+    """Удаляет накопленные замеры"""
+    with _lock:
+        _histograms.clear()
+
+
+def dump_json(path=None):
+    """Сохраняет замеры в JSON; по умолчанию - в data/diagnostics с датой в имени. Возвращает путь"""
+    if path is None:
+        os.makedirs(DIAGNOSTICS_DIR, exist_ok=True)
+        path = os.path.join(DIAGNOSTICS_DIR, f"timings_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    import json
+
+    data = {"created": time.time(), "stages": snapshot()}
+    atomic_write(path, lambda f: json.dump(data, f, ensure_ascii=False, indent=2))
+    return path
+
+
+def format_report(stages=None):
+    """Возвращает замеры в виде текстовой таблицы (время в миллисекундах)"""
+    stages = snapshot() if stages is None else stages
+    lines = [f"{'Этап':<40} {'вызовов':>8} {'среднее':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'макс':>9}"]
+    for stage, data in stages.items():
+        lines.append(f"{stage:<40} {data['count']:>8} " + " ".join(
+            f"{data[key] * 1000:>9.2f}" for key in ("mean", "p50", "p90", "p99", "max")
+        ))
+    return "\n".join(lines)
+
+
+# Профилирование одного запуска анализа через cProfile
+
+_profile_requested = False
+_last_profile = None
+
+
+def request_profile(flag=True):
+    """Просит профилировать следующий запуск анализа (см. profile_if_requested)"""
+    global _profile_requested
+    _profile_requested = bool(flag)
+
+
+def profile_requested():
+    return _profile_requested
+
+
+def last_profile():
+    """Возвращает (путь к файлу .prof, текстовый отчет) последнего профилирования или None"""
+    return _last_profile
+
+
+class _Profiler:
+    """Профилирует блок кода в текущем потоке и сохраняет статистику в файл"""
+
+    def __init__(self, name):
+        # cProfile и pstats импортируются только при профилировании: они замедляют запуск приложения
+        import cProfile
+
+        self.name = name
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _last_profile
+        import io
+        import pstats
+
+        self.profile.disable()
+        try:
+            os.makedirs(DIAGNOSTICS_DIR, exist_ok=True)
+            path = os.path.join(DIAGNOSTICS_DIR, f"{self.name}_{time.strftime('%Y%m%d_%H%M%S')}.prof")
+            self.profile.dump_stats(path)
+            output = io.StringIO()
+            pstats.Stats(self.profile, stream=output).sort_stats("cumulative").print_stats(PROFILE_REPORT_LINES)
+            _last_profile = (path, output.getvalue())
+        except OSError as e:
+            print(f"Ошибка при сохранении профиля: {e}")
+        return False
+
+
+def profile_if_requested(name="analysis"):
+    """Возвращает профилировщик, если профилирование было запрошено (запрос при этом снимается)
+
+    Иначе возвращает пустой контекстный менеджер. cProfile видит только поток,
+    в котором вошли в блок."""
+    global _profile_requested
+    with _lock:
+        if not _profile_requested:
+            return _NULL_TIMER
+        _profile_requested = False
+    return _Profiler(name)
+
+
+# Время импорта модулей, как у python -X importtime
+
+class _TimedLoader:
+    """Обертка загрузчика модуля: замеряет выполнение кода модуля"""
+
+    def __init__(self, loader, timer):
+        self.loader = loader
+        self.timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        # После загрузки модулю возвращается исходный загрузчик
+        module.__loader__ = self.loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self.loader
+        self.timer._enter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.timer._exit(module.__name__)
+
+
+class _TimingFinder:
+    """Искатель модулей в начале sys.meta_path: находит модуль остальными искателями и оборачивает загрузчик"""
+
+    def __init__(self, timer):
+        self.timer = timer
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimedLoader(spec.loader, self.timer)
+            return spec
+        return None
+
+
+class ImportTimer:
+    """Замеряет время импорта модулей после start(): собственное и вместе с вложенными импортами"""
+
+    def __init__(self):
+        # (модуль, глубина вложенности, собственное время, общее время) в порядке завершения импорта
+        self.entries = []
+        self._finder = None
+        self._local = threading.local()
+        self._entries_lock = threading.Lock()
+
+    def start(self):
+        if self._finder is None:
+            self._finder = _TimingFinder(self)
+            sys.meta_path.insert(0, self._finder)
+
+    def stop(self):
+        if self._finder is not None:
+            sys.meta_path.remove(self._finder)
+            self._finder = None
+
+    def _enter(self):
+        stack = self._local.__dict__.setdefault("stack", [])
+        # [начало, время вложенных импортов]
+        stack.append([time.perf_counter(), 0.0])
+
+    def _exit(self, name):
+        stack = self._local.stack
+        started, children = stack.pop()
+        cumulative = time.perf_counter() - started
+        if stack:
+            stack[-1][1] += cumulative
+        with self._entries_lock:
+            self.entries.append((name, len(stack), cumulative - children, cumulative))
+
+    def total(self):
+        """Возвращает суммарное время импортов верхнего уровня, секунды"""
+        return sum(entry[3] for entry in self.entries if entry[1] == 0)
+
+    def format_report(self, limit=25):
+        """Возвращает самые долгие импорты (время в миллисекундах)"""
+        lines = [f"{'собств.':>9} {'всего':>9}  модуль"]
+        for name, depth, self_time, cumulative in sorted(self.entries, key=lambda entry: -entry[3])[:limit]:
+            lines.append(f"{self_time * 1000:>9.2f} {cumulative * 1000:>9.2f}  {'  ' * depth}{name}")
+        return "\n".join(lines)
@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import pickle
+from collections.abc import MutableMapping
+
+# Версия формата кэша; при изменении формата старый кэш перестраивается
+CACHE_FORMAT = 1
+
+# Модули, классы которых хранятся в кэше в скомпилированных индексах: при изменении
+# их кода (например, правил стемминга) индексы из кэша устаревают
+MATCHER_MODULES = ("keyword_matcher.py", "morphology.py")
+MODULES_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_code_fingerprint = None
+
+
+def _file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def code_fingerprint():
+    """Возвращает отпечаток кода модулей индексов (см. MATCHER_MODULES)"""
+    global _code_fingerprint
+    if _code_fingerprint is None:
+        parts = []
+        for name in MATCHER_MODULES:
+            try:
+                parts.append(_file_sha1(os.path.join(MODULES_DIR, name)))
+            except OSError:
+                parts.append(None)
+        _code_fingerprint = tuple(parts)
+    return _code_fingerprint
+
+
+class KnowledgeBase(MutableMapping):
+    """База знаний, загружаемая из файлов предметов (по одному JSON-файлу на предмет)
+
+    При первом обращении загружается только перечень тем и ключевых слов - из
+    кэша на диске, если исходные файлы не менялись. Описания и задания темы
+    читаются из файла предмета при первом обращении к этой теме. Скомпилированные
+    индексы ключевых слов тоже хранятся в кэше.
+
+    Добавление и удаление тем отслеживается счетчиком version. После изменения
+    вложенных данных темы (например, списка ключевых слов) нужно вызвать invalidate()."""
+
+    def __init__(self, source_dir, cache_file=None):
+        self.source_dir = source_dir
+        self.cache_file = cache_file
+        self.version = 0
+        # Тема -> (файл предмета или None для добавленных в коде тем, ключевые слова)
+        self._manifest = None
+        self._sources = None
+        self._topics = {}
+        self._loaded_files = set()
+        self._cached_matchers = {}
+
+    # Загрузка перечня тем
+
+    def _source_files(self):
+        return sorted(name for name in os.listdir(self.source_dir) if name.endswith(".json"))
+
+    def _read_subject(self, filename):
+        with open(os.path.join(self.source_dir, filename), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _ensure_manifest(self):
+        if self._manifest is None:
+            if not self._load_cache():
+                self._rebuild_manifest()
+        return self._manifest
+
+    def _load_cache(self):
+        """Загружает перечень тем и индексы из кэша, если исходные файлы не изменились"""
+        if not self.cache_file:
+            return False
+        try:
+            with open(self.cache_file, 'rb') as f:
+                cache = pickle.load(f)
+            if cache.get("format") != CACHE_FORMAT or cache.get("code") != code_fingerprint():
+                return False
+            cached_sources = {source[0]: source for source in cache["sources"]}
+        except FileNotFoundError:
+            return False
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError,
+                KeyError, IndexError, TypeError, ValueError) as e:
+            # Поврежденный кэш или кэш от другой версии кода - перестраиваем
+            print(f"Ошибка при чтении кэша базы знаний, кэш будет перестроен: {e}")
+            return False
+
+        filenames = self._source_files()
+        if sorted(cached_sources) != filenames:
+            return False
+
+        sources = []
+        touched = False
+        for filename in filenames:
+            path = os.path.join(self.source_dir, filename)
+            stat = os.stat(path)
+            name, mtime_ns, size, sha1 = cached_sources[filename]
+            if (mtime_ns, size) != (stat.st_mtime_ns, stat.st_size):
+                # Время изменения могло поменяться без изменения содержимого
+                if _file_sha1(path) != sha1:
+                    return False
+                touched = True
+            sources.append((filename, stat.st_mtime_ns, stat.st_size, sha1))
+
+        self._sources = sources
+        self._manifest = {topic: (filename, tuple(keywords)) for topic, filename, keywords in cache["manifest"]}
+        self._cached_matchers = cache["matchers"]
+        if touched:
+            self._save_cache()
+        return True
+
+    def _rebuild_manifest(self):
+        """Читает все файлы предметов и строит перечень тем заново"""
+        self._manifest = {}
+        self._sources = []
+        self._cached_matchers = {}
+        for filename in self._source_files():
+            path = os.path.join(self.source_dir, filename)
+            stat = os.stat(path)
+            self._sources.append((filename, stat.st_mtime_ns, stat.st_size, _file_sha1(path)))
+            for topic, data in self._read_subject(filename)["topics"].items():
+                self._manifest[topic] = (filename, tuple(data["keywords"]))
+                self._topics[topic] = data
+            self._loaded_files.add(filename)
+        self._save_cache()
+
+    def _save_cache(self):
+        if not self.cache_file or self.version:
+            return
+        cache = {
+            "format": CACHE_FORMAT,
+            "code": code_fingerprint(),
+            "sources": self._sources,
+            "manifest": [(topic, filename, list(keywords))
+                         for topic, (filename, keywords) in self._manifest.items()],
+            "matchers": self._cached_matchers
+        }
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            temp_file = self.cache_file + ".tmp"
+            with open(temp_file, 'wb') as f:
+                pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file, self.cache_file)
+        except OSError as e:
+            print(f"Ошибка при сохранении кэша базы знаний: {e}")
+
+    # Ключевые слова и индексы
+
+    def signature(self):
+        """Возвращает метку состояния базы: меняется при изменении файлов или тем"""
+        self._ensure_manifest()
+        return tuple(self._sources), self.version
+
+    def keyword_items(self):
+        """Перебирает пары (тема, ключевые слова) без загрузки описаний и заданий"""
+        return ((topic, keywords) for topic, (_, keywords) in self._ensure_manifest().items())
+
+    def compiled_matcher(self, mode, build):
+        """Возвращает индекс ключевых слов режима mode из кэша или строит его функцией build(patterns)"""
+        self._ensure_manifest()
+        if not self.version and mode in self._cached_matchers:
+            return self._cached_matchers[mode]
+
+        matcher = build((keyword, topic) for topic, keywords in self.keyword_items() for keyword in keywords)
+        if not self.version:
+            self._cached_matchers[mode] = matcher
+            self._save_cache()
+        return matcher
+
+    def invalidate(self):
+        """Сообщает об изменении данных тем: индексы будут перестроены"""
+        self._ensure_manifest()
+        for topic, data in self._topics.items():
+            filename = self._manifest[topic][0]
+            self._manifest[topic] = (filename, tuple(data["keywords"]))
+        self.version += 1
+
+    # Интерфейс словаря
+
+    def __getitem__(self, topic):
+        manifest = self._ensure_manifest()
+        if topic not in self._topics:
+            if topic not in manifest:
+                raise KeyError(topic)
+            filename = manifest[topic][0]
+            if filename not in self._loaded_files:
+                for name, data in self._read_subject(filename)["topics"].items():
+                    self._topics.setdefault(name, data)
+                self._loaded_files.add(filename)
+        return self._topics[topic]
+
+    def __setitem__(self, topic, data):
+        manifest = self._ensure_manifest()
+        filename = manifest[topic][0] if topic in manifest else None
+        manifest[topic] = (filename, tuple(data["keywords"]))
+        self._topics[topic] = data
+        self.version += 1
+
+    def __delitem__(self, topic):
+        manifest = self._ensure_manifest()
+        del manifest[topic]
+        self._topics.pop(topic, None)
+        self.version += 1
+
+    def __contains__(self, topic):
+        return topic in self._ensure_manifest()
+
+    def __iter__(self):
+        return iter(self._ensure_manifest())
+
+    def __len__(self):
+        return len(self._ensure_manifest())
@@ -0,0 +1,106 @@
+from collections import deque
+
+
+class KeywordMatcher:
+    """Автомат Ахо-Корасик: находит все вхождения набора ключевых слов за один проход по тексту"""
+
+    def __init__(self, patterns):
+        # patterns - список пар (ключевое слово, метка); метка возвращается при совпадении
+        self.patterns = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for keyword, label in patterns:
+            if not keyword:
+                continue
+            self.patterns.append((keyword, label))
+            self._add_pattern(keyword, len(self.patterns) - 1)
+
+        self._build_failure_links()
+
+    def _add_pattern(self, keyword, pattern_id):
+        """Добавляет ключевое слово в бор"""
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state].append(pattern_id)
+
+    def _build_failure_links(self):
+        """Строит суффиксные ссылки обходом бора в ширину"""
+        queue = deque(self._goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+
+                # Совпадения по суффиксной ссылке тоже являются совпадениями этого состояния
+                if self._output[self._fail[next_state]]:
+                    self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text):
+        """Возвращает кортежи (начало, конец, ключевое слово, метка) для каждого вхождения"""
+        return iter(self.stream().feed(text))
+
+    def stream(self):
+        """Возвращает объект для поиска в тексте, поступающем по частям (см. KeywordStream)"""
+        return KeywordStream(self)
+
+    def find_labels(self, text):
+        """Возвращает множество меток, ключевые слова которых встречаются в тексте"""
+        return {label for _, _, _, label in self.iter_matches(text)}
+
+
+class KeywordStream:
+    """Поиск ключевых слов в тексте, который подается по частям
+
+    Состояние автомата переносится между частями, поэтому ключевое слово, разрезанное
+    границей частей, тоже находится. Позиции совпадений отсчитываются от начала всего текста."""
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self._state = 0
+        self._offset = 0
+
+    def feed(self, chunk):
+        """Обрабатывает очередную часть текста; возвращает список совпадений, закончившихся в ней"""
+        matcher = self.matcher
+        goto = matcher._goto
+        fail = matcher._fail
+        output = matcher._output
+        patterns = matcher.patterns
+        state = self._state
+        offset = self._offset + 1
+        matches = []
+
+        for index, char in enumerate(chunk):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            if output[state]:
+                for pattern_id in output[state]:
+                    keyword, label = patterns[pattern_id]
+                    matches.append((offset + index - len(keyword), offset + index, keyword, label))
+
+        self._state = state
+        self._offset += len(chunk)
+        return matches
+
+    def finish(self):
+        """Завершает поиск; у автомата нет отложенных совпадений"""
+        return []
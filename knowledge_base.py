@@ -1,104 +1,226 @@
+import hashlib
+import os
 import random
+from analysis_cache import AnalysisCache, NormalizedText, iter_normalized
+from instrumentation import timed
+from keyword_matcher import KeywordMatcher
+from kb_loader import KnowledgeBase
+from morphology import TokenIndex
+from task_selector import TaskSelector
 
-# Расширенная база знаний с заданиями разного уровня сложности
-KNOWLEDGE_BASE = {
-    "Дроби": {
-        "keywords": ["дробь", "числитель", "знаменатель", "сократить", "привести к общему знаменателю", "несократимая", "делитель"],
-        "tasks": {
-            "easy": [
-                "Сократи дробь: 12/18",
-                "Запиши дробь: три седьмых",
-                "Какая дробь больше: 1/2 или 1/3?"
-            ],
-            "medium": [
-                "Приведи дроби 1/3 и 1/4 к общему знаменателю и сложи их.",
-                "Сократи дробь 24/36 до несократимого вида.",
-                "Выполни вычитание: 5/6 - 1/3"
-            ],
-            "hard": [
-                "Реши: (2/3 + 1/4) × 6/5",
-                "Найди значение выражения: 3/7 ÷ (1 - 2/5)",
-                "Сравни дроби, не приводя к общему знаменателю: 7/8 и 8/9"
-            ]
-        },
-        "description": "Работа с обыкновенными дробями"
-    },
-    "Правописание -ться/-тся": {
-        "keywords": ["учиться", "строиться", "получается", "здаться", "боится", "нравится", "смеяться", "пытаться"],
-        "tasks": {
-            "easy": [
-                "Вставьте -ться или -тся: Он хочет многому научи... . У него все получи... .",
-                "Составь простое предложение с глаголом 'нравится'"
-            ],
-            "medium": [
-                "Раскрой скобки: (учиться) - Он хорошо... в школе. Он хочет... на отлично.",
-                "Найди и исправь ошибки в тексте: 'Мне нравиться читать книги. Они помогают развиватся.'"
-            ],
-            "hard": [
-                "Напиши мини-рассказ (5-7 предложений), используя 3 глагола на -ться и 3 глагола на -тся",
-                "Объясни правило правописания -ться/-тся своими словами"
-            ]
-        },
-        "description": "Правописание глагольных окончаний"
-    },
-    "Площадь и периметр": {
-        "keywords": ["площадь", "периметр", "квадрат", "прямоугольник", "см²", "м²", "длина", "ширина"],
-        "tasks": {
-            "easy": [
-                "Найди периметр прямоугольника со сторонами 5 см и 7 см.",
-                "Найди площадь квадрата со стороной 6 см."
-            ],
-            "medium": [
-                "Площадь прямоугольника 24 см², а одна сторона 6 см. Найди вторую сторону и периметр.",
-                "Периметр квадрата 20 см. Найди его площадь."
-            ],
-            "hard": [
-                "Размеры комнаты 4 м × 5 м. Сколько нужно плиток размером 20 см × 20 см, чтобы покрыть пол?",
-                "Периметр прямоугольника 30 см, а площадь 54 см². Найди его стороны."
-            ]
-        },
-        "description": "Геометрические задачи на нахождение площади и периметра"
-    },
-    "Сложение и вычитание в столбик": {
-        "keywords": ["столбик", "сложение", "вычитание", "разряд", "перенос", "заём"],
-        "tasks": {
-            "easy": [
-                "Реши в столбик: 234 + 157",
-                "Вычти в столбик: 543 - 278"
-            ],
-            "medium": [
-                "Вычисли: 1204 + 893 + 56",
-                "Найди разность: 5000 - 1234"
-            ],
-            "hard": [
-                "Реши цепочку: (1000 - 234) + 567 - 89",
-                "Составь и реши свою задачу на сложение и вычитание многозначных чисел"
-            ]
-        },
-        "description": "Арифметические операции с многозначными числами"
-    }
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Файлы предметов с темами, ключевыми словами и заданиями (по одному на предмет)
+KNOWLEDGE_BASE_DIR = os.path.join(BASE_DIR, "data", "knowledge_base")
+# Кэш перечня тем и скомпилированных индексов ключевых слов
+KNOWLEDGE_BASE_CACHE = os.path.join(BASE_DIR, "data", "cache", "knowledge_base_index.pickle")
+# Кэш результатов анализа на диске (используется, если он включен переменной окружения)
+ANALYSIS_CACHE_DIR = os.path.join(BASE_DIR, "data", "cache", "analysis")
+
+# Кэш результатов анализа: "memory" (по умолчанию), "disk" (память и диск) или "off"
+ANALYSIS_CACHE_ENV_VAR = "SCHOOL_HELPER_ANALYSIS_CACHE"
+
+# База знаний с заданиями разного уровня сложности; темы загружаются из файлов при первом обращении
+KNOWLEDGE_BASE = KnowledgeBase(KNOWLEDGE_BASE_DIR, KNOWLEDGE_BASE_CACHE)
+
+# Режимы поиска тем: по основам слов (морфология) или по подстрокам, как раньше
+MATCH_MODE_MORPHOLOGY = "morphology"
+MATCH_MODE_SUBSTRING = "substring"
+DEFAULT_MATCH_MODE = MATCH_MODE_SUBSTRING
+
+_MATCHER_CLASSES = {
+    MATCH_MODE_MORPHOLOGY: TokenIndex,
+    MATCH_MODE_SUBSTRING: KeywordMatcher,
 }
 
-def get_topics_by_keywords(text):
-    """Находит темы по ключевым словам в тексте"""
-    text = text.lower()
-    found_topics = []
+# Скомпилированные индексы по режимам, снимок базы, из которой они построены, и отпечаток ее содержимого
+_matchers = {}
+_matcher_signature = None
+_kb_fingerprint = None
+
+def _make_analysis_cache():
+    cache_mode = os.environ.get(ANALYSIS_CACHE_ENV_VAR, "memory")
+    if cache_mode == "off":
+        return None
+    return AnalysisCache(disk_dir=ANALYSIS_CACHE_DIR if cache_mode == "disk" else None)
+
+# Результаты анализа текстов по хэшу нормализованного текста (см. analyze_stream)
+ANALYSIS_CACHE = _make_analysis_cache()
+
+def _kb_signature():
+    """Возвращает снимок базы знаний для проверки актуальности индексов"""
+    if isinstance(KNOWLEDGE_BASE, KnowledgeBase):
+        return KNOWLEDGE_BASE.signature()
+    # Обычный словарь (например, подставленный в тестах) сравниваем по ключевым словам
+    return tuple((topic, tuple(data["keywords"])) for topic, data in KNOWLEDGE_BASE.items())
+
+def _compute_kb_fingerprint(signature):
+    """Возвращает хэш тем и ключевых слов базы: одинаков в разных процессах при одинаковом содержимом"""
+    digest = hashlib.sha1()
+    items = KNOWLEDGE_BASE.keyword_items() if isinstance(KNOWLEDGE_BASE, KnowledgeBase) else signature
+    for topic, keywords in items:
+        digest.update("\x1e".join((topic,) + tuple(keywords)).encode("utf-8") + b"\x1d")
+    return digest.hexdigest()
+
+def get_keyword_matcher(mode=None):
+    """Возвращает индекс ключевых слов, перестраивая его при изменении KNOWLEDGE_BASE"""
+    global _matcher_signature, _kb_fingerprint
+    
+    mode = mode or DEFAULT_MATCH_MODE
+    if mode not in _MATCHER_CLASSES:
+        raise ValueError(f"Неизвестный режим поиска: {mode}")
+    
+    signature = _kb_signature()
+    if signature != _matcher_signature:
+        _matchers.clear()
+        _matcher_signature = signature
+        fingerprint = _compute_kb_fingerprint(signature)
+        # Результаты анализа по прежней базе больше не нужны
+        if ANALYSIS_CACHE is not None and fingerprint != _kb_fingerprint:
+            ANALYSIS_CACHE.invalidate(fingerprint)
+        _kb_fingerprint = fingerprint
+    
+    if mode not in _matchers:
+        if isinstance(KNOWLEDGE_BASE, KnowledgeBase):
+            _matchers[mode] = KNOWLEDGE_BASE.compiled_matcher(mode, _MATCHER_CLASSES[mode])
+        else:
+            _matchers[mode] = _MATCHER_CLASSES[mode](
+                (keyword, topic) for topic, keywords in signature for keyword in keywords
+            )
+    return _matchers[mode]
+
+def _prepare_text(text, mode):
+    """Подготавливает текст для поиска: подстрочный режим работает с текстом в нижнем регистре"""
+    if (mode or DEFAULT_MATCH_MODE) == MATCH_MODE_SUBSTRING:
+        return text.lower()
+    return text
+
+def find_keyword_matches(text, mode=None):
+    """Находит все вхождения ключевых слов: позиции и количество совпадений по каждой теме"""
+    matcher = get_keyword_matcher(mode)
+    matches = {}
     
-    for topic, data in KNOWLEDGE_BASE.items():
-        for keyword in data["keywords"]:
-            if keyword in text:
-                if topic not in found_topics:
-                    found_topics.append(topic)
-                break
+    for start, end, keyword, topic in matcher.iter_matches(_prepare_text(text, mode)):
+        topic_matches = matches.setdefault(topic, {"count": 0, "matches": []})
+        topic_matches["count"] += 1
+        topic_matches["matches"].append((start, end, keyword))
     
-    return found_topics
-
-def get_task_for_topic(topic, difficulty="medium"):
-    """Возвращает случайное задание по теме заданной сложности"""
-    if topic in KNOWLEDGE_BASE and difficulty in KNOWLEDGE_BASE[topic]["tasks"]:
-        tasks = KNOWLEDGE_BASE[topic]["tasks"][difficulty]
-        return random.choice(tasks)
-    return None
+    # Сохраняем порядок тем как в базе знаний
+    return {topic: matches[topic] for topic in KNOWLEDGE_BASE if topic in matches}
+
+@timed("analyze.get_topics_by_keywords")
+def get_topics_by_keywords(text, mode=None):
+    """Находит темы по ключевым словам в тексте
+
+    mode="morphology" включает поиск по основам слов вместо поиска по подстрокам (DEFAULT_MATCH_MODE)."""
+    found = get_keyword_matcher(mode).find_labels(_prepare_text(text, mode))
+    return [topic for topic in KNOWLEDGE_BASE if topic in found]
+
+# Размер куска текста при потоковом анализе (в символах)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def iter_text_chunks(source, chunk_size=STREAM_CHUNK_SIZE):
+    """Перебирает текст кусками: source - строка, открытый текстовый файл или итератор строк"""
+    if isinstance(source, str):
+        for start in range(0, len(source), chunk_size):
+            yield source[start:start + chunk_size]
+    elif hasattr(source, "read"):
+        yield from iter(lambda: source.read(chunk_size), "")
+    else:
+        yield from source
+
+def _count_topics(chunks, mode, cancelled):
+    """Считает совпадения по темам в тексте, поданном кусками; возвращает None при отмене"""
+    stream = get_keyword_matcher(mode).stream()
+    counts = {}
+
+    def count(matches):
+        for _, _, _, topic in matches:
+            counts[topic] = counts.get(topic, 0) + 1
+
+    for chunk in chunks:
+        if cancelled and cancelled():
+            return None
+        count(stream.feed(_prepare_text(chunk, mode)))
+    count(stream.finish())
+    return {"topics": [topic for topic in KNOWLEDGE_BASE if topic in counts], "counts": counts}
+
+def _measure_chunks(chunks, info, excerpt_length):
+    """Пропускает куски текста, запоминая его длину и начало"""
+    for chunk in chunks:
+        if len(info["excerpt"]) < excerpt_length:
+            info["excerpt"] += chunk[:excerpt_length - len(info["excerpt"])]
+        info["length"] += len(chunk)
+        yield chunk
+
+@timed("analyze.analyze_stream")
+def analyze_stream(source, mode=None, chunk_size=STREAM_CHUNK_SIZE, excerpt_length=101, cancelled=None,
+                   use_cache=True):
+    """Находит темы в тексте, читая его по частям: память не зависит от длины текста
+
+    source - строка, открытый текстовый файл или итератор кусков текста; cancelled -
+    функция, после возврата True из которой анализ прерывается и возвращается None.
+    Результат - словарь: "topics" - темы в порядке базы знаний, "counts" - число
+    совпадений по темам, "length" - длина текста, "excerpt" - начало текста.
+
+    Анализируется нормализованный текст (нижний регистр, схлопнутые пробелы), поэтому
+    результат с кэшем и без него один и тот же. С кэшем результат для уже
+    встречавшегося текста берется из ANALYSIS_CACHE. Строку и
+    файл с произвольным доступом сначала читают, чтобы посчитать хэш, и анализируют
+    вторым проходом только при промахе."""
+    mode = mode or DEFAULT_MATCH_MODE
+    info = {"length": 0, "excerpt": ""}
+    chunks = _measure_chunks(iter_text_chunks(source, chunk_size), info, excerpt_length)
+    cache = ANALYSIS_CACHE if use_cache else None
+
+    if cache is None:
+        result = _count_topics(iter_normalized(chunks), mode, cancelled)
+    else:
+        get_keyword_matcher(mode)
+        normalized = NormalizedText()
+        rewindable = isinstance(source, str) or (hasattr(source, "seekable") and source.seekable())
+        if rewindable:
+            position = None if isinstance(source, str) else source.tell()
+            for _ in normalized.feed(chunks):
+                if cancelled and cancelled():
+                    return None
+            key = cache.make_key(normalized.hexdigest(), mode, _kb_fingerprint)
+            result = cache.get(key)
+            if result is None:
+                if position is not None:
+                    source.seek(position)
+                result = _count_topics(iter_normalized(iter_text_chunks(source, chunk_size)), mode, cancelled)
+                if result is not None:
+                    cache.put(key, result)
+        else:
+            # Источник читается один раз: хэш считается во время анализа, кэш только пополняется
+            result = _count_topics(normalized.feed(chunks), mode, cancelled)
+            if result is not None:
+                cache.put(cache.make_key(normalized.hexdigest(), mode, _kb_fingerprint), result)
+
+    if result is None:
+        return None
+    return {
+        "topics": list(result["topics"]),
+        "counts": dict(result["counts"]),
+        "length": info["length"],
+        "excerpt": info["excerpt"]
+    }
+
+def get_analysis_cache_stats():
+    """Возвращает статистику кэша результатов анализа или None, если кэш выключен"""
+    return ANALYSIS_CACHE.stats() if ANALYSIS_CACHE is not None else None
+
+# Подбор заданий без повторения недавних
+task_selector = TaskSelector(lambda: KNOWLEDGE_BASE, random)
+
+def get_task_for_topic(topic, difficulty="medium", recent=()):
+    """Возвращает случайное задание по теме заданной сложности, по возможности не из недавних"""
+    return task_selector.select(topic, difficulty, recent)
+
+@timed("analyze.get_tasks_for_topics")
+def get_tasks_for_topics(requests, recent_by_topic=None):
+    """Подбирает задания сразу для многих тем: requests - пары (тема, сложность)"""
+    return task_selector.select_batch(requests, recent_by_topic)
 
 def get_topic_description(topic):
     """Возвращает описание темы"""
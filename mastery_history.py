@@ -0,0 +1,275 @@
+"""История mastery тем ученика: временные ряды с прореживанием старых точек
+
+Каждая оценка добавляет точку (время, mastery) в ряд темы. Ряд хранится в трех
+уровнях подробности, каждый - столбцами массивов фиксированной ширины: время
+(микросекунды от начала эпохи), значение и число исходных оценок в точке.
+Точки старше срока хранения уровня переходят на следующий уровень: отдельные
+оценки - в средние за день, средние за день - в средние за неделю, а самые
+старые недели удаляются. Поэтому размер истории ограничен сроками хранения,
+а не числом оценок.
+"""
+import heapq
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from progress_model import MICROSECOND, from_epoch, to_epoch
+
+# Сроки хранения уровней, дней: отдельные оценки, средние за день, средние за неделю (0 - без удаления)
+RAW_RETENTION_DAYS = 14
+DAILY_RETENTION_DAYS = 180
+WEEKLY_RETENTION_DAYS = 3 * 365
+
+# Сроки хранения можно переопределить переменной окружения: "дни оценок,дни дней,дни недель"
+RETENTION_ENV_VAR = "SCHOOL_HELPER_MASTERY_RETENTION"
+
+RAW, DAILY, WEEKLY = range(3)
+
+_DAY = timedelta(days=1) // MICROSECOND
+# 1 января 1970 года - четверг: до понедельника три дня
+_WEEK_OFFSET = 3 * _DAY
+
+
+def _default_retention():
+    value = os.environ.get(RETENTION_ENV_VAR)
+    if not value:
+        return RAW_RETENTION_DAYS, DAILY_RETENTION_DAYS, WEEKLY_RETENTION_DAYS
+    try:
+        raw_days, daily_days, weekly_days = (int(part) for part in value.split(","))
+    except ValueError:
+        print(f"Ошибка в {RETENTION_ENV_VAR}: ожидается три числа через запятую, получено {value!r}")
+        return RAW_RETENTION_DAYS, DAILY_RETENTION_DAYS, WEEKLY_RETENTION_DAYS
+    return raw_days, daily_days, weekly_days
+
+
+DEFAULT_RETENTION = _default_retention()
+
+
+def day_start(epoch):
+    """Начало дня (микросекунды от начала эпохи), в который попадает момент epoch"""
+    return epoch - epoch % _DAY
+
+
+def week_start(epoch):
+    """Начало недели (понедельник), в которую попадает момент epoch"""
+    return epoch - (epoch + _WEEK_OFFSET) % (7 * _DAY)
+
+
+class MasterySeries:
+    """Один уровень ряда: точки по возрастанию времени в массивах фиксированной ширины"""
+
+    __slots__ = ("times", "values", "counts")
+
+    def __init__(self):
+        self.times = array('q')
+        self.values = array('d')
+        self.counts = array('l')
+
+    def __len__(self):
+        return len(self.times)
+
+    def add(self, time, value, count=1):
+        """Добавляет точку; точка с тем же временем объединяется с ней (среднее по числу оценок)"""
+        times = self.times
+        # Обычно точки приходят по возрастанию времени - тогда это добавление в конец
+        index = len(times) if not times or times[-1] < time else bisect_left(times, time)
+        if index < len(times) and times[index] == time:
+            total = self.counts[index] + count
+            self.values[index] = (self.values[index] * self.counts[index] + value * count) / total
+            self.counts[index] = total
+        else:
+            times.insert(index, time)
+            self.values.insert(index, value)
+            self.counts.insert(index, count)
+
+    def cut(self, before):
+        """Удаляет точки раньше момента before и возвращает их списком кортежей (время, значение, число)"""
+        end = bisect_left(self.times, before)
+        if not end:
+            return []
+        removed = list(zip(self.times[:end], self.values[:end], self.counts[:end]))
+        del self.times[:end]
+        del self.values[:end]
+        del self.counts[:end]
+        return removed
+
+    def range(self, start, end):
+        """Возвращает точки в промежутке [start, end] за O(log n + k)"""
+        first = bisect_left(self.times, start)
+        last = bisect_right(self.times, end)
+        return list(zip(self.times[first:last], self.values[first:last], self.counts[first:last]))
+
+    def last_before(self, time):
+        """Возвращает последнюю точку раньше момента time или None"""
+        index = bisect_left(self.times, time)
+        if not index:
+            return None
+        return self.times[index - 1], self.values[index - 1], self.counts[index - 1]
+
+    def to_json(self):
+        """Время - разностями с предыдущей точкой; число оценок опускается, если все точки - отдельные оценки"""
+        deltas = [time - previous for time, previous in zip(self.times, [0] + list(self.times[:-1]))]
+        if all(count == 1 for count in self.counts):
+            return [deltas, list(self.values)]
+        return [deltas, list(self.values), list(self.counts)]
+
+    @classmethod
+    def from_json(cls, data):
+        series = cls()
+        time = 0
+        for delta in data[0]:
+            time += delta
+            series.times.append(time)
+        series.values.extend(data[1])
+        series.counts.extend(data[2] if len(data) > 2 else [1] * len(data[1]))
+        return series
+
+
+class MasteryHistory:
+    """История mastery всех тем ученика
+
+    retention - сроки хранения уровней в днях (оценки, дни, недели); прореживание
+    выполняется при добавлении первой оценки нового дня и зависит только от дат
+    оценок, поэтому повторное применение журнала дает ту же историю."""
+
+    def __init__(self, retention=None):
+        self.retention = tuple(retention or DEFAULT_RETENTION)
+        # Тема -> [оценки, средние за день, средние за неделю]
+        self.topics = {}
+        # День, по который история уже прорежена
+        self._downsampled_day = None
+
+    def __len__(self):
+        return len(self.topics)
+
+    def __contains__(self, topic):
+        return topic in self.topics
+
+    def add(self, topic, date, mastery_score):
+        """Добавляет оценку темы: date - ISO-строка, datetime или микросекунды от начала эпохи"""
+        time = date if isinstance(date, int) else to_epoch(date)
+        series = self.topics.get(topic)
+        if series is None:
+            series = self.topics[topic] = [MasterySeries(), MasterySeries(), MasterySeries()]
+        series[RAW].add(time, mastery_score)
+
+        day = day_start(time)
+        if self._downsampled_day is None or day > self._downsampled_day:
+            self.downsample(time)
+
+    def _cutoffs(self, now):
+        """Границы уровней для момента now: оценки с raw_cutoff, дни с daily_cutoff, недели с weekly_cutoff"""
+        raw_days, daily_days, weekly_days = self.retention
+        # Границы выровнены по дням и неделям, чтобы день или неделя не делились между уровнями
+        return (day_start(now - raw_days * _DAY), week_start(now - daily_days * _DAY),
+                week_start(now - weekly_days * _DAY) if weekly_days else None)
+
+    def downsample(self, now=None):
+        """Переводит точки старше сроков хранения на следующий уровень и удаляет самые старые недели"""
+        now = to_epoch(now or datetime.now()) if not isinstance(now, int) else now
+        raw_cutoff, daily_cutoff, weekly_cutoff = self._cutoffs(now)
+        for topic in list(self.topics):
+            raw, daily, weekly = self.topics[topic]
+            for time, value, count in raw.cut(raw_cutoff):
+                daily.add(day_start(time), value, count)
+            for time, value, count in daily.cut(daily_cutoff):
+                weekly.add(week_start(time), value, count)
+            if weekly_cutoff is not None:
+                weekly.cut(weekly_cutoff)
+            if not (raw or daily or weekly):
+                del self.topics[topic]
+        self._downsampled_day = day_start(now)
+
+    # Запросы
+
+    def points(self, topic, since, until=None):
+        """Возвращает точки темы в промежутке [since, until] со всех уровней: кортежи (время, mastery, число оценок)"""
+        series = self.topics.get(topic)
+        if series is None:
+            return []
+        start = to_epoch(since) if not isinstance(since, int) else since
+        end = to_epoch(until or datetime.now()) if not isinstance(until, int) else until
+        return list(heapq.merge(*(level.range(start, end) for level in series)))
+
+    def value_before(self, topic, time):
+        """Возвращает последнее значение mastery темы раньше момента time или None"""
+        series = self.topics.get(topic)
+        if series is None:
+            return None
+        candidates = [point for point in (level.last_before(time) for level in series) if point]
+        return max(candidates)[1] if candidates else None
+
+    def topic_trend(self, topic, days, now=None):
+        """Возвращает ряд mastery темы за последние days дней: пары (ISO-дата, mastery)"""
+        now = now or datetime.now()
+        return [(from_epoch(time), value) for time, value, _ in self.points(topic, now - timedelta(days=days), now)]
+
+    def student_trend(self, days, now=None):
+        """Изменение mastery по темам за последние days дней
+
+        Возвращает словарь тема -> {"start", "end", "change", "points"} для тем с оценками
+        за этот период; start - значение перед началом периода или первое в нем."""
+        now = now or datetime.now()
+        since = to_epoch(now - timedelta(days=days))
+        until = to_epoch(now)
+        trend = {}
+        for topic in self.topics:
+            points = self.points(topic, since, until)
+            if not points:
+                continue
+            start = self.value_before(topic, since)
+            if start is None:
+                start = points[0][1]
+            end = points[-1][1]
+            trend[topic] = {"start": start, "end": end, "change": end - start, "points": len(points)}
+        return trend
+
+    # Слияние и сохранение
+
+    def copy(self):
+        return MasteryHistory.from_json(self.to_json(), self.retention)
+
+    def merge(self, other):
+        """Добавляет точки другой истории того же ученика (например, сохраненной другим процессом)
+
+        Совпадающие по времени точки считаются одной оценкой и не удваиваются. Сначала
+        обе истории прорежаются по один и тот же день: иначе оценка, которая в одной
+        истории уже вошла в среднее за день, в другой осталась бы отдельной точкой."""
+        days = [day for day in (self._downsampled_day, other._downsampled_day) if day is not None]
+        if days:
+            day = max(days)
+            if other._downsampled_day != day:
+                other = other.copy()
+                other.downsample(day)
+            if self._downsampled_day != day:
+                self.downsample(day)
+        for topic, other_series in other.topics.items():
+            series = self.topics.get(topic)
+            if series is None:
+                series = self.topics[topic] = [MasterySeries(), MasterySeries(), MasterySeries()]
+            for level, other_level in zip(series, other_series):
+                known = set(level.times)
+                for time, value, count in zip(other_level.times, other_level.values, other_level.counts):
+                    if time not in known:
+                        level.add(time, value, count)
+
+    def to_json(self):
+        return {
+            "downsampled_day": self._downsampled_day,
+            "topics": {topic: [level.to_json() for level in series] for topic, series in self.topics.items()}
+        }
+
+    @classmethod
+    def from_json(cls, data, retention=None):
+        history = cls(retention)
+        history._downsampled_day = data.get("downsampled_day")
+        history.topics = {
+            topic: [MasterySeries.from_json(level) for level in series]
+            for topic, series in data.get("topics", {}).items()
+        }
+        return history
+
+    def __repr__(self):
+        points = sum(len(level) for series in self.topics.values() for level in series)
+        return f"MasteryHistory({len(self.topics)} тем, {points} точек)"
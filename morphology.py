@@ -0,0 +1,257 @@
+import re
+from collections import deque
+from functools import lru_cache
+from itertools import islice
+
+# Токен - последовательность букв и цифр (включая надстрочные, например "см²")
+TOKEN_RE = re.compile(r"[^\W_]+")
+# Токен в конце куска текста, который может продолжиться в следующем куске
+TRAILING_TOKEN_RE = re.compile(r"[^\W_]+$")
+
+VOWELS = "аеиоуыэюя"
+
+# Служебные слова не участвуют в поиске тем: их основы слишком короткие и
+# совпадают с основами значимых слов (например, "за" и "заём")
+STOP_WORDS = frozenset("""
+а без более бы был была были было в вам вас во вот все всего всех вы где да даже для до его
+ее ей если есть еще же за и из или им их к как какая какой когда кто ли между мне много мой
+мы на над нас не него нее нет ни них но ну о об он она они от перед по под после при про с
+сам со так такой там тем то тоже только тот ты у уж уже хоть чем через что чтобы эта эти это
+этот я
+""".split())
+
+# Минимальная длина основы; слова с более короткой основой индексируются и ищутся целиком.
+# Основы из двух букв ("уч", "бо") совпадают у слишком разных слов: "учу" и "учиться", "бой" и "боится"
+MIN_STEM_LENGTH = 3
+
+PERFECTIVE_GERUND_1 = ("в", "вши", "вшись")
+PERFECTIVE_GERUND_2 = ("ив", "ивши", "ившись", "ыв", "ывши", "ывшись")
+ADJECTIVE = ("ее", "ие", "ые", "ое", "ими", "ыми", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом",
+             "его", "ого", "ему", "ому", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею")
+PARTICIPLE_1 = ("ем", "нн", "вш", "ющ", "щ")
+PARTICIPLE_2 = ("ивш", "ывш", "ующ")
+REFLEXIVE = ("ся", "сь")
+VERB_1 = ("ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет", "ют", "ны", "ть",
+          "ешь", "нно")
+VERB_2 = ("ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй", "ил", "ыл", "им",
+          "ым", "ен", "ило", "ыло", "ено", "ят", "ует", "уют", "ит", "ыт", "ены", "ить", "ыть",
+          "ишь", "ую", "ю")
+NOUN = ("а", "ев", "ов", "ие", "ье", "е", "иями", "ями", "ами", "еи", "ии", "и", "ией", "ей", "ой",
+        "ий", "й", "иям", "ям", "ием", "ем", "ам", "ом", "о", "у", "ах", "иях", "ях", "ы", "ь", "ию",
+        "ью", "ю", "ия", "ья", "я")
+DERIVATIONAL = ("ость", "ост")
+
+
+def _longest_ending(word, endings):
+    """Возвращает самое длинное окончание из списка, на которое заканчивается слово"""
+    best = None
+    for ending in endings:
+        if word.endswith(ending) and (best is None or len(ending) > len(best)):
+            best = ending
+    return best
+
+
+def _remove_grouped(word, group_after_a, group_plain):
+    """Удаляет окончание; окончания первой группы удаляются только после "а" или "я"
+
+    Возвращает укороченное слово или None, если окончание не найдено."""
+    ending = _longest_ending(word, group_after_a + group_plain)
+    if ending is None:
+        return None
+    stem = word[:-len(ending)]
+    if ending in group_plain:
+        return stem
+    if stem.endswith(("а", "я")):
+        return stem
+    return None
+
+
+def _region_start(word, start):
+    """Возвращает позицию после первой согласной, следующей за гласной (начало R1/R2)"""
+    index = start
+    while index < len(word) and word[index] not in VOWELS:
+        index += 1
+    index += 1
+    while index < len(word) and word[index] in VOWELS:
+        index += 1
+    return min(index + 1, len(word))
+
+
+def stem(word):
+    """Возвращает основу русского слова (стеммер Портера/Snowball для русского языка)"""
+    word = word.lower().replace("ё", "е")
+
+    rv_start = len(word)
+    for index, char in enumerate(word):
+        if char in VOWELS:
+            rv_start = index + 1
+            break
+
+    r2_start = _region_start(word, _region_start(word, 0))
+    prefix, rv = word[:rv_start], word[rv_start:]
+    r2 = max(r2_start - rv_start, 0)
+
+    # Шаг 1: деепричастия, иначе возвратные частицы и прилагательные/глаголы/существительные
+    result = _remove_grouped(rv, PERFECTIVE_GERUND_1, PERFECTIVE_GERUND_2)
+    if result is not None:
+        rv = result
+    else:
+        ending = _longest_ending(rv, REFLEXIVE)
+        if ending:
+            rv = rv[:-len(ending)]
+
+        ending = _longest_ending(rv, ADJECTIVE)
+        if ending:
+            rv = rv[:-len(ending)]
+            result = _remove_grouped(rv, PARTICIPLE_1, PARTICIPLE_2)
+            if result is not None:
+                rv = result
+        else:
+            result = _remove_grouped(rv, VERB_1, VERB_2)
+            if result is not None:
+                rv = result
+            else:
+                ending = _longest_ending(rv, NOUN)
+                if ending:
+                    rv = rv[:-len(ending)]
+
+    # Шаг 2: окончание "и"
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательные суффиксы в R2
+    ending = _longest_ending(rv, DERIVATIONAL)
+    if ending and len(rv) - len(ending) >= r2:
+        rv = rv[:-len(ending)]
+
+    # Шаг 4: превосходная степень, двойное "н" и мягкий знак
+    ending = _longest_ending(rv, ("ейше", "ейш", "н", "ь"))
+    if ending in ("ейше", "ейш"):
+        rv = rv[:-len(ending)]
+        if rv.endswith("нн"):
+            rv = rv[:-1]
+    elif ending == "н":
+        if rv.endswith("нн"):
+            rv = rv[:-1]
+    elif ending == "ь":
+        rv = rv[:-1]
+
+    return prefix + rv
+
+
+@lru_cache(maxsize=65536)
+def normalize_token(token):
+    """Возвращает ключ токена для индекса: основу слова или само слово, если основа слишком короткая"""
+    token = token.lower().replace("ё", "е")
+    token_stem = stem(token)
+    return token_stem if len(token_stem) >= MIN_STEM_LENGTH else token
+
+
+def tokenize(text):
+    """Возвращает кортежи (начало, конец, ключ) для значимых слов текста"""
+    for match in TOKEN_RE.finditer(text):
+        token = match.group().lower()
+        if token in STOP_WORDS:
+            continue
+        yield match.start(), match.end(), normalize_token(token)
+
+
+class TokenIndex:
+    """Инвертированный индекс основ ключевых слов: тема ищется по каждому токену за O(1)"""
+
+    def __init__(self, patterns):
+        # patterns - список пар (ключевое слово, метка), как у KeywordMatcher
+        self.patterns = []
+        # Ключ первого токена -> список (ключи всех токенов фразы, номер шаблона)
+        self._index = {}
+        self.max_phrase_length = 1
+
+        for keyword, label in patterns:
+            keys = tuple(key for _, _, key in tokenize(keyword))
+            if not keys:
+                continue
+            self.patterns.append((keyword, label))
+            self._index.setdefault(keys[0], []).append((keys, len(self.patterns) - 1))
+            self.max_phrase_length = max(self.max_phrase_length, len(keys))
+
+    def iter_matches(self, text):
+        """Возвращает кортежи (начало, конец, ключевое слово, метка) для каждого вхождения"""
+        tokens = list(tokenize(text))
+        index = self._index
+        patterns = self.patterns
+
+        for position, (start, _, key) in enumerate(tokens):
+            candidates = index.get(key)
+            if not candidates:
+                continue
+            for keys, pattern_id in candidates:
+                end_position = position + len(keys)
+                if end_position > len(tokens):
+                    continue
+                if len(keys) > 1 and tuple(token[2] for token in tokens[position:end_position]) != keys:
+                    continue
+                keyword, label = patterns[pattern_id]
+                yield start, tokens[end_position - 1][1], keyword, label
+
+    def stream(self):
+        """Возвращает объект для поиска в тексте, поступающем по частям (см. TokenStream)"""
+        return TokenStream(self)
+
+    def find_labels(self, text):
+        """Возвращает множество меток, ключевые слова которых встречаются в тексте"""
+        return {label for _, _, _, label in self.iter_matches(text)}
+
+
+class TokenStream:
+    """Поиск по индексу основ в тексте, который подается по частям
+
+    Слово на конце части откладывается до следующей части, а последние токены
+    хранятся, пока по ним может начаться фраза из нескольких слов. Память не зависит
+    от длины текста. Позиции совпадений отсчитываются от начала всего текста."""
+
+    def __init__(self, token_index):
+        self.token_index = token_index
+        self._tail = ""
+        self._offset = 0
+        self._tokens = deque()
+
+    def feed(self, chunk):
+        """Обрабатывает очередную часть текста; возвращает список найденных к этому моменту совпадений"""
+        text = self._tail + chunk
+        trailing = TRAILING_TOKEN_RE.search(text)
+        cut = trailing.start() if trailing else len(text)
+        self._add_tokens(text[:cut])
+        self._tail = text[cut:]
+        return self._drain(final=False)
+
+    def finish(self):
+        """Завершает поиск: обрабатывает отложенное слово и оставшиеся токены"""
+        self._add_tokens(self._tail)
+        self._tail = ""
+        return self._drain(final=True)
+
+    def _add_tokens(self, text):
+        offset = self._offset
+        self._tokens.extend((offset + start, offset + end, key) for start, end, key in tokenize(text))
+        self._offset += len(text)
+
+    def _drain(self, final):
+        """Проверяет совпадения, начинающиеся с токенов, после которых уже известно достаточно токенов"""
+        index = self.token_index._index
+        patterns = self.token_index.patterns
+        lookahead = self.token_index.max_phrase_length - 1
+        tokens = self._tokens
+        matches = []
+
+        while tokens and (final or len(tokens) > lookahead):
+            start, _, key = tokens[0]
+            for keys, pattern_id in index.get(key, ()):
+                if len(keys) > len(tokens):
+                    continue
+                phrase = list(islice(tokens, len(keys)))
+                if len(keys) > 1 and tuple(token[2] for token in phrase) != keys:
+                    continue
+                keyword, label = patterns[pattern_id]
+                matches.append((start, phrase[-1][1], keyword, label))
+            tokens.popleft()
+        return matches
@@ -0,0 +1,286 @@
+"""Компактное представление прогресса ученика в памяти и в снимках
+
+Состояние темы - объект со слотами, сессии - столбцы массивов: даты хранятся
+целыми микросекундами от начала эпохи, а названия тем и тексты заданий -
+номерами в таблице строк ученика. Снаружи данные выглядят как прежде: состояние
+темы ведет себя как словарь, сессия читается как словарь с ISO-датой.
+"""
+from array import array
+from collections.abc import MutableMapping, Sequence
+from datetime import datetime, timedelta
+
+# Версия компактного формата снимка (данные без поля "format" - словари старого формата)
+COMPACT_FORMAT = 2
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+DIFFICULTY_LEVELS = ("easy", "medium", "hard")
+
+TOPIC_FIELDS = ("first_encounter", "encounter_count", "last_practiced", "difficulty_level", "mastery_score")
+# Поля-даты и слоты, в которых они хранятся числами
+_DATE_SLOTS = {"first_encounter": "first_seen", "last_practiced": "last_seen"}
+_PLAIN_FIELDS = frozenset(("encounter_count", "difficulty_level", "mastery_score"))
+
+
+def to_epoch(value):
+    """Переводит дату (ISO-строку или datetime без часового пояса) в микросекунды от начала эпохи"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return (value - EPOCH) // MICROSECOND
+
+
+def to_datetime(value):
+    """Возвращает datetime по числу микросекунд от начала эпохи"""
+    return EPOCH + timedelta(microseconds=value)
+
+
+def from_epoch(value):
+    """Возвращает ISO-строку даты по числу микросекунд от начала эпохи"""
+    return to_datetime(value).isoformat()
+
+
+class StringTable:
+    """Таблица строк: каждая строка хранится один раз и заменяется номером"""
+
+    __slots__ = ("strings", "_ids")
+
+    def __init__(self, strings=()):
+        self.strings = list(strings)
+        self._ids = {string: index for index, string in enumerate(self.strings)}
+
+    def intern(self, string):
+        index = self._ids.get(string)
+        if index is None:
+            index = self._ids[string] = len(self.strings)
+            self.strings.append(string)
+        return index
+
+    def __getitem__(self, index):
+        return self.strings[index]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class TopicState(MutableMapping):
+    """Состояние темы ученика; как словарь отдает поля TOPIC_FIELDS, даты - ISO-строками"""
+
+    __slots__ = ("first_seen", "encounter_count", "last_seen", "difficulty_level", "mastery_score")
+
+    def __init__(self, first_seen, encounter_count=0, last_seen=None, difficulty_level="medium", mastery_score=0):
+        # first_seen и last_seen - микросекунды от начала эпохи
+        self.first_seen = first_seen
+        self.encounter_count = encounter_count
+        self.last_seen = first_seen if last_seen is None else last_seen
+        self.difficulty_level = difficulty_level
+        self.mastery_score = mastery_score
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(to_epoch(data["first_encounter"]), data["encounter_count"], to_epoch(data["last_practiced"]),
+                   data["difficulty_level"], data["mastery_score"])
+
+    @classmethod
+    def from_row(cls, row):
+        first_seen, encounter_count, last_seen, difficulty, mastery_score = row
+        if isinstance(difficulty, int):
+            difficulty = DIFFICULTY_LEVELS[difficulty]
+        return cls(first_seen, encounter_count, last_seen, difficulty, mastery_score)
+
+    def to_row(self):
+        """Возвращает строку снимка: даты числами, уровень сложности - номером в DIFFICULTY_LEVELS"""
+        difficulty = self.difficulty_level
+        if difficulty in DIFFICULTY_LEVELS:
+            difficulty = DIFFICULTY_LEVELS.index(difficulty)
+        return [self.first_seen, self.encounter_count, self.last_seen, difficulty, self.mastery_score]
+
+    def __getitem__(self, key):
+        slot = _DATE_SLOTS.get(key)
+        if slot is not None:
+            return from_epoch(getattr(self, slot))
+        if key in _PLAIN_FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        slot = _DATE_SLOTS.get(key)
+        if slot is not None:
+            setattr(self, slot, to_epoch(value))
+        elif key in _PLAIN_FIELDS:
+            setattr(self, key, value)
+        else:
+            raise KeyError(key)
+
+    def __delitem__(self, key):
+        raise TypeError("Поля состояния темы нельзя удалять")
+
+    def __iter__(self):
+        return iter(TOPIC_FIELDS)
+
+    def __len__(self):
+        return len(TOPIC_FIELDS)
+
+    def __repr__(self):
+        return f"TopicState({dict(self)!r})"
+
+
+class SessionLog(Sequence):
+    """Сессии ученика в столбцах
+
+    Элемент - словарь сессии прежнего вида (date, analyzed_text, found_topics,
+    recommended_tasks), который собирается при обращении. Темы и задания сессии
+    хранятся номерами строк подряд в общих массивах; *_ends - конец участка каждой сессии."""
+
+    def __init__(self, sessions=(), strings=None):
+        self.strings = strings or StringTable()
+        self.dates = array('q')
+        self.texts = []
+        self.topic_ids = array('l')
+        self.topic_ends = array('l')
+        # Пары (номер темы, номер задания)
+        self.task_ids = array('l')
+        self.task_ends = array('l')
+        self.extend(sessions)
+
+    def append(self, session):
+        """Добавляет сессию (словарь прежнего вида)"""
+        intern = self.strings.intern
+        self.dates.append(to_epoch(session["date"]))
+        self.texts.append(session["analyzed_text"])
+        self.topic_ids.extend(intern(topic) for topic in session["found_topics"])
+        self.topic_ends.append(len(self.topic_ids))
+        for topic, task in session["recommended_tasks"].items():
+            self.task_ids.append(intern(topic))
+            self.task_ids.append(intern(task))
+        self.task_ends.append(len(self.task_ids))
+
+    def extend(self, sessions):
+        for session in sessions:
+            self.append(session)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._session(i) for i in range(*index.indices(len(self)))]
+        return self._session(range(len(self))[index])
+
+    def _session(self, index):
+        strings = self.strings.strings
+        tasks = self.task_ids[self.task_ends[index - 1] if index else 0:self.task_ends[index]]
+        return {
+            "date": from_epoch(self.dates[index]),
+            "analyzed_text": self.texts[index],
+            "found_topics": self.found_topics(index),
+            "recommended_tasks": {strings[tasks[i]]: strings[tasks[i + 1]] for i in range(0, len(tasks), 2)}
+        }
+
+    def found_topics(self, index):
+        """Возвращает темы сессии по ее номеру без сборки словаря сессии"""
+        strings = self.strings.strings
+        start = self.topic_ends[index - 1] if index else 0
+        return [strings[topic_id] for topic_id in self.topic_ids[start:self.topic_ends[index]]]
+
+    def activity_since(self, since, until=None):
+        """Возвращает число сессий и активность по темам (тема -> число сессий) с даты since до даты until"""
+        since = to_epoch(since)
+        until = to_epoch(until) if until is not None else None
+        strings = self.strings.strings
+        sessions_count = 0
+        counts = {}
+        start = 0
+        for date, end in zip(self.dates, self.topic_ends):
+            if date >= since and (until is None or date < until):
+                sessions_count += 1
+                for topic_id in self.topic_ids[start:end]:
+                    counts[topic_id] = counts.get(topic_id, 0) + 1
+            start = end
+        return sessions_count, {strings[topic_id]: count for topic_id, count in counts.items()}
+
+    def split(self, before):
+        """Делит сессии по дате (микросекунды от начала эпохи)
+
+        Возвращает список сессий раньше before (словарями) и новый SessionLog с остальными;
+        в его таблице строк остаются только строки оставшихся сессий."""
+        old = []
+        log = SessionLog()
+        for index, date in enumerate(self.dates):
+            if date < before:
+                old.append(self._session(index))
+            else:
+                log.append(self._session(index))
+        return old, log
+
+    def to_json(self):
+        """Возвращает сессии в виде компактного JSON: даты - разностями с предыдущей сессией"""
+        dates = [date - previous for date, previous in zip(self.dates, [0] + list(self.dates[:-1]))]
+        topic_starts = [0] + list(self.topic_ends[:-1])
+        task_starts = [0] + list(self.task_ends[:-1])
+        return {
+            "strings": self.strings.strings,
+            "dates": dates,
+            "texts": self.texts,
+            "topics": [list(self.topic_ids[start:end]) for start, end in zip(topic_starts, self.topic_ends)],
+            "tasks": [list(self.task_ids[start:end]) for start, end in zip(task_starts, self.task_ends)]
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        log = cls(strings=StringTable(data["strings"]))
+        date = 0
+        for delta in data["dates"]:
+            date += delta
+            log.dates.append(date)
+        log.texts = list(data["texts"])
+        for topic_ids in data["topics"]:
+            log.topic_ids.extend(topic_ids)
+            log.topic_ends.append(len(log.topic_ids))
+        for task_ids in data["tasks"]:
+            log.task_ids.extend(task_ids)
+            log.task_ends.append(len(log.task_ids))
+        return log
+
+    def __repr__(self):
+        return f"SessionLog({len(self)} сессий)"
+
+
+def compact_progress(progress_data):
+    """Переводит темы и сессии данных ученика в компактное представление (на месте)"""
+    topics = progress_data["topics"]
+    for topic, data in topics.items():
+        if not isinstance(data, TopicState):
+            topics[topic] = TopicState.from_dict(data)
+    if not isinstance(progress_data["sessions"], SessionLog):
+        progress_data["sessions"] = SessionLog(progress_data["sessions"])
+    return progress_data
+
+
+def pack_progress(progress_data):
+    """Возвращает данные ученика для записи в JSON-снимок в компактном формате"""
+    packed = dict(progress_data)
+    sessions = progress_data.get("sessions", ())
+    if not isinstance(sessions, SessionLog):
+        sessions = SessionLog(sessions)
+    packed["format"] = COMPACT_FORMAT
+    packed["sessions"] = sessions.to_json()
+    # История mastery (см. mastery_history) хранится в своем компактном формате
+    history = progress_data.get("mastery_history")
+    if history is not None and not isinstance(history, dict):
+        packed["mastery_history"] = history.to_json()
+    packed["topics"] = {
+        topic: (data if isinstance(data, TopicState) else TopicState.from_dict(data)).to_row()
+        for topic, data in progress_data.get("topics", {}).items()
+    }
+    return packed
+
+
+def unpack_progress(data):
+    """Восстанавливает данные ученика из снимка; данные старого формата возвращаются как есть"""
+    if data.get("format") != COMPACT_FORMAT:
+        return data
+    progress_data = {key: value for key, value in data.items() if key != "format"}
+    progress_data["sessions"] = SessionLog.from_json(data["sessions"])
+    progress_data["topics"] = {topic: TopicState.from_row(row) for topic, row in data["topics"].items()}
+    return progress_data
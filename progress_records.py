@@ -0,0 +1,340 @@
+from datetime import datetime, timedelta
+
+from mastery_history import MasteryHistory
+from progress_model import TopicState, compact_progress, to_epoch
+
+# Записи журнала описывают изменения прогресса ученика. Одна и та же функция
+# применяет запись и при работе приложения, и при восстановлении из журнала,
+# поэтому результат применения зависит только от содержимого записи.
+
+RECORD_SESSION = "session"
+RECORD_MASTERY = "mastery"
+RECORD_TASK = "task"
+
+# Сколько дней хранятся дневные счетчики активности (нужны для недельных отчетов)
+ACTIVITY_RETENTION_DAYS = 31
+
+# Сколько последних рекомендованных заданий по теме помнится, чтобы не повторять их
+RECENT_TASKS_LIMIT = 5
+
+# Разделы, которые вычисляются из сессий и могут быть восстановлены при загрузке
+DERIVED_KEYS = ("activity", "recent_tasks")
+
+# Счетчики статистики, прибавки к которым складываются при слиянии одновременных изменений
+COUNTER_FIELDS = ("total_sessions", "total_works_analyzed")
+
+
+def ensure_structure(progress_data):
+    """Дополняет данные ученика обязательными разделами и переводит темы и сессии в компактный вид"""
+    if "topics" not in progress_data:
+        progress_data["topics"] = {}
+    if "sessions" not in progress_data:
+        progress_data["sessions"] = []
+    if "statistics" not in progress_data:
+        progress_data["statistics"] = {
+            "total_sessions": 0,
+            "total_works_analyzed": 0,
+            "topics_worked": 0
+        }
+    if "activity" not in progress_data:
+        rebuild_activity(progress_data)
+    if "recent_tasks" not in progress_data:
+        rebuild_recent_tasks(progress_data)
+    if "last_session" not in progress_data["statistics"] and progress_data["sessions"]:
+        progress_data["statistics"]["last_session"] = progress_data["sessions"][-1]["date"]
+    # История mastery появилась позже остальных разделов; у старых данных она начинается пустой
+    history = progress_data.get("mastery_history")
+    if not isinstance(history, MasteryHistory):
+        progress_data["mastery_history"] = MasteryHistory.from_json(history or {})
+    return compact_progress(progress_data)
+
+
+def rebuild_activity(progress_data):
+    """Заново строит дневные счетчики активности по сессиям (для данных старого формата)"""
+    progress_data["activity"] = {}
+    for session in progress_data["sessions"]:
+        _add_activity(progress_data["activity"], session)
+
+
+def rebuild_recent_tasks(progress_data):
+    """Заново строит недавние задания по сессиям и заданиям тренировки в порядке их выдачи"""
+    issued = [(session["date"], session["recommended_tasks"]) for session in progress_data["sessions"]]
+    issued.extend((date, {topic: task})
+                  for topic, tasks in progress_data.get("practice_tasks", {}).items() for date, task in tasks)
+    # Сортировка устойчива: задания с одинаковой датой остаются в порядке сессий
+    issued.sort(key=lambda item: item[0])
+    progress_data["recent_tasks"] = {}
+    for _, tasks in issued:
+        remember_tasks(progress_data["recent_tasks"], tasks)
+
+
+def remember_practice_task(practice_tasks, topic, task, date):
+    """Добавляет задание тренировки в progress_data["practice_tasks"] (тема -> пары [дата, задание])
+
+    Хранятся только последние RECENT_TASKS_LIMIT заданий темы: более ранние уже
+    вытеснены из недавних заданий."""
+    topic_tasks = practice_tasks.setdefault(topic, [])
+    if [date, task] not in topic_tasks:
+        topic_tasks.append([date, task])
+        topic_tasks.sort(key=lambda item: item[0])
+        del topic_tasks[:-RECENT_TASKS_LIMIT]
+
+
+def remember_tasks(recent_tasks, tasks):
+    """Добавляет задания (тема -> задание) в списки недавних заданий по темам"""
+    for topic, task in tasks.items():
+        topic_tasks = recent_tasks.setdefault(topic, [])
+        if task in topic_tasks:
+            topic_tasks.remove(task)
+        topic_tasks.append(task)
+        del topic_tasks[:-RECENT_TASKS_LIMIT]
+
+
+def update_derived(progress_data, record):
+    """Учитывает запись в производных разделах (DERIVED_KEYS), которые уже есть в progress_data
+
+    Нужна хранилищам, которые держат эти разделы отдельно от сессий (см. SQLiteProgressStore):
+    отсутствующий раздел не заводится, чтобы при загрузке он был построен по всем сессиям."""
+    if record["type"] == RECORD_SESSION:
+        if "activity" in progress_data:
+            _add_activity(progress_data["activity"], record["session"])
+        if "recent_tasks" in progress_data:
+            remember_tasks(progress_data["recent_tasks"], record["session"]["recommended_tasks"])
+    elif record["type"] == RECORD_TASK and "recent_tasks" in progress_data:
+        remember_tasks(progress_data["recent_tasks"], {record["topic"]: record["task"]})
+
+
+def _add_activity(activity, session):
+    """Учитывает сессию в дневных счетчиках и удаляет устаревшие дни"""
+    day = session["date"][:10]
+    bucket = activity.get(day)
+    if bucket is None:
+        bucket = activity[day] = {"sessions": 0, "topics": {}}
+        # Новый день появляется не чаще раза в сутки - тогда и чистим старые
+        oldest = (datetime.fromisoformat(session["date"]) - timedelta(days=ACTIVITY_RETENTION_DAYS)).date().isoformat()
+        for old_day in [d for d in activity if d < oldest]:
+            del activity[old_day]
+
+    bucket["sessions"] += 1
+    for topic in session["found_topics"]:
+        bucket["topics"][topic] = bucket["topics"].get(topic, 0) + 1
+
+
+def session_record(analyzed_text, found_topics, recommended_tasks, date=None, work=None):
+    """Создает запись о новой сессии анализа
+
+    work - отметка обработанной работы (см. mark_processed_work), например {"id": 12}."""
+    date = date or datetime.now()
+    record = {
+        "type": RECORD_SESSION,
+        "session": {
+            "date": date.isoformat(),
+            "analyzed_text": analyzed_text[:100] + "..." if len(analyzed_text) > 100 else analyzed_text,
+            "found_topics": list(found_topics),
+            "recommended_tasks": dict(recommended_tasks)
+        }
+    }
+    if work:
+        record["work"] = dict(work)
+    return record
+
+
+def mark_processed_work(processed_works, work):
+    """Сдвигает отметки обработанных работ ученика вперед
+
+    processed_works - словарь progress_data["processed_works"]: "id" - последний номер
+    сдачи в хранилище работ, "file_date" - дата последнего файла из папки работ.
+    Работы с номером или датой не больше отметки уже учтены в сессиях."""
+    for key, value in work.items():
+        if processed_works.get(key) is None or processed_works[key] < value:
+            processed_works[key] = value
+
+
+def mastery_record(topic, success_rate, date=None):
+    """Создает запись об оценке выполнения задания по теме"""
+    date = date or datetime.now()
+    return {
+        "type": RECORD_MASTERY,
+        "topic": topic,
+        "success_rate": success_rate,
+        "date": date.isoformat()
+    }
+
+
+def task_record(topic, task, date=None):
+    """Создает запись о задании, выданном на тренировке"""
+    date = date or datetime.now()
+    return {
+        "type": RECORD_TASK,
+        "topic": topic,
+        "task": task,
+        "date": date.isoformat()
+    }
+
+
+def compute_mastery(current_mastery, success_rate):
+    """Возвращает новый mastery темы и уровень сложности после оценки выполнения"""
+    # Простая формула для расчета mastery
+    new_mastery = min(100, current_mastery + (success_rate - 50) * 0.5)
+
+    # Обновляем уровень сложности
+    if new_mastery > 80:
+        difficulty = "hard"
+    elif new_mastery > 50:
+        difficulty = "medium"
+    else:
+        difficulty = "easy"
+    return max(0, new_mastery), difficulty
+
+
+def _apply_session(progress_data, record):
+    # Темы и сессии уже в компактном виде (см. ensure_structure)
+    session = record["session"]
+    date = session["date"]
+    epoch = to_epoch(date)
+
+    progress_data["sessions"].append(session)
+    if record.get("work"):
+        mark_processed_work(progress_data.setdefault("processed_works", {}), record["work"])
+    progress_data["statistics"]["total_sessions"] += 1
+    progress_data["statistics"]["total_works_analyzed"] += 1
+    progress_data["statistics"]["last_session"] = date
+    _add_activity(progress_data["activity"], session)
+    remember_tasks(progress_data["recent_tasks"], session["recommended_tasks"])
+
+    # Обновляем статистику по темам
+    topics = progress_data["topics"]
+    for topic in session["found_topics"]:
+        topic_data = topics.get(topic)
+        if topic_data is None:
+            # mastery_score - 0-100 баллов
+            topic_data = topics[topic] = TopicState(epoch, 0, epoch, "medium", 0)
+            progress_data["statistics"]["topics_worked"] += 1
+
+        topic_data.encounter_count += 1
+        topic_data.last_seen = epoch
+
+
+def _apply_mastery(progress_data, record):
+    topic_data = progress_data["topics"].get(record["topic"])
+    if topic_data is None:
+        return
+
+    topic_data.mastery_score, topic_data.difficulty_level = compute_mastery(topic_data.mastery_score,
+                                                                           record["success_rate"])
+    progress_data["mastery_history"].add(record["topic"], record["date"], topic_data.mastery_score)
+
+
+def _apply_task(progress_data, record):
+    remember_tasks(progress_data["recent_tasks"], {record["topic"]: record["task"]})
+    remember_practice_task(progress_data.setdefault("practice_tasks", {}), record["topic"], record["task"],
+                           record["date"])
+
+
+_APPLIERS = {
+    RECORD_SESSION: _apply_session,
+    RECORD_MASTERY: _apply_mastery,
+    RECORD_TASK: _apply_task,
+}
+
+
+def apply_record(progress_data, record):
+    """Применяет запись журнала к данным ученика"""
+    applier = _APPLIERS.get(record.get("type"))
+    if applier is None:
+        raise ValueError(f"Неизвестный тип записи: {record.get('type')}")
+    applier(progress_data, record)
+
+
+def sync_state(progress_data):
+    """Возвращает счетчики и mastery тем, с которыми сравниваются данные при слиянии (см. merge_progress)"""
+    return {
+        "statistics": {field: progress_data["statistics"].get(field, 0) for field in COUNTER_FIELDS},
+        "topics": {topic: [data["encounter_count"], data["mastery_score"]]
+                   for topic, data in progress_data["topics"].items()}
+    }
+
+
+def apply_to_sync_state(state, record):
+    """Учитывает сохраненную в хранилище запись в состоянии sync_state"""
+    if record["type"] == RECORD_SESSION:
+        for field in COUNTER_FIELDS:
+            state["statistics"][field] += 1
+        for topic in record["session"]["found_topics"]:
+            state["topics"].setdefault(topic, [0, 0])[0] += 1
+    elif record["type"] == RECORD_MASTERY:
+        entry = state["topics"].get(record["topic"])
+        if entry:
+            entry[1] = compute_mastery(entry[1], record["success_rate"])[0]
+
+
+def merge_progress(base, ours, theirs):
+    """Сливает данные ученика в памяти (ours) с данными, которые успел сохранить другой процесс (theirs)
+
+    base - sync_state на момент последней синхронизации с хранилищем. Прибавки к
+    счетчикам с того момента складываются, сессии объединяются, а mastery темы берется
+    из ours, только если он изменился в памяти."""
+    merged = {key: value for key, value in ours.items() if key not in DERIVED_KEYS}
+    merged.update({key: value for key, value in theirs.items() if key not in DERIVED_KEYS + tuple(ours)})
+
+    statistics = dict(theirs["statistics"])
+    for field in COUNTER_FIELDS:
+        statistics[field] = (theirs["statistics"].get(field, 0) + ours["statistics"].get(field, 0)
+                             - base["statistics"].get(field, 0))
+
+    topics = {topic: TopicState.from_dict(data) for topic, data in theirs["topics"].items()}
+    for topic, data in ours["topics"].items():
+        base_count, base_mastery = base["topics"].get(topic, (0, 0))
+        if topic not in topics:
+            topics[topic] = TopicState.from_dict(data)
+            continue
+        merged_topic = topics[topic]
+        merged_topic["encounter_count"] += data["encounter_count"] - base_count
+        merged_topic["first_encounter"] = min(merged_topic["first_encounter"], data["first_encounter"])
+        merged_topic["last_practiced"] = max(merged_topic["last_practiced"], data["last_practiced"])
+        if data["mastery_score"] != base_mastery:
+            merged_topic["mastery_score"] = data["mastery_score"]
+            merged_topic["difficulty_level"] = data["difficulty_level"]
+
+    # Сессии раньше границы архивирования уже учтены в месячных итогах (см. session_archive)
+    archive = max((data.get("archive") for data in (theirs, ours) if data.get("archive")),
+                  key=lambda archive: archive["archived_until"] or "", default=None)
+    archived_until = archive["archived_until"] if archive else None
+
+    known_sessions = {(session["date"], session["analyzed_text"]) for session in theirs["sessions"]}
+    sessions = list(theirs["sessions"])
+    sessions.extend(session for session in ours["sessions"]
+                    if (session["date"], session["analyzed_text"]) not in known_sessions)
+    if archived_until:
+        sessions = [session for session in sessions if session["date"] >= archived_until]
+    sessions.sort(key=lambda session: session["date"])
+
+    # Оценки, добавленные обоими процессами, объединяются в одной истории
+    history = MasteryHistory.from_json(theirs.get("mastery_history") or {}) \
+        if not isinstance(theirs.get("mastery_history"), MasteryHistory) else theirs["mastery_history"].copy()
+    if isinstance(ours.get("mastery_history"), MasteryHistory):
+        history.merge(ours["mastery_history"])
+
+    practice_tasks = {topic: [list(item) for item in tasks]
+                      for topic, tasks in (theirs.get("practice_tasks") or {}).items()}
+    for topic, tasks in (ours.get("practice_tasks") or {}).items():
+        for date, task in tasks:
+            remember_practice_task(practice_tasks, topic, task, date)
+
+    processed_works = dict(theirs.get("processed_works") or {})
+    mark_processed_work(processed_works, ours.get("processed_works") or {})
+
+    statistics["topics_worked"] = len(topics)
+    if sessions:
+        statistics["last_session"] = sessions[-1]["date"]
+    merged["mastery_history"] = history
+    if archive:
+        merged["archive"] = archive
+    if processed_works:
+        merged["processed_works"] = processed_works
+    if practice_tasks:
+        merged["practice_tasks"] = practice_tasks
+    merged["statistics"] = statistics
+    merged["topics"] = topics
+    merged["sessions"] = sessions
+    return ensure_structure(merged)
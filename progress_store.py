@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from file_lock import FileLock, append_lines, atomic_write
+from progress_model import pack_progress, unpack_progress
+from progress_records import apply_record, ensure_structure, merge_progress, sync_state
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+# Старый общий файл прогресса всех учеников (используется только для миграции)
+LEGACY_PROGRESS_FILE = os.path.join(DATA_DIR, "progress.json")
+PROGRESS_DIR = os.path.join(DATA_DIR, "progress")
+SQLITE_PROGRESS_FILE = os.path.join(DATA_DIR, "progress.sqlite3")
+
+# Хранилище по умолчанию: "shards" (файлы учеников) или "sqlite"
+BACKEND_ENV_VAR = "SCHOOL_HELPER_BACKEND"
+
+# После стольких записей журнал ученика сворачивается в снимок
+COMPACT_THRESHOLD = 200
+
+# Снимок начинается с имени ученика: для списка учеников читается только это начало
+SHARD_HEADER = '{"student_name":'
+SHARD_HEADER_SIZE = 1024
+
+
+class ShardedProgressStore:
+    """Хранилище прогресса: отдельный файл (шард) на каждого ученика
+
+    Шард состоит из снимка данных и журнала изменений (JSON Lines). Изменения
+    дописываются в журнал, а при загрузке применяются поверх снимка. Когда журнал
+    становится длинным, фоновый поток сворачивает его в новый снимок.
+
+    С файлами ученика можно одновременно работать из нескольких процессов: каждая
+    операция выполняется под файловой блокировкой ученика, снимок записывается
+    атомарно, а номер последней записи журнала служит версией данных ученика."""
+
+    def __init__(self, root_dir=PROGRESS_DIR, legacy_file=LEGACY_PROGRESS_FILE,
+                 fsync=False, compact_threshold=COMPACT_THRESHOLD):
+        self.root_dir = root_dir
+        self.legacy_file = legacy_file
+        self.fsync = fsync
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        # Последний номер записи и длина журнала по ученикам
+        self._last_seq = {}
+        self._journal_length = {}
+        # Метки файлов ученика на момент последнего чтения или записи этим процессом
+        self._signatures = {}
+        self._compacting = set()
+        os.makedirs(self.root_dir, exist_ok=True)
+        self.migrate_legacy()
+
+    def shard_path(self, student_name):
+        """Возвращает путь к файлу ученика"""
+        # Хэш имени защищает от совпадений после удаления недопустимых символов
+        digest = hashlib.sha1(student_name.encode("utf-8")).hexdigest()[:10]
+        safe_name = "".join(c for c in student_name if c.isalnum() or c in ('-', '_'))[:40]
+        return os.path.join(self.root_dir, f"{safe_name}_{digest}.json")
+
+    def journal_path(self, student_name):
+        """Возвращает путь к журналу изменений ученика"""
+        return self.shard_path(student_name)[:-len(".json")] + ".journal.jsonl"
+
+    def lock_path(self, student_name):
+        """Возвращает путь к файлу блокировки ученика"""
+        return self.shard_path(student_name)[:-len(".json")] + ".lock"
+
+    @contextmanager
+    def _locked(self, student_name):
+        """Блокирует файлы ученика от других потоков и процессов"""
+        with self._lock, FileLock(self.lock_path(student_name)):
+            yield
+
+    def _file_signature(self, student_name):
+        """Метка состояния файлов ученика: меняется при любой записи любым процессом"""
+        signature = []
+        for path in (self.shard_path(student_name), self.journal_path(student_name)):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _refresh(self, student_name):
+        """Перечитывает номер последней записи, если файлы ученика изменил другой процесс"""
+        if self._signatures.get(student_name) != self._file_signature(student_name):
+            self._load_with_seq(student_name)
+
+    def _read_shard(self, path):
+        """Читает шард; возвращает None, если файл отсутствует или поврежден"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return None
+
+    def _read_journal(self, student_name):
+        """Читает записи журнала ученика"""
+        records = []
+        try:
+            with open(self.journal_path(student_name), 'rb') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # Строка, недописанная при сбое: ее записи не были подтверждены
+                        continue
+        except FileNotFoundError:
+            pass
+        return records
+
+    def _write_snapshot(self, student_name, progress_data, last_seq):
+        shard = {"student_name": student_name, "last_seq": last_seq, "progress": pack_progress(progress_data)}
+        atomic_write(self.shard_path(student_name),
+                     lambda f: json.dump(shard, f, ensure_ascii=False, separators=(',', ':')),
+                     fsync=self.fsync)
+
+    def _load_with_seq(self, student_name):
+        """Загружает снимок и применяет журнал; возвращает данные и номер последней записи"""
+        shard = self._read_shard(self.shard_path(student_name)) or {}
+        progress_data = ensure_structure(unpack_progress(shard.get("progress", {})))
+        last_seq = shard.get("last_seq", 0)
+
+        records = self._read_journal(student_name)
+        for record in records:
+            # Записи, уже вошедшие в снимок, пропускаем
+            if record["seq"] > last_seq:
+                apply_record(progress_data, record)
+                last_seq = record["seq"]
+
+        self._last_seq[student_name] = last_seq
+        self._journal_length[student_name] = len(records)
+        self._signatures[student_name] = self._file_signature(student_name)
+        return progress_data, last_seq
+
+    def load(self, student_name):
+        """Загружает данные ученика: снимок плюс записи журнала"""
+        return self.load_versioned(student_name)[0]
+
+    def load_versioned(self, student_name):
+        """Загружает данные ученика вместе с их версией (номером последней записи)"""
+        with self._locked(student_name):
+            return self._load_with_seq(student_name)
+
+    def save(self, student_name, progress_data, expected_version=None, base=None):
+        """Сохраняет полный снимок данных ученика и очищает его журнал
+
+        Если задана expected_version, а другой процесс успел изменить данные ученика,
+        снимок сливается с сохраненными данными (см. progress_records.merge_progress;
+        base - sync_state на момент версии expected_version). Возвращает сохраненные
+        данные и их новую версию."""
+        with self._locked(student_name):
+            self._refresh(student_name)
+            current_version = self._last_seq[student_name]
+            if expected_version is not None and expected_version != current_version:
+                theirs = self._load_with_seq(student_name)[0]
+                progress_data = merge_progress(base or sync_state(progress_data), progress_data, theirs)
+
+            # Версия увеличивается, чтобы другие процессы заметили перезапись снимка
+            version = current_version + 1
+            self._write_snapshot(student_name, progress_data, version)
+            self._truncate_journal(student_name)
+            self._last_seq[student_name] = version
+            self._signatures[student_name] = self._file_signature(student_name)
+            return progress_data, version
+
+    def append(self, student_name, records):
+        """Дописывает записи изменений в журнал ученика одной последовательной записью
+
+        Возвращает новую версию данных ученика."""
+        with self._locked(student_name):
+            self._refresh(student_name)
+            if not os.path.exists(self.shard_path(student_name)):
+                # В записях журнала нет имени ученика: пустой снимок нужен, чтобы его нашел student_names
+                self._write_snapshot(student_name, ensure_structure({}), 0)
+
+            lines = []
+            for record in records:
+                self._last_seq[student_name] += 1
+                line = json.dumps(dict(record, seq=self._last_seq[student_name]),
+                                  ensure_ascii=False, separators=(',', ':'))
+                lines.append(line.encode("utf-8") + b"\n")
+
+            append_lines(self.journal_path(student_name), lines, fsync=self.fsync)
+            self._signatures[student_name] = self._file_signature(student_name)
+
+            self._journal_length[student_name] += len(records)
+            if self._journal_length[student_name] >= self.compact_threshold:
+                self._schedule_compaction(student_name)
+            return self._last_seq[student_name]
+
+    def _truncate_journal(self, student_name):
+        try:
+            os.remove(self.journal_path(student_name))
+        except FileNotFoundError:
+            pass
+        self._journal_length[student_name] = 0
+
+    def compact(self, student_name):
+        """Сворачивает журнал ученика в новый снимок"""
+        with self._locked(student_name):
+            progress_data, last_seq = self._load_with_seq(student_name)
+            if not self._journal_length[student_name]:
+                return
+            # Снимок с номером последней записи записывается до удаления журнала,
+            # поэтому сбой между этими шагами не приведет к повторному применению
+            self._write_snapshot(student_name, progress_data, last_seq)
+            self._truncate_journal(student_name)
+            self._signatures[student_name] = self._file_signature(student_name)
+
+    def _schedule_compaction(self, student_name):
+        if student_name in self._compacting:
+            return
+        self._compacting.add(student_name)
+
+        def run():
+            try:
+                self.compact(student_name)
+            except Exception as e:
+                print(f"Ошибка при сжатии журнала прогресса: {e}")
+            finally:
+                self._compacting.discard(student_name)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _read_student_name(self, path):
+        """Читает имя ученика из начала снимка, не разбирая весь файл"""
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                head = f.read(SHARD_HEADER_SIZE)
+        except FileNotFoundError:
+            return None
+        if head.startswith(SHARD_HEADER):
+            try:
+                return json.JSONDecoder().raw_decode(head, len(SHARD_HEADER))[0]
+            except json.JSONDecodeError:
+                pass
+        # Очень длинное имя или снимок другого вида
+        shard = self._read_shard(path)
+        return shard.get("student_name") if shard else None
+
+    def student_names(self):
+        """Возвращает имена всех учеников (читает только начало снимков, без журналов)"""
+        names = []
+        for filename in sorted(os.listdir(self.root_dir)):
+            if filename.endswith(".json"):
+                student_name = self._read_student_name(os.path.join(self.root_dir, filename))
+                if student_name is not None:
+                    names.append(student_name)
+        return names
+
+    def iter_students(self):
+        """Перебирает пары (имя ученика, данные) по всем шардам"""
+        for student_name in self.student_names():
+            yield student_name, self.load(student_name)
+
+    def migrate_legacy(self):
+        """Однократно переносит данные из общего progress.json в шарды учеников"""
+        if not self.legacy_file or not os.path.exists(self.legacy_file):
+            return 0
+
+        # Миграцию могут одновременно начать несколько процессов - выполняет ее первый
+        with FileLock(os.path.join(self.root_dir, "migration.lock")):
+            if not os.path.exists(self.legacy_file):
+                return 0
+            try:
+                with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                    all_data = json.load(f)
+            except json.JSONDecodeError as e:
+                print(f"Ошибка при миграции прогресса: {e}")
+                return 0
+
+            migrated = 0
+            for student_name, progress_data in all_data.items():
+                # Уже существующий шард новее данных старого файла
+                if not os.path.exists(self.shard_path(student_name)):
+                    # Снимок сразу получает дневные счетчики и недавние задания, чтобы не строить их при каждой загрузке
+                    self.save(student_name, ensure_structure(progress_data))
+                    migrated += 1
+
+            # Переименовываем старый файл, чтобы миграция не повторялась
+            os.replace(self.legacy_file, self.legacy_file + ".migrated")
+            return migrated
+
+
+_default_store = None
+
+
+def get_default_store():
+    """Возвращает общее хранилище прогресса приложения"""
+    global _default_store
+    if _default_store is None:
+        backend = os.environ.get(BACKEND_ENV_VAR, "shards")
+        if backend == "sqlite":
+            from sqlite_store import SQLiteProgressStore
+            os.makedirs(DATA_DIR, exist_ok=True)
+            _default_store = SQLiteProgressStore(SQLITE_PROGRESS_FILE)
+        elif backend == "shards":
+            _default_store = ShardedProgressStore()
+        else:
+            raise ValueError(f"Неизвестное хранилище прогресса: {backend}")
+    return _default_store
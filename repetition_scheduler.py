@@ -0,0 +1,194 @@
+"""Интервальное повторение тем: очередь тем ученика по сроку следующего повторения
+
+Срок повторения темы - дата последней практики плюс интервал, который растет с
+mastery: слабую тему повторяют через день, хорошо усвоенную - через несколько
+недель. Темы ученика лежат в куче по сроку, поэтому изменение одной темы стоит
+O(log n), а план на неделю берется из начала кучи без сортировки всех тем.
+
+Пакетный режим строит планы всех учеников за один проход по хранилищу:
+    python repetition_scheduler.py --output plans.jsonl
+"""
+import argparse
+import heapq
+import json
+import time
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from progress_model import MICROSECOND, TopicState, from_epoch, to_epoch
+
+WEEK_DAYS = ("Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье")
+
+# Интервал повторения темы с нулевым mastery и прирост mastery, удваивающий интервал:
+# 0% - 1 день, 40% - 4 дня, 80% - 16 дней, 100% - 32 дня
+BASE_INTERVAL_DAYS = 1
+MASTERY_PER_DOUBLING = 20
+
+PLAN_DAYS = 7
+
+_DAY = timedelta(days=1) // MICROSECOND
+
+
+def review_interval(mastery_score):
+    """Возвращает интервал до следующего повторения темы в микросекундах"""
+    return int(BASE_INTERVAL_DAYS * _DAY * 2 ** (max(0, mastery_score) / MASTERY_PER_DOUBLING))
+
+
+def due_date(last_seen, mastery_score):
+    """Возвращает срок повторения темы (микросекунды от начала эпохи) по дате последней практики"""
+    return last_seen + review_interval(mastery_score)
+
+
+class RepetitionScheduler:
+    """Темы ученика в куче по сроку повторения
+
+    Элемент кучи - список [срок, тема, mastery, действителен]. При изменении темы
+    старый элемент помечается недействительным и остается в куче до извлечения, а
+    новый добавляется за O(log n); когда недействительных становится больше, чем
+    действительных, куча перестраивается."""
+
+    def __init__(self):
+        self._heap = []
+        # Тема -> действительный элемент кучи
+        self._entries = {}
+
+    @classmethod
+    def from_topics(cls, topics):
+        """Строит очередь по темам ученика (progress_data["topics"]) за O(n)"""
+        return cls.from_rows((topic, *_schedule_fields(data)) for topic, data in topics.items())
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Строит очередь по строкам (тема, последняя практика - микросекунды или ISO-строка, mastery)"""
+        scheduler = cls()
+        for topic, last_seen, mastery_score in rows:
+            if isinstance(last_seen, str):
+                last_seen = to_epoch(last_seen)
+            entry = [due_date(last_seen, mastery_score), topic, mastery_score, True]
+            scheduler._entries[topic] = entry
+            scheduler._heap.append(entry)
+        heapq.heapify(scheduler._heap)
+        return scheduler
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, topic):
+        return topic in self._entries
+
+    def schedule(self, topic, last_seen, mastery_score):
+        """Добавляет тему или меняет ее срок (last_seen - микросекунды от начала эпохи)"""
+        self._invalidate(topic)
+        entry = self._entries[topic] = [due_date(last_seen, mastery_score), topic, mastery_score, True]
+        heapq.heappush(self._heap, entry)
+
+    def update_topic(self, topic, data):
+        """Пересчитывает срок темы по ее состоянию (TopicState или словарь темы)"""
+        self.schedule(topic, *_schedule_fields(data))
+
+    def remove(self, topic):
+        self._invalidate(topic)
+
+    def _invalidate(self, topic):
+        entry = self._entries.pop(topic, None)
+        if entry is None:
+            return
+        entry[-1] = False
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = [entry for entry in self._heap if entry[-1]]
+            heapq.heapify(self._heap)
+
+    def due(self, topic):
+        """Возвращает срок повторения темы (микросекунды от начала эпохи) или None"""
+        entry = self._entries.get(topic)
+        return entry[0] if entry else None
+
+    def upcoming(self, limit):
+        """Возвращает до limit тем с ближайшими сроками: кортежи (срок, тема, mastery), O(limit log n)"""
+        taken = []
+        result = []
+        while self._heap and len(result) < limit:
+            entry = heapq.heappop(self._heap)
+            if entry[-1]:
+                taken.append(entry)
+                result.append((entry[0], entry[1], entry[2]))
+        # Действительные элементы возвращаются в кучу, недействительные отбрасываются
+        for entry in taken:
+            heapq.heappush(self._heap, entry)
+        return result
+
+    def plan(self, now=None, days=PLAN_DAYS):
+        """Составляет план на days дней начиная с сегодняшнего: по одной теме в день
+
+        В день попадает тема с самым ранним сроком, если он наступает не позже конца
+        этого дня (просроченные темы идут первыми); иначе день отводится на повторение
+        пройденного. Возвращает список словарей с ключами day, date, topic (None -
+        повторение), mastery и due (срок повторения, ISO-строка)."""
+        today = (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+        upcoming = self.upcoming(days)
+        plan = []
+        index = 0
+        for offset in range(days):
+            day = today + timedelta(days=offset)
+            entry = {"day": WEEK_DAYS[day.weekday()], "date": day.date().isoformat(),
+                     "topic": None, "mastery": None, "due": None}
+            if index < len(upcoming) and upcoming[index][0] < to_epoch(day + timedelta(days=1)):
+                due, entry["topic"], entry["mastery"] = upcoming[index]
+                entry["due"] = from_epoch(due)
+                index += 1
+            plan.append(entry)
+        return plan
+
+
+def _schedule_fields(data):
+    """Возвращает (последняя практика в микросекундах, mastery) темы: TopicState или словарь"""
+    if isinstance(data, TopicState):
+        return data.last_seen, data.mastery_score
+    return to_epoch(data["last_practiced"]), data["mastery_score"]
+
+
+def iter_plans(store, now=None, days=PLAN_DAYS):
+    """Перебирает пары (ученик, план) для всех учеников хранилища за один проход
+
+    Хранилище с запросом iter_topic_rows отдает состояние тем всех учеников одним
+    запросом, без загрузки сессий; иначе ученики читаются по одному. В памяти
+    одновременно находится очередь только одного ученика."""
+    now = now or datetime.now()
+    if hasattr(store, "iter_topic_rows"):
+        # Строки упорядочены по ученикам
+        for student_name, rows in groupby(store.iter_topic_rows(), key=lambda row: row[0]):
+            scheduler = RepetitionScheduler.from_rows(
+                (topic, last_practiced, mastery_score) for _, topic, _, last_practiced, mastery_score in rows
+            )
+            yield student_name, scheduler.plan(now, days)
+        return
+
+    for student_name, progress_data in store.iter_students():
+        yield student_name, RepetitionScheduler.from_topics(progress_data.get("topics", {})).plan(now, days)
+
+
+def main():
+    from progress_store import get_default_store
+
+    parser = argparse.ArgumentParser(description="Планы повторения для всех учеников")
+    parser.add_argument("--days", type=int, default=PLAN_DAYS, help="число дней в плане")
+    parser.add_argument("--output", help="файл для планов в формате JSON Lines (по умолчанию - только итоги)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    students = 0
+    output = open(args.output, 'w', encoding='utf-8') if args.output else None
+    try:
+        for student_name, plan in iter_plans(get_default_store(), days=args.days):
+            students += 1
+            if output:
+                output.write(json.dumps({"student": student_name, "plan": plan}, ensure_ascii=False) + "\n")
+    finally:
+        if output:
+            output.close()
+    elapsed = time.perf_counter() - started
+    print(f"Составлено планов: {students}, время: {elapsed:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Архивирование старых сессий учеников
+
+Сессии старше горизонта (по умолчанию полгода) убираются из данных ученика:
+в данных остаются только месячные итоги (число сессий и встреч тем), а сами
+сессии переносятся в сжатые файлы по месяцам, которые читаются только по
+запросу. Поэтому загрузка и сохранение прогресса не замедляются со временем.
+
+Горизонт выравнивается на начало месяца, поэтому каждый месяц архивируется
+целиком. Итоги хранятся в progress_data["archive"]:
+    {"archived_until": ISO-дата, "months": {"2025-09": {"sessions": 12, "topics": {тема: число}}}}
+
+Пример запуска:
+    python session_archive.py --horizon-days 180
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from file_lock import FileLock
+from progress_model import from_epoch, to_epoch
+from progress_records import ACTIVITY_RETENTION_DAYS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.path.join(BASE_DIR, "data", "archive")
+
+# Сессии старше стольких дней архивируются (граница сдвигается на начало месяца)
+ARCHIVE_HORIZON_DAYS = 180
+
+
+def _student_key(student_name):
+    """Возвращает имя папки ученика (как у шардов прогресса)"""
+    digest = hashlib.sha1(student_name.encode("utf-8")).hexdigest()[:10]
+    safe_name = "".join(c for c in student_name if c.isalnum() or c in ('-', '_'))[:40]
+    return f"{safe_name}_{digest}"
+
+
+class SessionArchive:
+    """Холодное хранилище сессий: файл JSON Lines, сжатый gzip, на каждый месяц ученика
+
+    Новые сессии месяца дописываются в файл отдельным сжатым блоком. Если архивирование
+    прервалось после записи в архив, но до сохранения прогресса, при повторе сессии
+    будут записаны еще раз - при чтении такие повторы отбрасываются."""
+
+    def __init__(self, root_dir=ARCHIVE_DIR):
+        self.root_dir = root_dir
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def student_dir(self, student_name):
+        return os.path.join(self.root_dir, _student_key(student_name))
+
+    def month_path(self, student_name, month):
+        """Возвращает путь к файлу месяца (month - строка вида 2025-09)"""
+        return os.path.join(self.student_dir(student_name), f"{month}.jsonl.gz")
+
+    def months(self, student_name):
+        """Возвращает месяцы, за которые у ученика есть архивные сессии"""
+        try:
+            names = os.listdir(self.student_dir(student_name))
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len(".jsonl.gz")] for name in names if name.endswith(".jsonl.gz"))
+
+    def append(self, student_name, month, sessions, fsync=False):
+        """Дописывает сессии (словари) в архив месяца"""
+        os.makedirs(self.student_dir(student_name), exist_ok=True)
+        lines = "".join(json.dumps(session, ensure_ascii=False, separators=(',', ':')) + "\n"
+                        for session in sessions)
+        with FileLock(os.path.join(self.student_dir(student_name), "archive.lock")):
+            with open(self.month_path(student_name, month), 'ab') as f:
+                f.write(gzip.compress(lines.encode("utf-8")))
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def read_month(self, student_name, month):
+        """Читает сессии месяца от старых к новым; если архива нет, возвращает пустой список"""
+        try:
+            with gzip.open(self.month_path(student_name, month), 'rt', encoding='utf-8') as f:
+                sessions = [json.loads(line) for line in f]
+        except FileNotFoundError:
+            return []
+        unique = {(session["date"], session["analyzed_text"]): session for session in sessions}
+        return sorted(unique.values(), key=lambda session: session["date"])
+
+    def iter_sessions(self, student_name, since=None):
+        """Перебирает архивные сессии ученика по месяцам, начиная с даты since"""
+        first_month = since.strftime("%Y-%m") if since else ""
+        since = since.isoformat() if since else ""
+        for month in self.months(student_name):
+            if month < first_month:
+                continue
+            for session in self.read_month(student_name, month):
+                if session["date"] >= since:
+                    yield session
+
+
+_default_archive = None
+
+
+def get_default_archive():
+    """Возвращает общий архив сессий приложения"""
+    global _default_archive
+    if _default_archive is None:
+        _default_archive = SessionArchive()
+    return _default_archive
+
+
+def archive_cutoff(now=None, horizon_days=ARCHIVE_HORIZON_DAYS):
+    """Возвращает границу архивирования: начало месяца, в который попадает дата now - horizon_days"""
+    if horizon_days <= ACTIVITY_RETENTION_DAYS:
+        # Недельные отчеты строятся по дневным счетчикам и сессиям за этот срок
+        raise ValueError(f"Горизонт архивирования должен быть больше {ACTIVITY_RETENTION_DAYS} дней")
+    date = (now or datetime.now()) - timedelta(days=horizon_days)
+    return datetime(date.year, date.month, 1)
+
+
+def archive_progress(progress_data, cutoff):
+    """Убирает из данных ученика сессии раньше cutoff и добавляет их в месячные итоги
+
+    Возвращает убранные сессии по месяцам ({месяц: [сессии]}) для записи в SessionArchive."""
+    archived, progress_data["sessions"] = progress_data["sessions"].split(to_epoch(cutoff))
+    archive = progress_data.setdefault("archive", {"archived_until": None, "months": {}})
+    if archive["archived_until"] is None or archive["archived_until"] < cutoff.isoformat():
+        archive["archived_until"] = cutoff.isoformat()
+
+    by_month = {}
+    for session in archived:
+        month = session["date"][:7]
+        by_month.setdefault(month, []).append(session)
+        totals = archive["months"].setdefault(month, {"sessions": 0, "topics": {}})
+        totals["sessions"] += 1
+        for topic in session["found_topics"]:
+            totals["topics"][topic] = totals["topics"].get(topic, 0) + 1
+    return by_month
+
+
+def archived_activity(progress_data, since, read_month):
+    """Возвращает число сессий и активность по темам в архиве начиная с даты since
+
+    Месяцы целиком после since берутся из итогов; месяц, в который попадает since,
+    читается из архива функцией read_month(месяц), чтобы ответ был точным."""
+    archive = progress_data.get("archive")
+    if not archive or not archive["archived_until"] or since.isoformat() >= archive["archived_until"]:
+        return 0, {}
+
+    first_month = since.strftime("%Y-%m")
+    from_month_start = since == datetime(since.year, since.month, 1)
+    sessions_count = 0
+    topic_activity = {}
+    for month in sorted(archive["months"]):
+        if month > first_month or (month == first_month and from_month_start):
+            totals = archive["months"][month]
+            sessions_count += totals["sessions"]
+            for topic, count in totals["topics"].items():
+                topic_activity[topic] = topic_activity.get(topic, 0) + count
+        elif month == first_month:
+            since_iso = since.isoformat()
+            for session in read_month(month):
+                if session["date"] >= since_iso:
+                    sessions_count += 1
+                    for topic in session["found_topics"]:
+                        topic_activity[topic] = topic_activity.get(topic, 0) + 1
+    return sessions_count, topic_activity
+
+
+def monthly_activity(progress_data):
+    """Возвращает число сессий и встреч тем по месяцам: архивные итоги плюс текущие сессии"""
+    months = {month: {"sessions": totals["sessions"], "topics": dict(totals["topics"])}
+              for month, totals in progress_data.get("archive", {}).get("months", {}).items()}
+    sessions = progress_data["sessions"]
+    for index, date in enumerate(sessions.dates):
+        month = from_epoch(date)[:7]
+        totals = months.setdefault(month, {"sessions": 0, "topics": {}})
+        totals["sessions"] += 1
+        for topic in sessions.found_topics(index):
+            totals["topics"][topic] = totals["topics"].get(topic, 0) + 1
+    return dict(sorted(months.items()))
+
+
+def archive_student(progress, cutoff, archive=None):
+    """Архивирует сессии ученика (StudentProgress) раньше cutoff; возвращает число перенесенных сессий"""
+    archive = archive or progress.session_archive
+    with progress.lock:
+        progress.flush()
+        by_month = archive_progress(progress.progress_data, cutoff)
+        if not by_month:
+            return 0
+        # Сначала архив, затем прогресс: при сбое между ними сессии не теряются
+        for month, sessions in sorted(by_month.items()):
+            archive.append(progress.student_name, month, sessions)
+        progress.save_progress()
+    return sum(len(sessions) for sessions in by_month.values())
+
+
+def run_archival(store=None, archive=None, horizon_days=ARCHIVE_HORIZON_DAYS, now=None):
+    """Архивирует старые сессии всех учеников хранилища; возвращает словарь со статистикой"""
+    from progress_store import get_default_store
+    from student_progress import StudentProgress
+
+    store = store or get_default_store()
+    archive = archive or get_default_archive()
+    cutoff = archive_cutoff(now, horizon_days)
+    started = time.perf_counter()
+    students = archived = 0
+    for student_name in store.student_names():
+        try:
+            archived += archive_student(StudentProgress(student_name, store=store, session_archive=archive),
+                                        cutoff, archive)
+        except OSError as e:
+            print(f"Ошибка при архивировании сессий ученика {student_name}: {e}")
+            continue
+        students += 1
+    return {
+        "students": students,
+        "sessions": archived,
+        "cutoff": cutoff.isoformat(),
+        "seconds": time.perf_counter() - started
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Архивирование старых сессий учеников")
+    parser.add_argument("--horizon-days", type=int, default=ARCHIVE_HORIZON_DAYS,
+                        help="сессии старше стольких дней переносятся в архив")
+    args = parser.parse_args()
+
+    stats = run_archival(horizon_days=args.horizon_days)
+    print(f"Учеников: {stats['students']}, перенесено сессий: {stats['sessions']} (до {stats['cutoff'][:10]})")
+    print(f"Время: {stats['seconds']:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+import json
+import os
+import sqlite3
+import threading
+
+from mastery_history import MasteryHistory
+from progress_records import (RECORD_MASTERY, RECORD_SESSION, RECORD_TASK, DERIVED_KEYS, compute_mastery,
+                              ensure_structure, mark_processed_work, merge_progress, remember_practice_task,
+                              sync_state, update_derived)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    total_sessions INTEGER NOT NULL DEFAULT 0,
+    total_works_analyzed INTEGER NOT NULL DEFAULT 0,
+    topics_worked INTEGER NOT NULL DEFAULT 0,
+    extra TEXT NOT NULL DEFAULT '{}',
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+    date TEXT NOT NULL,
+    analyzed_text TEXT NOT NULL,
+    recommended_tasks TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_student_date ON sessions(student_id, date);
+CREATE TABLE IF NOT EXISTS session_topics (
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    student_id INTEGER NOT NULL,
+    topic TEXT NOT NULL,
+    date TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS session_topics_student_date ON session_topics(student_id, date);
+CREATE INDEX IF NOT EXISTS session_topics_session ON session_topics(session_id);
+CREATE INDEX IF NOT EXISTS session_topics_topic_date ON session_topics(topic, date);
+CREATE INDEX IF NOT EXISTS session_topics_date ON session_topics(date);
+CREATE TABLE IF NOT EXISTS topic_state (
+    student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+    topic TEXT NOT NULL,
+    first_encounter TEXT NOT NULL,
+    encounter_count INTEGER NOT NULL,
+    last_practiced TEXT NOT NULL,
+    difficulty_level TEXT NOT NULL,
+    mastery_score REAL NOT NULL,
+    PRIMARY KEY (student_id, topic)
+);
+CREATE INDEX IF NOT EXISTS topic_state_student_mastery ON topic_state(student_id, mastery_score);
+CREATE INDEX IF NOT EXISTS topic_state_topic_mastery ON topic_state(topic, mastery_score);
+"""
+
+# Соединения, унаследованные дочерними процессами при fork (см. SQLiteProgressStore._check_fork)
+_inherited_connections = []
+
+STATISTICS_FIELDS = ("total_sessions", "total_works_analyzed", "topics_worked")
+TOPIC_FIELDS = ("first_encounter", "encounter_count", "last_practiced", "difficulty_level", "mastery_score")
+
+
+class SQLiteProgressStore:
+    """Хранилище прогресса в базе SQLite (режим WAL)
+
+    Поддерживает тот же интерфейс, что и ShardedProgressStore (load/save/append/
+    iter_students), и дополнительно отвечает на аналитические запросы через
+    индексы по датам сессий и mastery тем."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._connect()
+
+    def _connect(self):
+        """Открывает соединение текущего процесса и создает схему базы"""
+        self._pid = os.getpid()
+        self._thread_lock = threading.RLock()
+        # Другие процессы могут держать блокировку записи - ждем ее до timeout секунд
+        self._connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA foreign_keys=ON")
+        self._connection.executescript(SCHEMA)
+        # Базы, созданные до появления версий учеников
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(students)")}
+        if "version" not in columns:
+            self._connection.execute("ALTER TABLE students ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            self._connection.commit()
+
+    def _check_fork(self):
+        """В процессе, созданном через fork, открывает новое соединение вместо унаследованного
+
+        Унаследованное соединение не закрывается и не используется: закрытие снимает
+        все POSIX-блокировки процесса на файл базы, в том числе блокировки нового соединения."""
+        if self._pid != os.getpid():
+            _inherited_connections.append(self._connection)
+            self._connect()
+
+    @property
+    def _lock(self):
+        self._check_fork()
+        return self._thread_lock
+
+    @property
+    def _conn(self):
+        self._check_fork()
+        return self._connection
+
+    def close(self):
+        """Закрывает соединение с базой"""
+        if self._pid != os.getpid():
+            return
+        with self._thread_lock:
+            self._connection.close()
+
+    def _student_id(self, student_name, create=False):
+        row = self._conn.execute("SELECT id FROM students WHERE name = ?", (student_name,)).fetchone()
+        if row:
+            return row[0]
+        if not create:
+            return None
+        return self._conn.execute("INSERT INTO students (name) VALUES (?)", (student_name,)).lastrowid
+
+    def load(self, student_name):
+        """Загружает данные ученика в виде словаря progress_data"""
+        return self.load_versioned(student_name)[0]
+
+    def load_versioned(self, student_name):
+        """Загружает данные ученика вместе с их версией"""
+        # Все запросы выполняются в одной транзакции и видят один снимок базы
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            progress_data, version = self._load(student_name)
+        if progress_data and any(key not in progress_data for key in DERIVED_KEYS):
+            self._store_derived(student_name, ensure_structure(progress_data), version)
+        return progress_data, version
+
+    def _store_derived(self, student_name, progress_data, version):
+        """Сохраняет построенные по сессиям разделы DERIVED_KEYS (у данных, записанных до их хранения в базе)"""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute("SELECT id, version FROM students WHERE name = ?", (student_name,)).fetchone()
+            # Если данные успели измениться, разделы будут построены при следующей загрузке
+            if row is None or row[1] != version:
+                return
+            self._update_extra(row[0], lambda extra: extra.update(
+                {key: progress_data[key] for key in DERIVED_KEYS}
+            ))
+
+    def _load(self, student_name):
+        row = self._conn.execute(
+            "SELECT id, total_sessions, total_works_analyzed, topics_worked, extra, version "
+            "FROM students WHERE name = ?", (student_name,)
+        ).fetchone()
+        if row is None:
+            return {}, 0
+
+        student_id = row[0]
+        # Дневные счетчики и недавние задания хранятся в extra и обновляются при каждой записи
+        progress_data = json.loads(row[4])
+        progress_data["statistics"] = dict(zip(STATISTICS_FIELDS, row[1:4]))
+
+        progress_data["topics"] = {
+            topic_row[0]: dict(zip(TOPIC_FIELDS, topic_row[1:]))
+            for topic_row in self._conn.execute(
+                "SELECT topic, " + ", ".join(TOPIC_FIELDS) + " FROM topic_state "
+                "WHERE student_id = ? ORDER BY rowid", (student_id,)
+            )
+        }
+
+        topics_by_session = {}
+        for session_id, topic in self._conn.execute(
+            "SELECT session_id, topic FROM session_topics WHERE student_id = ? "
+            "ORDER BY session_id, position", (student_id,)
+        ):
+            topics_by_session.setdefault(session_id, []).append(topic)
+
+        progress_data["sessions"] = [
+            {
+                "date": date,
+                "analyzed_text": analyzed_text,
+                "found_topics": topics_by_session.get(session_id, []),
+                "recommended_tasks": json.loads(recommended_tasks)
+            }
+            for session_id, date, analyzed_text, recommended_tasks in self._conn.execute(
+                "SELECT id, date, analyzed_text, recommended_tasks FROM sessions "
+                "WHERE student_id = ? ORDER BY id", (student_id,)
+            )
+        ]
+        return progress_data, row[5]
+
+    def save(self, student_name, progress_data, expected_version=None, base=None):
+        """Полностью перезаписывает данные одного ученика
+
+        Если задана expected_version, а данные ученика успел изменить другой процесс,
+        они сливаются (см. progress_records.merge_progress). Возвращает сохраненные
+        данные и их новую версию."""
+        with self._lock, self._conn:
+            # Блокировка записи берется сразу, чтобы версия не изменилась до конца транзакции
+            self._conn.execute("BEGIN IMMEDIATE")
+            student_id = self._student_id(student_name, create=True)
+            current_version = self._conn.execute(
+                "SELECT version FROM students WHERE id = ?", (student_id,)
+            ).fetchone()[0]
+            if expected_version is not None and expected_version != current_version:
+                theirs = ensure_structure(self._load(student_name)[0])
+                progress_data = merge_progress(base or sync_state(progress_data), progress_data, theirs)
+
+            progress_data = ensure_structure(dict(progress_data))
+            extra = {key: value for key, value in progress_data.items()
+                     if key not in ("topics", "sessions", "statistics")}
+            # История mastery хранится вместе с остальными данными ученика в компактном JSON
+            extra["mastery_history"] = progress_data["mastery_history"].to_json()
+            statistics = progress_data["statistics"]
+            self._conn.execute(
+                "UPDATE students SET total_sessions = ?, total_works_analyzed = ?, topics_worked = ?, "
+                "extra = ?, version = version + 1 WHERE id = ?",
+                tuple(statistics.get(field, 0) for field in STATISTICS_FIELDS)
+                + (json.dumps(extra, ensure_ascii=False), student_id)
+            )
+            self._conn.execute("DELETE FROM session_topics WHERE student_id = ?", (student_id,))
+            self._conn.execute("DELETE FROM sessions WHERE student_id = ?", (student_id,))
+            self._conn.execute("DELETE FROM topic_state WHERE student_id = ?", (student_id,))
+
+            for session in progress_data["sessions"]:
+                self._insert_session(student_id, session)
+
+            self._conn.executemany(
+                "INSERT INTO topic_state (student_id, topic, " + ", ".join(TOPIC_FIELDS) + ") "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(student_id, topic) + tuple(data[field] for field in TOPIC_FIELDS)
+                 for topic, data in progress_data["topics"].items()]
+            )
+            return progress_data, current_version + 1
+
+    def _insert_session(self, student_id, session):
+        session_id = self._conn.execute(
+            "INSERT INTO sessions (student_id, date, analyzed_text, recommended_tasks) VALUES (?, ?, ?, ?)",
+            (student_id, session["date"], session["analyzed_text"],
+             json.dumps(session["recommended_tasks"], ensure_ascii=False))
+        ).lastrowid
+        self._conn.executemany(
+            "INSERT INTO session_topics (session_id, student_id, topic, date, position) VALUES (?, ?, ?, ?, ?)",
+            [(session_id, student_id, topic, session["date"], position)
+             for position, topic in enumerate(session["found_topics"])]
+        )
+
+    def append(self, student_name, records):
+        """Применяет записи изменений (см. progress_records) в одной транзакции
+
+        Каждая запись увеличивает версию ученика на 1; возвращает новую версию."""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            student_id = self._student_id(student_name, create=True)
+            for record in records:
+                if record["type"] == RECORD_SESSION:
+                    self._append_session(student_id, record["session"])
+                    self._update_extra(student_id, lambda extra: self._append_session_extra(extra, record))
+                elif record["type"] == RECORD_MASTERY:
+                    self._append_mastery(student_id, record)
+                elif record["type"] == RECORD_TASK:
+                    self._update_extra(student_id, lambda extra: self._append_task_extra(extra, record))
+                else:
+                    raise ValueError(f"Неизвестный тип записи: {record['type']}")
+            self._conn.execute("UPDATE students SET version = version + ? WHERE id = ?", (len(records), student_id))
+            return self._conn.execute("SELECT version FROM students WHERE id = ?", (student_id,)).fetchone()[0]
+
+    def _append_session(self, student_id, session):
+        self._insert_session(student_id, session)
+        new_topics = 0
+        for topic in dict.fromkeys(session["found_topics"]):
+            exists = self._conn.execute(
+                "SELECT 1 FROM topic_state WHERE student_id = ? AND topic = ?", (student_id, topic)
+            ).fetchone()
+            if exists:
+                self._conn.execute(
+                    "UPDATE topic_state SET encounter_count = encounter_count + ?, last_practiced = ? "
+                    "WHERE student_id = ? AND topic = ?",
+                    (session["found_topics"].count(topic), session["date"], student_id, topic)
+                )
+            else:
+                self._conn.execute(
+                    "INSERT INTO topic_state (student_id, topic, " + ", ".join(TOPIC_FIELDS) + ") "
+                    "VALUES (?, ?, ?, ?, ?, 'medium', 0)",
+                    (student_id, topic, session["date"], session["found_topics"].count(topic), session["date"])
+                )
+                new_topics += 1
+
+        self._conn.execute(
+            "UPDATE students SET total_sessions = total_sessions + 1, "
+            "total_works_analyzed = total_works_analyzed + 1, topics_worked = topics_worked + ? WHERE id = ?",
+            (new_topics, student_id)
+        )
+
+    def _update_extra(self, student_id, update):
+        """Изменяет дополнительные данные ученика (столбец extra) функцией update(extra)"""
+        extra = json.loads(self._conn.execute("SELECT extra FROM students WHERE id = ?", (student_id,)).fetchone()[0])
+        update(extra)
+        self._conn.execute("UPDATE students SET extra = ? WHERE id = ?",
+                           (json.dumps(extra, ensure_ascii=False), student_id))
+
+    @staticmethod
+    def _append_session_extra(extra, record):
+        update_derived(extra, record)
+        if record.get("work"):
+            mark_processed_work(extra.setdefault("processed_works", {}), record["work"])
+
+    @staticmethod
+    def _append_task_extra(extra, record):
+        update_derived(extra, record)
+        remember_practice_task(extra.setdefault("practice_tasks", {}), record["topic"], record["task"], record["date"])
+
+    def _append_mastery(self, student_id, record):
+        row = self._conn.execute(
+            "SELECT mastery_score FROM topic_state WHERE student_id = ? AND topic = ?",
+            (student_id, record["topic"])
+        ).fetchone()
+        if row is None:
+            return
+        mastery, difficulty = compute_mastery(row[0], record["success_rate"])
+        self._conn.execute(
+            "UPDATE topic_state SET mastery_score = ?, difficulty_level = ? WHERE student_id = ? AND topic = ?",
+            (mastery, difficulty, student_id, record["topic"])
+        )
+
+        # Размер истории ограничен сроками хранения, поэтому она перезаписывается целиком
+        extra = json.loads(
+            self._conn.execute("SELECT extra FROM students WHERE id = ?", (student_id,)).fetchone()[0]
+        )
+        history = MasteryHistory.from_json(extra.get("mastery_history") or {})
+        history.add(record["topic"], record["date"], mastery)
+        extra["mastery_history"] = history.to_json()
+        self._conn.execute("UPDATE students SET extra = ? WHERE id = ?",
+                           (json.dumps(extra, ensure_ascii=False), student_id))
+
+    def iter_students(self):
+        """Перебирает пары (имя ученика, данные) по всем ученикам"""
+        for student_name in self.student_names():
+            yield student_name, self.load(student_name)
+
+    def import_students(self, students):
+        """Импортирует пары (имя ученика, данные), например из ShardedProgressStore.iter_students()"""
+        count = 0
+        for student_name, progress_data in students:
+            self.save(student_name, progress_data)
+            count += 1
+        return count
+
+    # Аналитические запросы
+
+    def recent_activity(self, student_name, since):
+        """Возвращает число сессий и активность по темам начиная с даты since"""
+        since = since.isoformat()
+        with self._lock:
+            student_id = self._student_id(student_name)
+            if student_id is None:
+                return 0, {}
+            sessions_count = self._conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE student_id = ? AND date >= ?", (student_id, since)
+            ).fetchone()[0]
+            topic_activity = dict(self._conn.execute(
+                "SELECT topic, COUNT(*) FROM session_topics WHERE student_id = ? AND date >= ? "
+                "GROUP BY topic ORDER BY MIN(rowid)", (student_id, since)
+            ))
+            return sessions_count, topic_activity
+
+    def weak_topics(self, student_name, min_encounters=2, max_mastery=70):
+        """Возвращает темы ученика, которые требуют повторения"""
+        with self._lock:
+            student_id = self._student_id(student_name)
+            if student_id is None:
+                return []
+            return [row[0] for row in self._conn.execute(
+                "SELECT topic FROM topic_state WHERE student_id = ? AND mastery_score < ? "
+                "AND encounter_count >= ? ORDER BY rowid", (student_id, max_mastery, min_encounters)
+            )]
+
+    def last_session_date(self, student_name):
+        """Возвращает дату последней сессии ученика (ISO-строка) или None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(s.date) FROM sessions s JOIN students st ON st.id = s.student_id WHERE st.name = ?",
+                (student_name,)
+            ).fetchone()
+            return row[0] if row else None
+
+    def students_weak_in_topic(self, topic, min_encounters=2, max_mastery=70):
+        """Возвращает учеников, у которых тема требует повторения, от самого низкого mastery"""
+        with self._lock:
+            return [tuple(row) for row in self._conn.execute(
+                "SELECT st.name, ts.mastery_score FROM topic_state ts JOIN students st ON st.id = ts.student_id "
+                "WHERE ts.topic = ? AND ts.mastery_score < ? AND ts.encounter_count >= ? "
+                "ORDER BY ts.mastery_score", (topic, max_mastery, min_encounters)
+            )]
+
+    def topic_activity_all(self, since):
+        """Возвращает активность по темам всех учеников начиная с даты since"""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT topic, COUNT(*) FROM session_topics WHERE date >= ? GROUP BY topic "
+                "ORDER BY COUNT(*) DESC", (since.isoformat(),)
+            ))
+
+    def student_names(self):
+        """Возвращает имена всех учеников"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT name FROM students ORDER BY name")]
+
+    def iter_topic_rows(self):
+        """Возвращает состояние тем всех учеников одним запросом (для аналитики по классу)
+
+        Строки - кортежи (ученик, тема, число встреч, последняя практика, mastery)."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT st.name, ts.topic, ts.encounter_count, ts.last_practiced, ts.mastery_score "
+                "FROM topic_state ts JOIN students st ON st.id = ts.student_id ORDER BY st.name"
+            ).fetchall()
@@ -1,143 +1,291 @@
-import json
-import os
+import threading
 from datetime import datetime, timedelta
 
+from instrumentation import timed
+from progress_records import (ACTIVITY_RETENTION_DAYS, apply_record, apply_to_sync_state, ensure_structure,
+                              mastery_record, session_record, sync_state, task_record)
+from progress_store import LEGACY_PROGRESS_FILE, get_default_store
+from repetition_scheduler import RepetitionScheduler
+from session_archive import archived_activity, get_default_archive, monthly_activity
+from work_store import LEGACY_WORKS_DIR, get_default_work_store
+
 # Используем абсолютные пути относительно расположения файлов
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-PROGRESS_FILE = os.path.join(BASE_DIR, "data", "progress.json")
-STUDENT_WORKS_DIR = os.path.join(BASE_DIR, "data", "student_data")
+PROGRESS_FILE = LEGACY_PROGRESS_FILE
+STUDENT_WORKS_DIR = LEGACY_WORKS_DIR
 
 class StudentProgress:
-    def __init__(self, student_name):
+    def __init__(self, student_name, store=None, write_behind=None, work_store=None, session_archive=None):
         self.student_name = student_name
-        self.progress_file = PROGRESS_FILE
-        self.works_dir = STUDENT_WORKS_DIR
+        self.store = store or get_default_store()
+        # Архив старых сессий (SessionArchive); None - общий архив приложения
+        self._session_archive = session_archive
+        # Объект WriteBehindWriter для отложенной записи изменений (None - запись сразу)
+        self.write_behind = write_behind
+        self.work_store = work_store or get_default_work_store()
+        # Защищает progress_data, когда изменения вносятся из фонового потока
+        self.lock = threading.RLock()
         self.load_progress()
     
+    @timed("persist.load_progress")
     def load_progress(self):
-        """Загружает прогресс ученика из файла"""
-        # Создаем директорию для данных, если ее нет
-        os.makedirs(os.path.dirname(self.progress_file), exist_ok=True)
-        
-        if os.path.exists(self.progress_file):
-            try:
-                with open(self.progress_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.progress_data = data.get(self.student_name, {})
-            except (json.JSONDecodeError, FileNotFoundError):
-                self.progress_data = {}
-        else:
+        """Загружает прогресс ученика из хранилища"""
+        # Версия данных в хранилище, с которой совпадают данные в памяти (None - хранилище без версий)
+        self.version = None
+        # Очередь тем по сроку повторения строится при первом обращении (см. get_scheduler)
+        self._scheduler = None
+        try:
+            if hasattr(self.store, "load_versioned"):
+                self.progress_data, self.version = self.store.load_versioned(self.student_name)
+            else:
+                self.progress_data = self.store.load(self.student_name)
+        except OSError as e:
+            print(f"Ошибка при загрузке прогресса: {e}")
             self.progress_data = {}
         
         # Инициализация структуры данных
-        if "topics" not in self.progress_data:
-            self.progress_data["topics"] = {}
-        if "sessions" not in self.progress_data:
-            self.progress_data["sessions"] = []
-        if "statistics" not in self.progress_data:
-            self.progress_data["statistics"] = {
-                "total_sessions": 0,
-                "total_works_analyzed": 0,
-                "topics_worked": 0
-            }
+        ensure_structure(self.progress_data)
+        # Счетчики на момент синхронизации с хранилищем - для слияния с изменениями других процессов
+        self._sync_state = sync_state(self.progress_data)
     
+    @timed("persist.save_progress")
     def save_progress(self):
-        """Сохраняет прогресс ученика в файл"""
-        # Создаем директории, если их нет
-        os.makedirs(os.path.dirname(self.progress_file), exist_ok=True)
-        
-        # Загружаем существующие данные
-        all_data = {}
-        if os.path.exists(self.progress_file):
-            try:
-                with open(self.progress_file, 'r', encoding='utf-8') as f:
-                    all_data = json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError):
-                all_data = {}
-        
-        # Обновляем данные текущего ученика
-        all_data[self.student_name] = self.progress_data
-        
-        # Сохраняем
+        """Сохраняет прогресс ученика в хранилище"""
+        # Полный снимок уже содержит все отложенные изменения
+        if self.write_behind:
+            self.write_behind.discard(self)
         try:
-            with open(self.progress_file, 'w', encoding='utf-8') as f:
-                json.dump(all_data, f, ensure_ascii=False, indent=2)
+            with self.lock:
+                if self.version is None:
+                    self.store.save(self.student_name, self.progress_data)
+                    return
+                # Если другой процесс успел изменить данные ученика, хранилище сольет их с нашими
+                self.progress_data, self.version = self.store.save(
+                    self.student_name, self.progress_data, self.version, self._sync_state
+                )
+                ensure_structure(self.progress_data)
+                self._sync_state = sync_state(self.progress_data)
+                # После слияния темы могли измениться
+                self._scheduler = None
         except Exception as e:
             print(f"Ошибка при сохранении прогресса: {e}")
     
-    def add_session(self, analyzed_text, found_topics, recommended_tasks):
-        """Добавляет информацию о сессии"""
-        session = {
-            "date": datetime.now().isoformat(),
-            "analyzed_text": analyzed_text[:100] + "..." if len(analyzed_text) > 100 else analyzed_text,
-            "found_topics": found_topics,
-            "recommended_tasks": recommended_tasks
-        }
-        
-        self.progress_data["sessions"].append(session)
-        self.progress_data["statistics"]["total_sessions"] += 1
-        self.progress_data["statistics"]["total_works_analyzed"] += 1
-        
-        # Обновляем статистику по темам
-        for topic in found_topics:
-            if topic not in self.progress_data["topics"]:
-                self.progress_data["topics"][topic] = {
-                    "first_encounter": datetime.now().isoformat(),
-                    "encounter_count": 0,
-                    "last_practiced": datetime.now().isoformat(),
-                    "difficulty_level": "medium",
-                    "mastery_score": 0  # 0-100 баллов
-                }
-                self.progress_data["statistics"]["topics_worked"] += 1
-            
-            self.progress_data["topics"][topic]["encounter_count"] += 1
-            self.progress_data["topics"][topic]["last_practiced"] = datetime.now().isoformat()
-        
-        self.save_progress()
+    @timed("persist.write_records")
+    def write_records(self, records):
+        """Дописывает записи изменений в хранилище (вызывается и из потока отложенной записи)"""
+        version = self.store.append(self.student_name, records)
+        with self.lock:
+            for record in records:
+                apply_to_sync_state(self._sync_state, record)
+            # Версия остается прежней, если между нашими записями были записи других процессов:
+            # тогда следующее полное сохранение сольет данные, а не перезапишет их
+            if self.version is not None and version == self.version + len(records):
+                self.version = version
+    
+    def _persist_records(self, records):
+        """Сохраняет изменения: дописывает записи в журнал или, если хранилище его не ведет, весь прогресс"""
+        if self.write_behind:
+            self.write_behind.submit(self, records)
+            return
+        if not hasattr(self.store, "append"):
+            self.save_progress()
+            return
+        try:
+            self.write_records(records)
+        except Exception as e:
+            print(f"Ошибка при сохранении прогресса: {e}")
+    
+    def flush(self):
+        """Немедленно сохраняет отложенные изменения ученика"""
+        if self.write_behind:
+            self.write_behind.flush(self)
+    
+    def _store_is_current(self):
+        """Проверяет, что в хранилище нет отставания от данных в памяти"""
+        return not self.write_behind or not self.write_behind.is_dirty(self)
+    
+    def add_session(self, analyzed_text, found_topics, recommended_tasks, work_id=None):
+        """Добавляет информацию о сессии; work_id - номер сохраненной работы (см. save_student_work)"""
+        record = session_record(analyzed_text, found_topics, recommended_tasks,
+                                work={"id": work_id} if work_id is not None else None)
+        with self.lock:
+            apply_record(self.progress_data, record)
+            self._reschedule(found_topics)
+            self._persist_records([record])
+    
+    def add_sessions(self, sessions):
+        """Добавляет несколько сессий одной записью в хранилище
+
+        sessions - список кортежей (analyzed_text, found_topics, recommended_tasks, date, work),
+        где work - отметка обработанной работы (см. progress_records.mark_processed_work) или None."""
+        records = []
+        with self.lock:
+            for analyzed_text, found_topics, recommended_tasks, date, work in sessions:
+                record = session_record(analyzed_text, found_topics, recommended_tasks, date, work)
+                apply_record(self.progress_data, record)
+                self._reschedule(found_topics)
+                records.append(record)
+            if records:
+                self._persist_records(records)
     
     def save_student_work(self, work_text, work_type="homework"):
-        """Сохраняет работу ученика в отдельный файл"""
-        # Создаем директории, если их нет
-        os.makedirs(self.works_dir, exist_ok=True)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        # Убираем проблемные символы из имени файла
-        safe_name = "".join(c for c in self.student_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-        filename = os.path.join(self.works_dir, f"{safe_name}_{work_type}_{timestamp}.txt")
-        
+        """Сохраняет работу ученика в хранилище работ; возвращает запись индекса (см. WorkStore.put) или None"""
+        try:
+            return self.work_store.put(self.student_name, work_text, work_type)
+        except Exception as e:
+            print(f"Ошибка при сохранении работы: {e}")
+            return None
+    
+    def save_student_work_file(self, path, work_type="homework"):
+        """Сохраняет работу ученика из файла, читая его по частям; возвращает запись индекса или None"""
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(work_text)
-            return True
+            return self.work_store.put_file(self.student_name, path, work_type)
         except Exception as e:
             print(f"Ошибка при сохранении работы: {e}")
-            return False
+            return None
+    
+    def get_processed_works(self):
+        """Возвращает отметки работ, уже учтенных в сессиях (см. progress_records.mark_processed_work)"""
+        return dict(self.progress_data.get("processed_works", {}))
+    
+    def get_student_works(self):
+        """Возвращает сданные работы ученика (номер, дата, тип, хэш и размер), от старых к новым"""
+        return self.work_store.list_works(self.student_name)
+    
+    def load_student_work(self, work_id):
+        """Возвращает текст сданной работы по ее номеру или None"""
+        return self.work_store.get_work(self.student_name, work_id)
+    
+    def get_recent_tasks(self, topic):
+        """Возвращает последние выданные задания по теме, от старых к новым"""
+        return list(self.progress_data["recent_tasks"].get(topic, ()))
+    
+    def get_task_context(self, topics):
+        """Возвращает уровни сложности и недавние задания по темам для подбора новых заданий"""
+        with self.lock:
+            difficulties = {
+                topic: self.progress_data["topics"].get(topic, {}).get("difficulty_level", "medium")
+                for topic in topics
+            }
+            recent_tasks = {topic: self.get_recent_tasks(topic) for topic in topics}
+        return difficulties, recent_tasks
+    
+    def remember_task(self, topic, task):
+        """Запоминает задание, выданное на тренировке, чтобы не повторять его в ближайшее время"""
+        record = task_record(topic, task)
+        with self.lock:
+            apply_record(self.progress_data, record)
+            self._persist_records([record])
     
     def get_weak_topics(self, min_encounters=2):
         """Возвращает темы, которые требуют повторения"""
+        # Хранилище с индексами отвечает запросом без перебора всех тем
+        if hasattr(self.store, "weak_topics") and self._store_is_current():
+            return self.store.weak_topics(self.student_name, min_encounters)
+        
         weak_topics = []
         for topic, data in self.progress_data["topics"].items():
-            if data["encounter_count"] >= min_encounters and data["mastery_score"] < 70:
+            if data.encounter_count >= min_encounters and data.mastery_score < 70:
                 weak_topics.append(topic)
         return weak_topics
     
+    def get_scheduler(self):
+        """Возвращает очередь тем по сроку повторения; после построения она обновляется по изменениям тем"""
+        with self.lock:
+            if self._scheduler is None:
+                self._scheduler = RepetitionScheduler.from_topics(self.progress_data["topics"])
+            return self._scheduler
+    
+    def _reschedule(self, topics):
+        """Пересчитывает сроки повторения измененных тем, O(log n) на тему"""
+        if self._scheduler is None:
+            return
+        for topic in topics:
+            data = self.progress_data["topics"].get(topic)
+            if data is not None:
+                self._scheduler.update_topic(topic, data)
+    
+    @property
+    def session_archive(self):
+        return self._session_archive or get_default_archive()
+    
+    def get_recent_activity(self, since):
+        """Возвращает число сессий и активность по темам (тема -> число сессий) начиная с даты since
+
+        Сессии, перенесенные в архив, учитываются по месячным итогам (см. session_archive)."""
+        sessions_count, topic_activity = self._get_current_activity(since)
+        archived_count, archived_topics = archived_activity(
+            self.progress_data, since, lambda month: self.session_archive.read_month(self.student_name, month)
+        )
+        if not archived_count:
+            return sessions_count, topic_activity
+        for topic, count in topic_activity.items():
+            archived_topics[topic] = archived_topics.get(topic, 0) + count
+        return sessions_count + archived_count, archived_topics
+    
+    def _get_current_activity(self, since):
+        """Возвращает активность начиная с даты since по сессиям, которые еще не в архиве
+
+        Хранилище с индексами по датам сессий отвечает запросом. Иначе, пока since не
+        старше срока хранения дневных счетчиков, ответ собирается из них по полным
+        календарным дням, и только сессии неполного первого дня (с since до полуночи)
+        отбираются по времени."""
+        if hasattr(self.store, "recent_activity") and self._store_is_current():
+            return self.store.recent_activity(self.student_name, since)
+        
+        if since.date() >= (datetime.now() - timedelta(days=ACTIVITY_RETENTION_DAYS)).date():
+            first_day = since.date()
+            if since != datetime.combine(first_day, datetime.min.time()):
+                first_day += timedelta(days=1)
+                sessions_count, topic_activity = self.progress_data["sessions"].activity_since(
+                    since, datetime.combine(first_day, datetime.min.time())
+                )
+            else:
+                sessions_count, topic_activity = 0, {}
+            first_day = first_day.isoformat()
+            for day in sorted(self.progress_data["activity"]):
+                if day < first_day:
+                    continue
+                bucket = self.progress_data["activity"][day]
+                sessions_count += bucket["sessions"]
+                for topic, count in bucket["topics"].items():
+                    topic_activity[topic] = topic_activity.get(topic, 0) + count
+            return sessions_count, topic_activity
+        
+        return self.progress_data["sessions"].activity_since(since)
+    
+    def get_monthly_activity(self):
+        """Возвращает число сессий и встреч тем по месяцам, включая архивные месяцы"""
+        with self.lock:
+            return monthly_activity(self.progress_data)
+    
+    def get_archived_sessions(self, since=None):
+        """Читает из архива сессии ученика начиная с даты since (по запросу, с диска)"""
+        return list(self.session_archive.iter_sessions(self.student_name, since))
+    
+    def get_last_session_date(self):
+        """Возвращает дату последней сессии или None, если сессий еще не было"""
+        last_session = self.progress_data["statistics"].get("last_session")
+        return datetime.fromisoformat(last_session) if last_session else None
+    
     def update_mastery(self, topic, success_rate):
         """Обновляет уровень mastery темы на основе успешности выполнения заданий"""
-        if topic in self.progress_data["topics"]:
-            # Простая формула для расчета mastery
-            current_mastery = self.progress_data["topics"][topic]["mastery_score"]
-            new_mastery = min(100, current_mastery + (success_rate - 50) * 0.5)
-            self.progress_data["topics"][topic]["mastery_score"] = max(0, new_mastery)
-            
-            # Обновляем уровень сложности
-            if new_mastery > 80:
-                self.progress_data["topics"][topic]["difficulty_level"] = "hard"
-            elif new_mastery > 50:
-                self.progress_data["topics"][topic]["difficulty_level"] = "medium"
-            else:
-                self.progress_data["topics"][topic]["difficulty_level"] = "easy"
-            
-            self.save_progress()
+        with self.lock:
+            if topic in self.progress_data["topics"]:
+                record = mastery_record(topic, success_rate)
+                apply_record(self.progress_data, record)
+                self._reschedule([topic])
+                self._persist_records([record])
+    
+    def get_mastery_trend(self, days=30, topic=None, now=None):
+        """Возвращает изменение mastery по темам за последние days дней или ряд одной темы
+
+        Без topic - словарь тема -> {"start", "end", "change", "points"}; с topic - пары
+        (ISO-дата, mastery). Старые точки - средние за день или неделю (см. mastery_history)."""
+        with self.lock:
+            history = self.progress_data["mastery_history"]
+            if topic is None:
+                return history.student_trend(days, now)
+            return history.topic_trend(topic, days, now)
     
     def get_progress_summary(self):
         """Возвращает сводку по прогрессу"""
@@ -0,0 +1,97 @@
+import random
+from bisect import bisect
+
+# Сколько случайных попыток делается, прежде чем отфильтровать недавние задания перебором
+MAX_ATTEMPTS = 8
+
+
+class TaskSelector:
+    """Выбор заданий без повторения недавно выданных
+
+    Недавние задания передаются списком от старых к новым (см.
+    StudentProgress.get_recent_tasks). Пока пул заданий заметно больше списка
+    недавних, задание выбирается случайными попытками, и стоимость выбора не
+    зависит ни от размера пула, ни от длины истории ученика.
+
+    Тема может задавать веса заданий в поле "task_weights" ({сложность: [веса]});
+    тогда задания выбираются пропорционально весам."""
+
+    def __init__(self, get_knowledge_base, rng=None):
+        # get_knowledge_base - функция, возвращающая текущую базу знаний
+        self._get_knowledge_base = get_knowledge_base
+        self.rng = rng or random.Random()
+        # (тема, сложность) -> (пул заданий, веса, накопленные веса)
+        self._cumulative = {}
+
+    def _pool(self, topic, difficulty):
+        knowledge_base = self._get_knowledge_base()
+        if topic in knowledge_base and difficulty in knowledge_base[topic]["tasks"]:
+            return knowledge_base[topic]["tasks"][difficulty]
+        return None
+
+    def _cumulative_weights(self, topic, difficulty, tasks):
+        """Возвращает накопленные веса заданий или None, если веса не заданы"""
+        weights = self._get_knowledge_base()[topic].get("task_weights", {}).get(difficulty)
+        cached = self._cumulative.get((topic, difficulty))
+        if cached and cached[0] is tasks and cached[1] is weights:
+            return cached[2]
+
+        cumulative = None
+        if weights and len(weights) == len(tasks):
+            cumulative = []
+            total = 0
+            for weight in weights:
+                total += max(weight, 0)
+                cumulative.append(total)
+            if not total:
+                cumulative = None
+        self._cumulative[(topic, difficulty)] = (tasks, weights, cumulative)
+        return cumulative
+
+    def _draw(self, tasks, cumulative):
+        if cumulative:
+            return tasks[bisect(cumulative, self.rng.random() * cumulative[-1])]
+        return tasks[self.rng.randrange(len(tasks))]
+
+    def select(self, topic, difficulty="medium", recent=()):
+        """Возвращает задание по теме, по возможности не из списка недавних, или None"""
+        tasks = self._pool(topic, difficulty)
+        if not tasks:
+            return None
+
+        cumulative = self._cumulative_weights(topic, difficulty, tasks)
+        recent_set = set(recent)
+        if not recent_set:
+            return self._draw(tasks, cumulative)
+
+        if len(tasks) > 2 * len(recent_set):
+            for _ in range(MAX_ATTEMPTS):
+                task = self._draw(tasks, cumulative)
+                if task not in recent_set:
+                    return task
+
+        # Пул мал по сравнению со списком недавних - он короткий, перебираем
+        candidates = [index for index, task in enumerate(tasks) if task not in recent_set]
+        if candidates:
+            if cumulative:
+                weights = [cumulative[index] - (cumulative[index - 1] if index else 0) for index in candidates]
+                if sum(weights):
+                    return tasks[self.rng.choices(candidates, weights)[0]]
+            return tasks[self.rng.choice(candidates)]
+
+        # Все задания выдавались недавно - берем то, что выдавалось раньше других
+        order = {task: position for position, task in enumerate(recent)}
+        return min(tasks, key=lambda task: order.get(task, -1))
+
+    def select_batch(self, requests, recent_by_topic=None):
+        """Выбирает задания сразу для многих тем
+
+        requests - пары (тема, сложность); возвращает словарь тема -> задание
+        только для тем, по которым задание нашлось."""
+        recent_by_topic = recent_by_topic or {}
+        selected = {}
+        for topic, difficulty in requests:
+            task = self.select(topic, difficulty, recent_by_topic.get(topic, ()))
+            if task:
+                selected[topic] = task
+        return selected
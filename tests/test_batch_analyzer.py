@@ -0,0 +1,44 @@
+from batch_analyzer import run_batch
+from benchmarks.generators import generate_text
+from knowledge_base import KNOWLEDGE_BASE
+from progress_store import ShardedProgressStore
+from student_progress import StudentProgress
+from work_store import WorkStore
+
+
+def snapshot(store, student_name):
+    progress_data = store.load(student_name)
+    return (len(progress_data["sessions"]), progress_data["statistics"]["total_sessions"],
+            {topic: data["encounter_count"] for topic, data in progress_data["topics"].items()})
+
+
+def test_rerun_does_not_count_works_twice(tmp_path):
+    store = ShardedProgressStore(str(tmp_path / "progress"), None)
+    work_store = WorkStore(str(tmp_path / "works"))
+    for seed in range(3):
+        work_store.put("Ученик 1", generate_text(KNOWLEDGE_BASE, 200, seed=seed))
+    work_store.put("Ученик 2", generate_text(KNOWLEDGE_BASE, 200, seed=10))
+
+    first = run_batch(workers=1, store=store, work_store=work_store)
+    after_first = {name: snapshot(store, name) for name in ("Ученик 1", "Ученик 2")}
+    second = run_batch(workers=1, store=store, work_store=work_store)
+    after_second = {name: snapshot(store, name) for name in ("Ученик 1", "Ученик 2")}
+
+    assert first["files"] == 4 and first["skipped"] == 0
+    assert second["files"] == 0 and second["skipped"] == 4
+    assert after_first == after_second
+    assert after_first["Ученик 1"][0] == 3
+
+
+def test_work_recorded_by_app_is_skipped(tmp_path):
+    store = ShardedProgressStore(str(tmp_path / "progress"), None)
+    work_store = WorkStore(str(tmp_path / "works"))
+    progress = StudentProgress("Ученик", store=store, work_store=work_store)
+    # Так работу сохраняет приложение: сдача в хранилище работ и сессия с ее номером
+    saved = progress.save_student_work(generate_text(KNOWLEDGE_BASE, 200, seed=1))
+    progress.add_session("Работа", ["Дроби"], {}, saved["id"])
+    work_store.put("Ученик", generate_text(KNOWLEDGE_BASE, 200, seed=2))
+
+    stats = run_batch(workers=1, store=store, work_store=work_store)
+    assert stats["files"] == 1 and stats["skipped"] == 1
+    assert snapshot(store, "Ученик")[0] == 2
@@ -0,0 +1,73 @@
+import math
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from cohort_analytics import CohortAnalytics, CohortMatrix
+from progress_store import ShardedProgressStore
+from sqlite_store import SQLiteProgressStore
+from student_progress import StudentProgress
+
+NOW = datetime(2024, 3, 1, 12, 0, 0)
+
+ROWS = [
+    ("Аня", "Дроби", 5, "2024-02-28T10:00:00", 90.0),
+    ("Аня", "Проценты", 3, "2024-02-28T10:00:00", 80.0),
+    ("Боря", "Дроби", 4, "2024-02-27T10:00:00", 40.0),
+    ("Боря", "Проценты", 1, "2024-02-27T10:00:00", 30.0),
+    ("Вика", "Дроби", 2, "2024-01-01T10:00:00", 60.0),
+]
+
+
+def make_analytics():
+    return CohortAnalytics(CohortMatrix.from_rows(ROWS, ["Аня", "Боря", "Вика", "Гоша"]))
+
+
+def test_averages():
+    analytics = make_analytics()
+    assert analytics.class_average() == pytest.approx(60.0)
+    averages = analytics.topic_averages()
+    assert averages["Дроби"] == pytest.approx(190 / 3)
+    assert averages["Проценты"] == pytest.approx(55.0)
+
+
+def test_weakest_topics():
+    # Дроби слабые у Бори и Вики, Проценты у Бори встречались один раз и слабыми не считаются
+    topic, share, average = make_analytics().weakest_topics()[0]
+    assert topic == "Дроби"
+    assert share == pytest.approx(2 / 3)
+    assert average == pytest.approx(190 / 3)
+
+
+def test_percentiles():
+    analytics = make_analytics()
+    assert analytics.topic_percentiles((0, 50, 100))["Дроби"] == pytest.approx([40.0, 60.0, 90.0])
+    ranks = analytics.student_percentiles()
+    assert ranks["Аня"] == pytest.approx(100.0)
+    assert ranks["Боря"] == pytest.approx(100 / 3)
+    assert math.isnan(ranks["Гоша"])
+
+
+def test_at_risk_students():
+    # Вика в группе риска из-за перерыва в занятиях; у Гоши нет ни одной темы
+    at_risk = make_analytics().at_risk_students(NOW)
+    assert [student for student, _, _, _ in at_risk] == ["Боря", "Вика"]
+    assert at_risk[0] == ("Боря", pytest.approx(35.0), 1, 3)
+    assert at_risk[1][3] == 60
+
+
+@pytest.mark.parametrize("backend", ["shards", "sqlite"])
+def test_matrix_from_store(tmp_path, backend):
+    if backend == "sqlite":
+        store = SQLiteProgressStore(str(tmp_path / "progress.sqlite3"))
+    else:
+        store = ShardedProgressStore(str(tmp_path / "shards"), None)
+    StudentProgress("Аня", store=store).add_session("Работа", ["Дроби", "Проценты"], {})
+    StudentProgress("Боря", store=store).add_session("Работа", ["Дроби"], {})
+
+    matrix = CohortMatrix.from_store(store)
+    assert sorted(matrix.students) == ["Аня", "Боря"]
+    assert sorted(matrix.topics) == ["Дроби", "Проценты"]
+    assert int(matrix.encounters.sum()) == 3
@@ -0,0 +1,43 @@
+import json
+
+import kb_loader
+from kb_loader import KnowledgeBase
+
+
+def make_kb(tmp_path):
+    source_dir = tmp_path / "subjects"
+    source_dir.mkdir(exist_ok=True)
+    (source_dir / "math.json").write_text(json.dumps(
+        {"topics": {"Дроби": {"keywords": ["дробь"], "description": "", "tasks": {}}}}, ensure_ascii=False
+    ), encoding="utf-8")
+    return KnowledgeBase(str(source_dir), str(tmp_path / "cache" / "kb.pickle"))
+
+
+def compile_counting(kb, builds):
+    def build(patterns):
+        builds.append(1)
+        return sorted(patterns)
+    return kb.compiled_matcher("morphology", build)
+
+
+def test_matcher_is_rebuilt_when_matcher_code_changes(tmp_path, monkeypatch):
+    builds = []
+    compile_counting(make_kb(tmp_path), builds)
+    compile_counting(make_kb(tmp_path), builds)
+    assert len(builds) == 1
+
+    # Изменился код стеммера или индекса - индекс из кэша не используется
+    monkeypatch.setattr(kb_loader, "_code_fingerprint", ("другой", "код"))
+    assert compile_counting(make_kb(tmp_path), builds) == [("дробь", "Дроби")]
+    assert len(builds) == 2
+
+
+def test_broken_cache_is_rebuilt(tmp_path):
+    builds = []
+    compile_counting(make_kb(tmp_path), builds)
+    (tmp_path / "cache" / "kb.pickle").write_bytes(b"\x80\x04not a pickle")
+
+    kb = make_kb(tmp_path)
+    assert compile_counting(kb, builds) == [("дробь", "Дроби")]
+    assert len(builds) == 2
+    assert "Дроби" in kb
@@ -0,0 +1,37 @@
+from keyword_matcher import KeywordMatcher
+
+
+def naive_matches(patterns, text):
+    """Все вхождения ключевых слов, найденные перебором"""
+    return sorted((start, start + len(keyword), keyword, label)
+                  for keyword, label in patterns if keyword
+                  for start in range(len(text)) if text.startswith(keyword, start))
+
+
+def test_finds_overlapping_and_nested_keywords():
+    patterns = [("he", "A"), ("she", "B"), ("his", "C"), ("hers", "D"), ("", "E")]
+    text = "ushers and his shes"
+    matcher = KeywordMatcher(patterns)
+    assert sorted(matcher.iter_matches(text)) == naive_matches(patterns, text)
+    assert matcher.find_labels(text) == {"A", "B", "C", "D"}
+
+
+def test_stream_finds_keywords_split_between_chunks():
+    patterns = [("дробь", "Дроби"), ("дроби", "Дроби"), ("уравнение", "Уравнения")]
+    text = "решили уравнение, сократили дробь и дроби"
+    matcher = KeywordMatcher(patterns)
+    for size in (1, 3, 7, len(text)):
+        stream = matcher.stream()
+        matches = []
+        for start in range(0, len(text), size):
+            matches.extend(stream.feed(text[start:start + size]))
+        matches.extend(stream.finish())
+        assert sorted(matches) == naive_matches(patterns, text)
+        for start, end, keyword, _ in matches:
+            assert text[start:end] == keyword
+
+
+def test_no_matches():
+    matcher = KeywordMatcher([("дробь", "Дроби")])
+    assert matcher.find_labels("уравнение") == set()
+    assert KeywordMatcher([]).find_labels("что угодно") == set()
@@ -0,0 +1,90 @@
+import json
+from datetime import datetime, timedelta
+
+from mastery_history import DAILY, RAW, WEEKLY, MasteryHistory, day_start, week_start
+from progress_model import from_epoch, to_epoch
+
+RETENTION = (2, 14, 56)
+START = datetime(2024, 1, 1, 9, 0, 0)
+
+
+def fill(history, days, per_day=3, first_day=0):
+    """Добавляет по per_day оценок темы «Дроби» в день: mastery растет на 1 с каждым днем"""
+    for day in range(first_day, days):
+        for hour in range(per_day):
+            history.add("Дроби", START + timedelta(days=day, hours=hour), day)
+
+
+def test_week_starts_on_monday():
+    monday = to_epoch(datetime(2024, 1, 1))
+    assert week_start(to_epoch(datetime(2024, 1, 7, 23, 59))) == monday
+    assert day_start(to_epoch(datetime(2024, 1, 3, 12))) == to_epoch(datetime(2024, 1, 3))
+
+
+def test_old_points_are_downsampled_and_size_is_bounded():
+    history = MasteryHistory(RETENTION)
+    fill(history, 200)
+    raw, daily, weekly = history.topics["Дроби"]
+
+    # Отдельные оценки - только за последние дни, старые дни - средними, старые недели удалены
+    assert len(raw) <= 3 * (RETENTION[0] + 1)
+    assert all(count == 3 for count in daily.counts)
+    assert all(count == 21 for count in weekly.counts)
+    assert len(weekly) <= RETENTION[2] // 7 + 1
+    # START - понедельник: неделя с i-го дня усредняет значения i..i+6
+    for time, value in zip(weekly.times, weekly.values):
+        first_day = (datetime.fromisoformat(from_epoch(time)) - START.replace(hour=0)).days
+        assert value == first_day + 3
+    assert weekly.times[0] >= week_start(to_epoch(START + timedelta(days=199 - RETENTION[2] - 7)))
+
+
+def test_queries():
+    history = MasteryHistory(RETENTION)
+    fill(history, 30)
+    now = START + timedelta(days=29, hours=3)
+
+    points = history.points("Дроби", START.replace(hour=0), now)
+    assert [time for time, _, _ in points] == sorted(time for time, _, _ in points)
+    assert sum(count for _, _, count in points) == 90
+    # День 20 - среднее за день, день 10 уже вошел в среднее за неделю с 7-го по 13-й день
+    assert history.value_before("Дроби", to_epoch(START + timedelta(days=20))) == 20
+    assert history.value_before("Дроби", to_epoch(START + timedelta(days=10))) == 10
+    assert history.value_before("Дроби", to_epoch(START.replace(hour=0))) is None
+    assert history.points("Проценты", START) == []
+
+    trend = history.student_trend(7, now)["Дроби"]
+    assert trend["start"] == 22 and trend["end"] == 29 and trend["change"] == 7
+    assert history.topic_trend("Дроби", 1, now)[-1] == ((START + timedelta(days=29, hours=2)).isoformat(), 29)
+
+
+def test_json_round_trip():
+    history = MasteryHistory(RETENTION)
+    fill(history, 60)
+    restored = MasteryHistory.from_json(json.loads(json.dumps(history.to_json())), RETENTION)
+    assert restored.to_json() == history.to_json()
+    for level in (RAW, DAILY, WEEKLY):
+        assert list(restored.topics["Дроби"][level].values) == list(history.topics["Дроби"][level].values)
+
+
+def test_merge_does_not_double_points():
+    ours = MasteryHistory(RETENTION)
+    fill(ours, 10)
+    theirs = ours.copy()
+    theirs.add("Дроби", START + timedelta(days=10), 50)
+    theirs.add("Проценты", START + timedelta(days=10), 20)
+
+    ours.merge(theirs)
+    assert ours.to_json() == theirs.to_json()
+
+
+def test_merge_with_a_history_downsampled_later():
+    ours = MasteryHistory(RETENTION)
+    fill(ours, 10)
+    theirs = ours.copy()
+    fill(theirs, 12, first_day=10)
+    # Обе стороны сливаются в одну и ту же историю, каждая оценка учтена один раз
+    merged = ours.copy()
+    merged.merge(theirs)
+    theirs_first = theirs.copy()
+    theirs_first.merge(ours)
+    assert merged.to_json() == theirs_first.to_json() == theirs.to_json()
@@ -0,0 +1,63 @@
+import pytest
+
+from analysis_cache import AnalysisCache
+from knowledge_base import DEFAULT_MATCH_MODE, MATCH_MODE_SUBSTRING, analyze_stream, get_topics_by_keywords
+from morphology import MIN_STEM_LENGTH, TokenIndex, normalize_token, stem
+
+SPELLING_TOPIC = "Правописание -ться/-тся"
+
+
+def test_stem_removes_inflection():
+    assert stem("дроби") == stem("дробь") == stem("дробями")
+    assert stem("Уравнения") == stem("уравнение")
+
+
+def test_short_stems_are_indexed_as_whole_words():
+    assert len(stem("учиться")) < MIN_STEM_LENGTH
+    assert normalize_token("учиться") == "учиться"
+    assert normalize_token("учу") != normalize_token("учиться")
+    assert normalize_token("бой") != normalize_token("боится")
+
+
+@pytest.mark.parametrize("text", [
+    "Бой был долгим",
+    "Я учу стихи",
+    "Мы учили правило",
+    "Заем у соседа",
+])
+def test_short_words_do_not_match_unrelated_keywords(text):
+    assert SPELLING_TOPIC not in get_topics_by_keywords(text, "morphology")
+
+
+@pytest.mark.parametrize("text", [
+    "Он хочет учиться",
+    "Ему нравится музыка",
+    "Ей нравиться рисовать",
+    "Они пытаются решить",
+])
+def test_inflected_forms_match(text):
+    assert SPELLING_TOPIC in get_topics_by_keywords(text, "morphology")
+
+
+def test_phrase_keywords_match_as_token_sequences():
+    index = TokenIndex([("общий знаменатель", "Дроби"), ("знаменатель", "Знаменатель")])
+    assert index.find_labels("Нашли общие знаменатели") == {"Дроби", "Знаменатель"}
+    assert index.find_labels("Общий ответ, знаменатель не нужен") == {"Знаменатель"}
+
+
+def test_substring_mode_is_default():
+    assert DEFAULT_MATCH_MODE == MATCH_MODE_SUBSTRING
+    assert get_topics_by_keywords("Он хочет учиться") == [SPELLING_TOPIC]
+
+
+@pytest.mark.parametrize("mode", [MATCH_MODE_SUBSTRING, "morphology"])
+def test_analyze_stream_gives_the_same_result_with_and_without_cache(mode, monkeypatch):
+    import knowledge_base
+    monkeypatch.setattr(knowledge_base, "ANALYSIS_CACHE", AnalysisCache())
+    text = "Надо привести к общему\nзнаменателю и  решить\tуравнение"
+    uncached = analyze_stream(text, mode, chunk_size=7, use_cache=False)
+    cached = analyze_stream(text, mode, chunk_size=7)
+    assert cached == uncached
+    assert analyze_stream(text, mode, chunk_size=7) == uncached
+    if mode == MATCH_MODE_SUBSTRING:
+        assert "Дроби" in uncached["topics"]
@@ -0,0 +1,82 @@
+import json
+from datetime import datetime
+
+from progress_model import SessionLog, TopicState, compact_progress, pack_progress, to_epoch, unpack_progress
+
+SESSIONS = [
+    {"date": "2024-02-01T10:00:00.123456", "analyzed_text": "Первая", "found_topics": ["Дроби", "Проценты"],
+     "recommended_tasks": {"Дроби": "Сократите 2/4"}},
+    {"date": "2024-02-02T09:30:00", "analyzed_text": "Вторая", "found_topics": [], "recommended_tasks": {}},
+    {"date": "2024-02-03T18:00:00", "analyzed_text": "Третья", "found_topics": ["Дроби"],
+     "recommended_tasks": {"Дроби": "Сократите 2/4", "Уравнения": "Решите x + 1 = 2"}},
+]
+
+TOPICS = {
+    "Дроби": {"first_encounter": "2024-02-01T10:00:00.123456", "encounter_count": 2,
+              "last_practiced": "2024-02-03T18:00:00", "difficulty_level": "hard", "mastery_score": 40},
+    "Проценты": {"first_encounter": "2024-02-01T10:00:00.123456", "encounter_count": 1,
+                 "last_practiced": "2024-02-01T10:00:00.123456", "difficulty_level": "medium", "mastery_score": 20},
+}
+
+
+def make_progress():
+    return {
+        "topics": {topic: dict(data) for topic, data in TOPICS.items()},
+        "sessions": [dict(session) for session in SESSIONS],
+        "statistics": {"total_sessions": 3, "topics_encountered": 2},
+        "recent_tasks": {"Дроби": ["Сократите 2/4"]}
+    }
+
+
+def test_pack_and_unpack_round_trip_through_json():
+    packed = json.loads(json.dumps(pack_progress(make_progress()), ensure_ascii=False))
+    progress_data = unpack_progress(packed)
+
+    assert isinstance(progress_data["sessions"], SessionLog)
+    assert list(progress_data["sessions"]) == SESSIONS
+    assert {topic: dict(state) for topic, state in progress_data["topics"].items()} == TOPICS
+    assert progress_data["statistics"] == {"total_sessions": 3, "topics_encountered": 2}
+    assert progress_data["recent_tasks"] == {"Дроби": ["Сократите 2/4"]}
+    assert "format" not in progress_data
+
+
+def test_compacted_data_packs_the_same_way():
+    assert pack_progress(compact_progress(make_progress())) == pack_progress(make_progress())
+
+
+def test_old_format_is_returned_as_is():
+    old = make_progress()
+    assert unpack_progress(old) is old
+
+
+def test_session_log_behaves_like_a_list():
+    log = SessionLog(SESSIONS)
+    assert len(log) == 3
+    assert log[-1] == SESSIONS[-1]
+    assert log[1:] == SESSIONS[1:]
+    assert log.found_topics(0) == ["Дроби", "Проценты"]
+    # Строки хранятся один раз
+    assert log.strings.strings.count("Дроби") == 1
+
+
+def test_activity_since():
+    log = SessionLog(SESSIONS)
+    assert log.activity_since(datetime(2024, 2, 2)) == (2, {"Дроби": 1})
+    assert log.activity_since(datetime(2024, 2, 1), datetime(2024, 2, 3)) == (2, {"Дроби": 1, "Проценты": 1})
+
+
+def test_split_keeps_only_strings_of_remaining_sessions():
+    old, log = SessionLog(SESSIONS).split(to_epoch("2024-02-02T00:00:00"))
+    assert old == SESSIONS[:1]
+    assert list(log) == SESSIONS[1:]
+    assert "Проценты" not in log.strings.strings
+
+
+def test_topic_state_as_mapping():
+    state = TopicState.from_dict(TOPICS["Дроби"])
+    assert dict(state) == TOPICS["Дроби"]
+    state["mastery_score"] = 55
+    state["last_practiced"] = "2024-03-01T00:00:00"
+    assert TopicState.from_row(state.to_row())["last_practiced"] == "2024-03-01T00:00:00"
+    assert state.to_row()[3] == 2
+    assert state["mastery_score"] == 55
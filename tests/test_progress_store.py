@@ -0,0 +1,53 @@
+from progress_records import session_record
+from progress_store import ShardedProgressStore
+
+
+def test_torn_journal_line_does_not_hide_later_records(tmp_path):
+    store = ShardedProgressStore(str(tmp_path / "shards"), None)
+    store.append("Ученик", [session_record("Первая", ["Дроби"], {})])
+    # Сбой посреди записи: строка обрезана, в том числе посреди многобайтового символа
+    line = '{"type":"session","session":{"analyzed_text":"Обрыв'.encode("utf-8")
+    with open(store.journal_path("Ученик"), 'ab') as f:
+        f.write(line[:-1])
+
+    store.append("Ученик", [session_record("Вторая", ["Уравнения"], {})])
+    store.append("Ученик", [session_record("Третья", ["Дроби"], {})])
+
+    reloaded = ShardedProgressStore(str(tmp_path / "shards"), None)
+    progress_data = reloaded.load("Ученик")
+    assert [session["analyzed_text"] for session in progress_data["sessions"]] == ["Первая", "Вторая", "Третья"]
+    assert progress_data["topics"]["Дроби"]["encounter_count"] == 2
+
+
+def test_corrupt_journal_line_is_skipped(tmp_path):
+    store = ShardedProgressStore(str(tmp_path / "shards"), None)
+    store.append("Ученик", [session_record("Первая", ["Дроби"], {})])
+    with open(store.journal_path("Ученик"), 'ab') as f:
+        f.write(b"not json\n")
+    store.append("Ученик", [session_record("Вторая", ["Дроби"], {})])
+
+    progress_data = ShardedProgressStore(str(tmp_path / "shards"), None).load("Ученик")
+    assert len(progress_data["sessions"]) == 2
+
+
+def test_student_names_and_iter_students(tmp_path):
+    store = ShardedProgressStore(str(tmp_path / "shards"), None)
+    long_name = "Ученик " + "я" * 2000
+    for student_name in ("Аня", long_name):
+        store.save(student_name, store.load(student_name))
+        store.append(student_name, [session_record("Работа", ["Дроби"], {})])
+
+    assert sorted(store.student_names()) == sorted(["Аня", long_name])
+    loaded = dict(store.iter_students())
+    assert sorted(loaded) == sorted(["Аня", long_name])
+    assert all(len(progress_data["sessions"]) == 1 for progress_data in loaded.values())
+
+
+def test_students_with_only_journal_records_are_listed(tmp_path):
+    store = ShardedProgressStore(str(tmp_path / "shards"), None)
+    store.append("Аня", [session_record("Работа", ["Дроби"], {})])
+    store.append("Аня", [session_record("Работа 2", ["Дроби"], {})])
+
+    reloaded = ShardedProgressStore(str(tmp_path / "shards"), None)
+    assert reloaded.student_names() == ["Аня"]
+    assert reloaded.load("Аня")["topics"]["Дроби"]["encounter_count"] == 2
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from progress_model import to_epoch
+from progress_store import ShardedProgressStore
+from repetition_scheduler import RepetitionScheduler, iter_plans, review_interval
+from sqlite_store import SQLiteProgressStore
+from student_progress import StudentProgress
+
+NOW = datetime(2024, 3, 4, 15, 0, 0)
+DAY = review_interval(0)
+
+
+def test_interval_doubles_with_mastery():
+    assert DAY == to_epoch(datetime(1970, 1, 2))
+    assert review_interval(40) == 4 * DAY
+    assert review_interval(100) == 32 * DAY
+    assert review_interval(-10) == DAY
+
+
+def test_upcoming_follows_updates_and_removals():
+    scheduler = RepetitionScheduler.from_rows([
+        ("Дроби", "2024-03-01T10:00:00", 0),
+        ("Проценты", "2024-03-01T10:00:00", 40),
+        ("Уравнения", "2024-02-10T10:00:00", 100),
+    ])
+    assert [topic for _, topic, _ in scheduler.upcoming(3)] == ["Дроби", "Проценты", "Уравнения"]
+
+    scheduler.schedule("Дроби", to_epoch("2024-03-04T10:00:00"), 80)
+    scheduler.remove("Проценты")
+    for _ in range(50):
+        scheduler.schedule("Уравнения", to_epoch("2024-02-10T10:00:00"), 100)
+    assert len(scheduler) == 2 and "Проценты" not in scheduler
+    assert scheduler.upcoming(5) == [
+        (to_epoch("2024-02-10T10:00:00") + 32 * DAY, "Уравнения", 100),
+        (to_epoch("2024-03-04T10:00:00") + 16 * DAY, "Дроби", 80),
+    ]
+    # Перестройка кучи не дает ей расти от недействительных элементов
+    assert len(scheduler._heap) <= 2 * len(scheduler) + 17
+
+
+def test_plan_puts_overdue_topics_first():
+    scheduler = RepetitionScheduler.from_rows([
+        ("Проценты", "2024-03-02T10:00:00", 40),
+        ("Дроби", "2024-02-20T10:00:00", 0),
+        ("Уравнения", "2024-03-03T10:00:00", 0),
+    ])
+    plan = scheduler.plan(NOW, days=7)
+    assert [day["date"] for day in plan] == [(NOW.date() + timedelta(days=i)).isoformat() for i in range(7)]
+    assert plan[0]["day"] == "Понедельник"
+    assert [day["topic"] for day in plan] == ["Дроби", "Уравнения", "Проценты", None, None, None, None]
+    assert plan[2]["due"] == "2024-03-06T10:00:00"
+
+
+@pytest.mark.parametrize("backend", ["shards", "sqlite"])
+def test_iter_plans_covers_every_student(tmp_path, backend):
+    if backend == "sqlite":
+        store = SQLiteProgressStore(str(tmp_path / "progress.sqlite3"))
+    else:
+        store = ShardedProgressStore(str(tmp_path / "shards"), None)
+    StudentProgress("Аня", store=store).add_session("Работа", ["Дроби"], {})
+    StudentProgress("Боря", store=store).add_session("Работа", ["Дроби", "Проценты"], {})
+
+    plans = dict(iter_plans(store, datetime.now() + timedelta(days=30), days=3))
+    assert sorted(plans) == ["Аня", "Боря"]
+    assert [day["topic"] for day in plans["Аня"]] == ["Дроби", None, None]
+    assert sorted(day["topic"] for day in plans["Боря"][:2]) == ["Дроби", "Проценты"]
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from progress_store import ShardedProgressStore
+from session_archive import SessionArchive, archive_cutoff, run_archival
+from sqlite_store import SQLiteProgressStore
+from student_progress import StudentProgress
+
+NOW = datetime.now()
+CUTOFF = archive_cutoff(NOW)
+
+
+def make_student(tmp_path, backend="shards"):
+    if backend == "sqlite":
+        store = SQLiteProgressStore(str(tmp_path / "progress.sqlite3"))
+    else:
+        store = ShardedProgressStore(str(tmp_path / "shards"), None)
+    archive = SessionArchive(str(tmp_path / "archive"))
+    progress = StudentProgress("Ученик", store=store, session_archive=archive)
+    # Две старые сессии в одном месяце, одна в другом и одна недавняя
+    progress.add_sessions([
+        ("Старая 1", ["Дроби"], {}, CUTOFF - timedelta(days=40), None),
+        ("Старая 2", ["Дроби", "Проценты"], {}, CUTOFF - timedelta(days=40, hours=-2), None),
+        ("Старая 3", ["Уравнения"], {}, CUTOFF - timedelta(days=1), None),
+        ("Новая", ["Дроби"], {}, NOW - timedelta(days=1), None),
+    ])
+    return store, archive, progress
+
+
+def test_cutoff_is_the_start_of_a_month():
+    assert CUTOFF.day == 1 and CUTOFF.hour == 0
+    assert CUTOFF <= NOW - timedelta(days=180)
+    with pytest.raises(ValueError):
+        archive_cutoff(NOW, horizon_days=7)
+
+
+@pytest.mark.parametrize("backend", ["shards", "sqlite"])
+def test_archived_sessions_stay_countable(tmp_path, backend):
+    store, archive, progress = make_student(tmp_path, backend)
+    since = CUTOFF - timedelta(days=60)
+    activity_before = progress.get_recent_activity(since)
+    monthly_before = progress.get_monthly_activity()
+
+    assert run_archival(store, archive, now=NOW)["sessions"] == 3
+    reloaded = StudentProgress("Ученик", store=store, session_archive=archive)
+    assert [session["analyzed_text"] for session in reloaded.progress_data["sessions"]] == ["Новая"]
+    assert reloaded.get_recent_activity(since) == activity_before
+    assert reloaded.get_monthly_activity() == monthly_before
+    # Активность с середины архивного месяца читается из архива
+    assert reloaded.get_recent_activity(CUTOFF - timedelta(days=2)) == (2, {"Уравнения": 1, "Дроби": 1})
+
+    archived = reloaded.get_archived_sessions()
+    assert [session["analyzed_text"] for session in archived] == ["Старая 1", "Старая 2", "Старая 3"]
+    assert len(archive.months("Ученик")) == 2
+
+    # Повторный запуск ничего не переносит
+    assert run_archival(store, archive, now=NOW)["sessions"] == 0
+
+
+def test_repeated_append_is_read_once(tmp_path):
+    archive = SessionArchive(str(tmp_path / "archive"))
+    session = {"date": "2024-01-05T10:00:00", "analyzed_text": "Работа", "found_topics": ["Дроби"],
+               "recommended_tasks": {}}
+    later = dict(session, date="2024-01-07T10:00:00")
+    # Архивирование прервалось после записи в архив и было повторено
+    archive.append("Ученик", "2024-01", [later, session])
+    archive.append("Ученик", "2024-01", [session])
+    assert archive.read_month("Ученик", "2024-01") == [session, later]
+    assert list(archive.iter_sessions("Ученик", datetime(2024, 1, 6))) == [later]
+    assert archive.read_month("Ученик", "2023-12") == []
@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from sqlite_store import SQLiteProgressStore
+from student_progress import StudentProgress
+
+
+def add_session_in_child(store, inherited_connection, student_name):
+    """Выполняется в дочернем процессе: соединение должно быть новым, а запись - дойти до базы"""
+    assert store._conn is not inherited_connection
+    StudentProgress(student_name, store=store).add_session("Работа из дочернего процесса", ["Дроби"], {})
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="нужен fork")
+def test_connection_is_reopened_after_fork(tmp_path):
+    store = SQLiteProgressStore(str(tmp_path / "progress.sqlite3"))
+    StudentProgress("Ученик", store=store).add_session("Работа", ["Дроби"], {})
+
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=add_session_in_child, args=(store, store._conn, "Ученик"))
+                 for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    # Соединение родителя продолжает работать и видит записи дочерних процессов
+    progress_data = store.load("Ученик")
+    assert len(progress_data["sessions"]) == 5
+    assert progress_data["topics"]["Дроби"]["encounter_count"] == 5
+    store.close()
+
+
+def test_derived_sections_are_stored_and_not_rebuilt_on_load(tmp_path, monkeypatch):
+    store = SQLiteProgressStore(str(tmp_path / "progress.sqlite3"))
+    progress = StudentProgress("Ученик", store=store)
+    progress.add_session("Работа", ["Дроби"], {"Дроби": "Задание 1"})
+    progress.remember_task("Дроби", "Задание 2")
+    progress.save_progress()
+    progress.add_session("Работа 2", ["Дроби", "Проценты"], {"Проценты": "Задание 3"})
+
+    import progress_records
+
+    def fail(progress_data):
+        raise AssertionError("разделы построены по всем сессиям")
+
+    monkeypatch.setattr(progress_records, "rebuild_activity", fail)
+    monkeypatch.setattr(progress_records, "rebuild_recent_tasks", fail)
+    reloaded = StudentProgress("Ученик", store=store)
+    assert reloaded.progress_data["activity"] == progress.progress_data["activity"]
+    assert reloaded.progress_data["recent_tasks"] == progress.progress_data["recent_tasks"]
+    store.close()
+
+
+def test_recent_activity_is_answered_by_the_store(tmp_path, monkeypatch):
+    store = SQLiteProgressStore(str(tmp_path / "progress.sqlite3"))
+    progress = StudentProgress("Ученик", store=store)
+    progress.add_session("Работа", ["Дроби"], {})
+
+    calls = []
+    recent_activity = store.recent_activity
+    monkeypatch.setattr(store, "recent_activity", lambda *args: calls.append(args) or recent_activity(*args))
+    since = datetime.now() - timedelta(days=7)
+    assert progress.get_recent_activity(since) == (1, {"Дроби": 1})
+    assert calls == [("Ученик", since)]
+    store.close()
+
+
+def test_derived_sections_of_older_rows_are_stored_on_first_load(tmp_path, monkeypatch):
+    store = SQLiteProgressStore(str(tmp_path / "progress.sqlite3"))
+    # Только дописывания: разделов в базе еще нет, как у данных, записанных раньше
+    StudentProgress("Ученик", store=store).add_session("Работа", ["Дроби"], {"Дроби": "Задание 1"})
+    assert StudentProgress("Ученик", store=store).progress_data["activity"]
+
+    import progress_records
+
+    def fail(progress_data):
+        raise AssertionError("разделы построены по всем сессиям")
+
+    monkeypatch.setattr(progress_records, "rebuild_activity", fail)
+    reloaded = StudentProgress("Ученик", store=store)
+    reloaded.add_session("Работа 2", ["Дроби"], {})
+    assert sum(bucket["sessions"] for bucket in store.load("Ученик")["activity"].values()) == 2
+    store.close()
@@ -0,0 +1,10 @@
+import pytest
+
+from benchmarks.stress_store import run
+
+
+@pytest.mark.parametrize("backend", ["shards", "sqlite"])
+def test_concurrent_writers_lose_nothing(tmp_path, backend):
+    # Уменьшенный вариант benchmarks/stress_store.py: 4 процесса по 50 операций
+    problems, _ = run(backend, str(tmp_path), processes=4, operations=50, students=2, compact_threshold=10)
+    assert problems == []
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from progress_store import ShardedProgressStore
+from sqlite_store import SQLiteProgressStore
+from student_progress import StudentProgress
+
+
+@pytest.fixture(params=["shards", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        store = SQLiteProgressStore(str(tmp_path / "progress.sqlite3"))
+        yield store
+        store.close()
+    else:
+        yield ShardedProgressStore(str(tmp_path / "shards"), None, compact_threshold=3)
+
+
+def test_practice_tasks_survive_reload(store):
+    progress = StudentProgress("Ученик", store=store)
+    progress.add_session("Работа", ["Дроби"], {"Дроби": "Задание из сессии"})
+    for number in range(4):
+        progress.remember_task("Дроби", f"Задание тренировки {number}")
+    expected = progress.get_recent_tasks("Дроби")
+    assert expected[-1] == "Задание тренировки 3"
+
+    reloaded = StudentProgress("Ученик", store=store)
+    assert reloaded.get_recent_tasks("Дроби") == expected
+
+    # Полное сохранение и последующая загрузка тоже сохраняют задания тренировки
+    reloaded.save_progress()
+    assert StudentProgress("Ученик", store=store).get_recent_tasks("Дроби") == expected
+
+
+def test_recent_activity_filters_partial_first_day_by_time(store):
+    progress = StudentProgress("Ученик", store=store)
+    since = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=7)
+    dates = [since - timedelta(days=1), since - timedelta(hours=2), since + timedelta(minutes=1),
+             since + timedelta(hours=13), datetime.now() - timedelta(days=1)]
+    progress.add_sessions([("Работа", ["Дроби"], {}, date, None) for date in dates])
+
+    sessions_count, topic_activity = progress.get_recent_activity(since)
+    assert sessions_count == 3
+    assert topic_activity == {"Дроби": 3}
+    # С полуночи учитывается весь день
+    midnight = since.replace(hour=0)
+    assert progress.get_recent_activity(midnight) == (4, {"Дроби": 4})
@@ -0,0 +1,78 @@
+import asyncio
+import json
+from functools import partial
+
+from progress_store import ShardedProgressStore
+from web_service import SchoolHelperService, StudentPool
+from work_store import WorkStore
+from write_behind import WriteBehindWriter
+
+
+async def send(port, request):
+    """Отправляет сырой запрос; возвращает код ответа и разобранный JSON"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(request)
+        await writer.drain()
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        headers = dict(line.lower().split(": ", 1) for line in head[1:] if line)
+        body = await reader.readexactly(int(headers["content-length"]))
+        return int(head[0].split(" ")[1]), json.loads(body)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+def run_with_service(tmp_path, scenario):
+    async def main():
+        service = SchoolHelperService(ShardedProgressStore(str(tmp_path / "progress"), None),
+                                      WorkStore(str(tmp_path / "works")))
+        server = await service.start("127.0.0.1", 0)
+        try:
+            return await scenario(server.sockets[0].getsockname()[1])
+        finally:
+            await service.close()
+    return asyncio.run(main())
+
+
+def test_negative_content_length_is_rejected(tmp_path):
+    async def scenario(port):
+        return await send(port, b"POST /analyze HTTP/1.1\r\nHost: x\r\nContent-Length: -5\r\n\r\n")
+
+    status, payload = run_with_service(tmp_path, scenario)
+    assert status == 400
+    assert "error" in payload
+
+
+def test_stats_and_trend(tmp_path):
+    async def scenario(port):
+        stats = await send(port, "GET /students/Ученик/stats HTTP/1.1\r\nHost: x\r\n\r\n".encode("utf-8"))
+        trend = await send(port, "GET /students/Ученик/trend?days=7 HTTP/1.1\r\nHost: x\r\n\r\n".encode("utf-8"))
+        return stats, trend
+
+    (stats_status, stats), (trend_status, trend) = run_with_service(tmp_path, scenario)
+    assert stats_status == 200 and stats["total_sessions"] == 0
+    assert trend_status == 200 and trend == {"topics": {}}
+
+
+def test_evicted_student_is_flushed_before_reload(tmp_path):
+    store = ShardedProgressStore(str(tmp_path / "progress"), None)
+    writer = WriteBehindWriter(delay=3600)
+
+    async def run_blocking(func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, partial(func, *args))
+
+    async def scenario():
+        pool = StudentPool(run_blocking, store, WorkStore(str(tmp_path / "works")), writer, max_size=1)
+        progress, _ = await pool.get("Аня")
+        progress.add_session("Работа", ["Дроби"], {})
+        await pool.get("Боря")
+        reloaded, _ = await pool.get("Аня")
+        return reloaded
+
+    try:
+        reloaded = asyncio.run(scenario())
+    finally:
+        writer.close()
+    assert reloaded.progress_data["statistics"]["total_sessions"] == 1
+    assert store.load("Аня")["statistics"]["total_sessions"] == 1
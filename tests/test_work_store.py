@@ -0,0 +1,57 @@
+import os
+from datetime import datetime
+
+from work_store import WorkStore
+
+
+def test_torn_index_lines_do_not_hide_later_works(tmp_path):
+    store = WorkStore(str(tmp_path / "works"))
+    store.put("Ученик", "Первая работа")
+    # Сбой посреди записи обоих индексов
+    with open(store.index_path, 'ab') as f:
+        f.write(b"0123abcd 1 0")
+    with open(store.student_index_path("Ученик"), 'ab') as f:
+        f.write('{"id": 2, "student": "Уче'.encode("utf-8"))
+
+    store.put("Ученик", "Вторая работа")
+    store.put("Ученик", "Третья работа")
+
+    reloaded = WorkStore(str(tmp_path / "works"))
+    works = reloaded.list_works("Ученик")
+    assert [entry["id"] for entry in works] == [1, 2, 3]
+    assert [reloaded.read_text(entry["hash"]) for entry in works] == ["Первая работа", "Вторая работа", "Третья работа"]
+    assert reloaded.stats()["blobs"] == 3
+    assert len(list(reloaded.iter_all_works())) == 3
+
+
+def test_corrupt_index_lines_are_skipped(tmp_path):
+    store = WorkStore(str(tmp_path / "works"))
+    store.put("Ученик", "Первая работа")
+    with open(store.index_path, 'ab') as f:
+        f.write(b"not an index line\n")
+    with open(store.student_index_path("Ученик"), 'ab') as f:
+        f.write(b"not json\n")
+    store.put("Ученик", "Вторая работа")
+
+    reloaded = WorkStore(str(tmp_path / "works"))
+    assert [entry["id"] for entry in reloaded.list_works("Ученик")] == [1, 2]
+    assert reloaded.get_work("Ученик", 2) == "Вторая работа"
+
+
+def test_interrupted_migration_does_not_duplicate_works(tmp_path):
+    legacy = tmp_path / "student_data"
+    legacy.mkdir()
+    (legacy / "Аня_homework_20240101_100000.txt").write_text("Работа 1", encoding="utf-8")
+    (legacy / "Аня_test_20240102_100000.txt").write_text("Работа 2", encoding="utf-8")
+
+    store = WorkStore(str(tmp_path / "works"))
+    # Миграция прервалась после первого файла: папка еще не переименована
+    store.put_file("Аня", str(legacy / "Аня_homework_20240101_100000.txt"), "homework",
+                   datetime(2024, 1, 1, 10, 0, 0))
+
+    assert store.migrate_legacy(str(legacy)) == 1
+    works = store.list_works("Аня")
+    assert [(entry["work_type"], store.read_text(entry["hash"])) for entry in works] == [
+        ("homework", "Работа 1"), ("test", "Работа 2")
+    ]
+    assert os.path.isdir(str(legacy) + ".migrated")
@@ -0,0 +1,54 @@
+from progress_store import ShardedProgressStore
+from student_progress import StudentProgress
+from write_behind import WriteBehindWriter
+
+
+class FlakyStore(ShardedProgressStore):
+    """Хранилище, у которого первые failures дописываний завершаются ошибкой"""
+
+    def __init__(self, root_dir, failures):
+        super().__init__(root_dir, None)
+        self.failures = failures
+
+    def append(self, student_name, records):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("диск недоступен")
+        return super().append(student_name, records)
+
+
+def test_failed_write_is_retried_before_newer_changes(tmp_path):
+    store = FlakyStore(str(tmp_path / "shards"), failures=1)
+    writer = WriteBehindWriter(delay=3600)
+    try:
+        progress = StudentProgress("Ученик", store=store, write_behind=writer)
+        progress.add_session("Первая", ["Дроби"], {})
+        writer.flush(progress)
+        assert writer.is_dirty(progress)
+
+        progress.add_session("Вторая", ["Дроби"], {})
+        writer.flush(progress)
+        assert not writer.is_dirty(progress)
+    finally:
+        writer.close()
+
+    sessions = store.load("Ученик")["sessions"]
+    assert [session["analyzed_text"] for session in sessions] == ["Первая", "Вторая"]
+    assert store.load("Ученик")["statistics"]["total_sessions"] == 2
+
+
+def test_discarded_changes_are_not_requeued(tmp_path):
+    store = FlakyStore(str(tmp_path / "shards"), failures=1)
+    writer = WriteBehindWriter(delay=3600)
+    try:
+        progress = StudentProgress("Ученик", store=store, write_behind=writer)
+        progress.add_session("Работа", ["Дроби"], {})
+        entry = writer._take(due_only=False)
+        # Полное сохранение во время неудачной записи уже содержит эти изменения
+        progress.save_progress()
+        writer._write(entry)
+        assert not writer.is_dirty(progress)
+    finally:
+        writer.close()
+
+    assert store.load("Ученик")["statistics"]["total_sessions"] == 1
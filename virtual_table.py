@@ -0,0 +1,153 @@
+"""Таблица Treeview, в которой создаются элементы только для видимых строк"""
+import tkinter as tk
+from tkinter import ttk
+
+# Высота строки и заголовка Treeview по умолчанию, пикселей (если стиль не задает свою)
+DEFAULT_ROW_HEIGHT = 20
+HEADER_HEIGHT = 24
+
+
+class VirtualTable:
+    """Таблица с сортировкой, которая показывает в Treeview только видимые строки
+
+    Все строки хранятся в памяти как кортежи значений, а в Treeview есть ровно
+    столько элементов, сколько строк помещается на экране. При прокрутке и
+    изменениях перезаписываются только элементы, значения которых изменились.
+    columns - список кортежей (заголовок, ширина, функция форматирования или None);
+    сортировка идет по исходным значениям, форматирование - только при показе."""
+
+    def __init__(self, parent, columns, sort_column=0, reverse=False):
+        self.frame = ttk.Frame(parent)
+        self.columns = columns
+        self.sort_column = sort_column
+        self.reverse = reverse
+
+        column_ids = [f"c{index}" for index in range(len(columns))]
+        self.tree = ttk.Treeview(self.frame, columns=column_ids, show="headings", selectmode="browse")
+        for index, (title, width, _) in enumerate(columns):
+            self.tree.heading(column_ids[index], text=title, command=lambda index=index: self.sort_by(index))
+            self.tree.column(column_ids[index], width=width, anchor=tk.W if index == 0 else tk.CENTER)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1, "units"))
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-1, "units"))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(1, "units"))
+
+        # Ключ строки -> значения; ключи в порядке сортировки
+        self._rows = {}
+        self._order = []
+        self._offset = 0
+        self._visible_count = 1
+        # Элементы Treeview и показанные в них отформатированные значения
+        self._items = []
+        self._shown = []
+        self._update_headings()
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def __len__(self):
+        return len(self._rows)
+
+    # Данные
+
+    def set_rows(self, rows):
+        """Заменяет все строки: rows - словарь ключ -> кортеж значений"""
+        self._rows = dict(rows)
+        self._sort()
+        self._offset = 0
+        self._render()
+
+    def update_rows(self, rows):
+        """Добавляет или изменяет только переданные строки (ключ -> кортеж значений)"""
+        if not rows:
+            return
+        new_keys = [key for key in rows if key not in self._rows]
+        resort = bool(new_keys) or any(
+            self._rows[key][self.sort_column] != values[self.sort_column] for key, values in rows.items()
+            if key in self._rows
+        )
+        self._rows.update(rows)
+        if resort:
+            self._sort()
+        self._render()
+
+    def clear(self):
+        self.set_rows({})
+
+    def _sort_key(self, key):
+        return self._rows[key][self.sort_column], key
+
+    def _sort(self):
+        self._order = sorted(self._rows, key=self._sort_key, reverse=self.reverse)
+
+    def sort_by(self, column):
+        """Сортирует по столбцу; повторный выбор того же столбца меняет направление"""
+        if column == self.sort_column:
+            self.reverse = not self.reverse
+        else:
+            self.sort_column, self.reverse = column, False
+        self._update_headings()
+        self._sort()
+        self._render()
+
+    def _update_headings(self):
+        for index, (title, _, _) in enumerate(self.columns):
+            mark = (" ▼" if self.reverse else " ▲") if index == self.sort_column else ""
+            self.tree.heading(f"c{index}", text=title + mark)
+
+    # Прокрутка и отображение
+
+    def _on_resize(self, event):
+        row_height = ttk.Style().lookup("Treeview", "rowheight") or DEFAULT_ROW_HEIGHT
+        visible_count = max(1, (event.height - HEADER_HEIGHT) // int(row_height))
+        if visible_count != self._visible_count:
+            self._visible_count = visible_count
+            self._render()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self._scroll_to(round(float(amount) * len(self._order)))
+        else:
+            self.scroll(int(amount), unit)
+
+    def scroll(self, amount, unit="units"):
+        step = self._visible_count if unit == "pages" else 1
+        self._scroll_to(self._offset + amount * step)
+
+    def _scroll_to(self, offset):
+        offset = max(0, min(offset, len(self._order) - self._visible_count))
+        if offset != self._offset:
+            self._offset = offset
+            self._render()
+
+    def _format(self, values):
+        return tuple(formatter(value) if formatter else value
+                     for value, (_, _, formatter) in zip(values, self.columns))
+
+    def _render(self):
+        """Приводит элементы Treeview к видимому окну строк, меняя только изменившиеся"""
+        self._offset = max(0, min(self._offset, len(self._order) - self._visible_count))
+        keys = self._order[self._offset:self._offset + self._visible_count]
+
+        while len(self._items) > len(keys):
+            self.tree.delete(self._items.pop())
+            self._shown.pop()
+        while len(self._items) < len(keys):
+            self._items.append(self.tree.insert("", tk.END))
+            self._shown.append(None)
+
+        for index, key in enumerate(keys):
+            values = self._format(self._rows[key])
+            if values != self._shown[index]:
+                self.tree.item(self._items[index], values=values)
+                self._shown[index] = values
+
+        total = len(self._order)
+        if total:
+            self.scrollbar.set(self._offset / total, min(1.0, (self._offset + len(keys)) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
@@ -0,0 +1,454 @@
+"""HTTP-сервис с ответами в JSON: анализ работ и прогресс учеников для многих клиентов
+
+Сервис работает в одном процессе на asyncio и не требует сторонних библиотек.
+Индекс базы знаний общий для всех запросов, а загруженные ученики хранятся в
+пуле (StudentPool) и не перечитываются с диска при каждом запросе. Анализ и
+работа с хранилищами выполняются в пуле потоков, поэтому цикл событий не
+блокируется; изменения прогресса сохраняются отложенной записью.
+
+Запросы:
+    POST /analyze                       {"text": ..., "student": ..., "mode": ..., "work_type": ...}
+    GET  /students/<имя>/weak-topics    ?min_encounters=2
+    GET  /students/<имя>/stats
+    GET  /students/<имя>/weekly-report
+    GET  /students/<имя>/plan
+    GET  /students/<имя>/trend          ?days=30&topic=...
+    GET  /health
+    GET  /metrics
+
+Пример запуска:
+    python web_service.py --port 8080 --pool-size 256
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import instrumentation
+import knowledge_base
+from analytics import Analytics
+from progress_store import ShardedProgressStore, get_default_store
+from student_progress import StudentProgress
+from work_store import WorkStore, get_default_work_store
+from write_behind import WriteBehindWriter
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+
+# Сколько учеников держать загруженными в памяти
+POOL_SIZE = 256
+
+# Ограничения запроса: размер заголовков и тела, байт
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 16 * 1024 * 1024
+# Тело больше этого размера разбирается из JSON в пуле потоков, байт
+INLINE_JSON_SIZE = 64 * 1024
+
+# Сколько ждать следующего запроса в открытом соединении, секунд
+KEEP_ALIVE_TIMEOUT = 15
+
+MATCH_MODES = (knowledge_base.MATCH_MODE_MORPHOLOGY, knowledge_base.MATCH_MODE_SUBSTRING)
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error"
+}
+
+
+class HTTPError(Exception):
+    """Ошибка запроса, которая возвращается клиенту с кодом status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class StudentPool:
+    """Загруженные ученики (StudentProgress и Analytics) с вытеснением давно не использованных
+
+    Ученик загружается в пуле потоков один раз, даже если его одновременно запросили
+    несколько клиентов. Несохраненные изменения вытесненного ученика сразу записываются
+    в хранилище, а повторная загрузка этого ученика дожидается записи."""
+
+    def __init__(self, run_blocking, store, work_store, writer, max_size=POOL_SIZE):
+        self.run_blocking = run_blocking
+        self.store = store
+        self.work_store = work_store
+        self.writer = writer
+        self.max_size = max_size
+        # Имя ученика -> (StudentProgress, Analytics), от давно использованных к недавним
+        self._students = OrderedDict()
+        # Имя ученика -> задача загрузки
+        self._loading = {}
+        # Имя вытесненного ученика -> задача записи его отложенных изменений
+        self._flushing = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, student_name):
+        """Возвращает (StudentProgress, Analytics) ученика, загружая его при первом обращении"""
+        entry = self._students.get(student_name)
+        if entry is not None:
+            self._students.move_to_end(student_name)
+            self.hits += 1
+            return entry
+
+        task = self._loading.get(student_name)
+        if task is None:
+            self.misses += 1
+            task = self._loading[student_name] = asyncio.ensure_future(self._load(student_name))
+        # Отключившийся клиент не должен отменять загрузку для остальных
+        return await asyncio.shield(task)
+
+    async def _load(self, student_name):
+        try:
+            flushing = self._flushing.get(student_name)
+            if flushing is not None:
+                await flushing
+            progress = await self.run_blocking(
+                StudentProgress, student_name, self.store, self.writer, self.work_store
+            )
+        finally:
+            del self._loading[student_name]
+        entry = self._students[student_name] = (progress, Analytics(progress))
+        while len(self._students) > self.max_size:
+            evicted_name, (evicted, _) = self._students.popitem(last=False)
+            self.evictions += 1
+            if self.writer.is_dirty(evicted):
+                self._flushing[evicted_name] = asyncio.ensure_future(self._flush(evicted_name, evicted))
+        return entry
+
+    async def _flush(self, student_name, progress):
+        """Записывает отложенные изменения вытесненного ученика"""
+        try:
+            await self.run_blocking(self.writer.flush, progress)
+        finally:
+            if self._flushing.get(student_name) is asyncio.current_task():
+                del self._flushing[student_name]
+
+    def stats(self):
+        return {
+            "students": len(self._students),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+def parse_request_head(head):
+    """Разбирает строку запроса и заголовки; возвращает (метод, путь, версия, заголовки)"""
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise HTTPError(400, "Некорректная строка запроса")
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, separator, value = line.partition(":")
+        if not separator:
+            raise HTTPError(400, "Некорректный заголовок")
+        headers[name.strip().lower()] = value.strip()
+    return method, target, version, headers
+
+
+def wants_keep_alive(version, headers):
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.1":
+        return connection != "close"
+    return connection == "keep-alive"
+
+
+class SchoolHelperService:
+    """Обработчики запросов сервиса и HTTP-сервер на asyncio"""
+
+    def __init__(self, store=None, work_store=None, pool_size=POOL_SIZE, workers=None):
+        self.executor = ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) + 4),
+                                           thread_name_prefix="service")
+        self.writer = WriteBehindWriter()
+        self.pool = StudentPool(self.run_blocking, store or get_default_store(),
+                                work_store or get_default_work_store(), self.writer, pool_size)
+        self.server = None
+        self.requests = 0
+        self.errors = 0
+        self._started = time.time()
+        # Запросы вне /students/<имя>/: путь -> (метод, обработчик)
+        self._routes = {
+            "analyze": ("POST", self.analyze),
+            "health": ("GET", self.health),
+            "metrics": ("GET", self.metrics)
+        }
+        # Запросы /students/<имя>/<действие>
+        self._student_routes = {
+            "weak-topics": self.weak_topics,
+            "stats": self.stats,
+            "weekly-report": self.weekly_report,
+            "plan": self.plan,
+            "trend": self.trend
+        }
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """Выполняет блокирующую функцию в пуле потоков сервиса"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    # Сервер и соединения
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        # Индекс ключевых слов строится до приема запросов, а не в первом из них
+        await self.run_blocking(knowledge_base.get_keyword_matcher)
+        self.server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_SIZE)
+        return self.server
+
+    async def close(self):
+        """Останавливает сервер и сохраняет все отложенные изменения"""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await self.run_blocking(self.writer.close)
+        self.executor.shutdown(wait=True)
+
+    async def handle_connection(self, reader, writer):
+        """Обслуживает соединение: запросы одного клиента по очереди, пока он держит соединение открытым"""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, 431, {"error": REASONS[431]}, False)
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+
+                started = time.perf_counter()
+                try:
+                    method, target, version, headers = parse_request_head(head)
+                    length = int(headers.get("content-length") or 0)
+                    if length < 0:
+                        raise HTTPError(400, "Некорректная длина тела запроса")
+                    if length > MAX_BODY_SIZE:
+                        raise HTTPError(413, "Слишком большой запрос")
+                except (HTTPError, ValueError) as e:
+                    status, message = (e.status, e.message) if isinstance(e, HTTPError) else (400, str(e))
+                    await self._send(writer, status, {"error": message}, False)
+                    break
+
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = wants_keep_alive(version, headers)
+                stage, status, payload = await self.dispatch(method, target, body)
+                await self._send(writer, status, payload, keep_alive)
+                if instrumentation.is_enabled():
+                    instrumentation.record(f"service.{stage}", time.perf_counter() - started)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _send(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    def resolve(self, method, path):
+        """Находит обработчик запроса; возвращает (этап для замеров, обработчик, аргументы)"""
+        parts = [unquote(part) for part in path.strip("/").split("/") if part]
+        if len(parts) == 1 and parts[0] in self._routes:
+            allowed, handler = self._routes[parts[0]]
+            if method != allowed:
+                raise HTTPError(405, f"Метод {method} не поддерживается")
+            return parts[0], handler, ()
+        if len(parts) == 3 and parts[0] == "students" and parts[2] in self._student_routes:
+            if method != "GET":
+                raise HTTPError(405, f"Метод {method} не поддерживается")
+            return parts[2], self._student_routes[parts[2]], (parts[1],)
+        raise HTTPError(404, f"Неизвестный адрес: {path}")
+
+    async def dispatch(self, method, target, body):
+        """Выполняет запрос; возвращает (этап для замеров, код ответа, данные ответа)"""
+        url = urlsplit(target)
+        self.requests += 1
+        stage = "unknown"
+        try:
+            stage, handler, args = self.resolve(method, url.path)
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            return stage, 200, await handler(*args, query=query, body=body)
+        except HTTPError as e:
+            self.errors += 1
+            return stage, e.status, {"error": e.message}
+        except Exception as e:
+            self.errors += 1
+            print(f"Ошибка при обработке запроса {method} {url.path}: {e}")
+            return stage, 500, {"error": "Внутренняя ошибка сервера"}
+
+    async def _parse_json(self, body):
+        if not body:
+            raise HTTPError(400, "Пустое тело запроса")
+        try:
+            if len(body) > INLINE_JSON_SIZE:
+                data = await self.run_blocking(json.loads, body)
+            else:
+                data = json.loads(body)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise HTTPError(400, f"Некорректный JSON: {e}")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Ожидается JSON-объект")
+        return data
+
+    # Обработчики запросов
+
+    async def analyze(self, query, body):
+        """Находит темы в тексте; если указан ученик, сохраняет работу и сессию в его прогресс"""
+        data = await self._parse_json(body)
+        text = data.get("text")
+        if not isinstance(text, str):
+            raise HTTPError(400, "Поле text должно быть строкой")
+        mode = data.get("mode")
+        if mode is not None and mode not in MATCH_MODES:
+            raise HTTPError(400, f"Неизвестный режим поиска: {mode}")
+        student_name = data.get("student")
+
+        analysis = await self.run_blocking(knowledge_base.analyze_stream, text, mode)
+        result = {"topics": analysis["topics"], "counts": analysis["counts"]}
+        if student_name:
+            progress, _ = await self.pool.get(str(student_name))
+            result["recommended_tasks"] = await self.run_blocking(
+                self._record_session, progress, text, analysis, data.get("work_type", "homework")
+            )
+        else:
+            result["recommended_tasks"] = knowledge_base.get_tasks_for_topics(
+                [(topic, "medium") for topic in analysis["topics"]]
+            )
+        return result
+
+    @staticmethod
+    def _record_session(progress, text, analysis, work_type):
+        """Подбирает задания по уровню ученика и сохраняет работу и сессию (выполняется в пуле потоков)"""
+        found_topics = analysis["topics"]
+        difficulties, recent_tasks = progress.get_task_context(found_topics)
+        recommended_tasks = knowledge_base.get_tasks_for_topics(
+            [(topic, difficulties[topic]) for topic in found_topics], recent_tasks
+        )
+        saved = progress.save_student_work(text, work_type)
+        progress.add_session(analysis["excerpt"], found_topics, recommended_tasks, saved["id"] if saved else None)
+        return recommended_tasks
+
+    async def weak_topics(self, student_name, query, body):
+        try:
+            min_encounters = int(query.get("min_encounters", 2))
+        except ValueError:
+            raise HTTPError(400, "min_encounters должно быть числом")
+        progress, _ = await self.pool.get(student_name)
+        # Хранилище с индексами отвечает запросом к диску
+        return {"weak_topics": await self.run_blocking(progress.get_weak_topics, min_encounters)}
+
+    async def stats(self, student_name, query, body):
+        progress, _ = await self.pool.get(student_name)
+        # Блокировка ученика может быть занята потоком пула, поэтому не в цикле событий
+        return await self.run_blocking(self._summary, progress)
+
+    @staticmethod
+    def _summary(progress):
+        with progress.lock:
+            return dict(progress.get_progress_summary())
+
+    async def weekly_report(self, student_name, query, body):
+        _, analytics = await self.pool.get(student_name)
+        return await self.run_blocking(analytics.get_weekly_report)
+
+    async def plan(self, student_name, query, body):
+        _, analytics = await self.pool.get(student_name)
+        return {"plan": await self.run_blocking(analytics.get_weekly_plan)}
+
+    async def trend(self, student_name, query, body):
+        try:
+            days = int(query.get("days", 30))
+        except ValueError:
+            raise HTTPError(400, "days должно быть числом")
+        progress, _ = await self.pool.get(student_name)
+        topic = query.get("topic")
+        trend = await self.run_blocking(progress.get_mastery_trend, days, topic)
+        return {"topic": topic, "points": trend} if topic else {"topics": trend}
+
+    async def health(self, query, body):
+        return {"status": "ok", "uptime": time.time() - self._started}
+
+    async def metrics(self, query, body):
+        """Счетчики сервиса, пула учеников, отложенной записи, кэша анализа и замеры этапов"""
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "pool": self.pool.stats(),
+            "write_behind": self.writer.stats(),
+            "analysis_cache": knowledge_base.get_analysis_cache_stats(),
+            "timings": instrumentation.snapshot()
+        }
+
+
+async def serve(host, port, store=None, work_store=None, pool_size=POOL_SIZE, workers=None):
+    """Запускает сервис и обслуживает запросы до остановки"""
+    service = SchoolHelperService(store, work_store, pool_size, workers)
+    await service.start(host, port)
+    print(f"Сервис запущен: http://{host}:{port}")
+    # SIGINT и SIGTERM останавливают сервис штатно, с сохранением отложенных изменений
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signal_number, stopped.set)
+        except (NotImplementedError, RuntimeError):
+            # На Windows сигналы в цикле событий не поддерживаются: остановка по Ctrl+C
+            pass
+    try:
+        await stopped.wait()
+    finally:
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP-сервис School Helper")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="адрес для приема соединений")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="порт")
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE, help="сколько учеников держать в памяти")
+    parser.add_argument("--workers", type=int, default=None, help="число потоков для анализа и работы с диском")
+    parser.add_argument("--data-dir", default=None,
+                        help="папка для прогресса и работ (по умолчанию - хранилища приложения)")
+    args = parser.parse_args()
+
+    store = work_store = None
+    if args.data_dir:
+        store = ShardedProgressStore(os.path.join(args.data_dir, "progress"), None)
+        work_store = WorkStore(os.path.join(args.data_dir, "works"))
+    try:
+        asyncio.run(serve(args.host, args.port, store, work_store, args.pool_size, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import codecs
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+import zlib
+from datetime import datetime
+
+from file_lock import FileLock, append_lines
+from instrumentation import timed
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKS_DIR = os.path.join(BASE_DIR, "data", "works")
+# Папка, куда работы раньше сохранялись отдельными файлами (используется только для миграции)
+LEGACY_WORKS_DIR = os.path.join(BASE_DIR, "data", "student_data")
+
+# Имя файла работы в старом формате: <ученик>_<тип работы>_<ГГГГММДД>_<ЧЧММСС>.txt
+LEGACY_WORK_FILE_RE = re.compile(r"^(?P<student>.+)_(?P<work_type>[^_]+)_(?P<date>\d{8}_\d{6})\.txt$")
+
+# После этого размера новые блобы пишутся в следующий пакет
+PACK_SIZE_LIMIT = 64 * 1024 * 1024
+COMPRESSION_LEVEL = 6
+READ_SIZE = 64 * 1024
+
+# Заголовок блоба в пакете: метка, SHA-256 текста, размер текста и размер сжатых данных
+BLOB_MAGIC = b"SHW1"
+BLOB_HEADER = struct.Struct(">4s32sQQ")
+
+
+def _student_key(student_name):
+    """Возвращает имя файла индекса ученика (как у шардов прогресса)"""
+    digest = hashlib.sha1(student_name.encode("utf-8")).hexdigest()[:10]
+    safe_name = "".join(c for c in student_name if c.isalnum() or c in ('-', '_'))[:40]
+    return f"{safe_name}_{digest}"
+
+
+def _iter_bytes(data):
+    """Перебирает куски байтов: data - строка, байты или двоичный файл"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if isinstance(data, bytes):
+        for start in range(0, len(data), READ_SIZE):
+            yield data[start:start + READ_SIZE]
+    else:
+        yield from iter(lambda: data.read(READ_SIZE), b"")
+
+
+def _read_entries(path):
+    """Читает индекс сдач ученика, пропуская недописанные и поврежденные строки"""
+    entries = []
+    try:
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _file_digest(path):
+    """Возвращает SHA-256 содержимого файла, читая его по частям"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in _iter_bytes(f):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class WorkStore:
+    """Хранилище работ учеников: сжатые тексты в нескольких больших файлах-пакетах
+
+    Текст хранится один раз, сколько бы раз его ни сдавали: блоб адресуется SHA-256
+    содержимого. Блобы дописываются в конец текущего пакета (packs/pack-NNNN.dat), а
+    их расположение - в индекс blobs.idx. У каждого ученика свой индекс сдач
+    (students/*.jsonl), поэтому список его работ читается без обхода папок.
+    Запись выполняется под файловой блокировкой и безопасна для нескольких процессов."""
+
+    def __init__(self, root_dir=WORKS_DIR):
+        self.root_dir = root_dir
+        self.packs_dir = os.path.join(root_dir, "packs")
+        self.students_dir = os.path.join(root_dir, "students")
+        self.index_path = os.path.join(root_dir, "blobs.idx")
+        os.makedirs(self.packs_dir, exist_ok=True)
+        os.makedirs(self.students_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(os.path.join(root_dir, "store.lock"))
+        # SHA-256 -> (номер пакета, смещение блоба, размер сжатых данных, размер текста)
+        self._blobs = {}
+        self._index_pos = 0
+
+    # Блобы
+
+    def pack_path(self, pack_number):
+        return os.path.join(self.packs_dir, f"pack-{pack_number:04d}.dat")
+
+    def _refresh_index(self):
+        """Дочитывает строки индекса блобов, добавленные с прошлого чтения (в том числе другими процессами)"""
+        try:
+            with open(self.index_path, 'rb') as f:
+                f.seek(self._index_pos)
+                for line in f:
+                    # Недописанная строка после сбоя: ее отрежет следующая запись (см. append_lines)
+                    if not line.endswith(b"\n"):
+                        break
+                    self._index_pos += len(line)
+                    try:
+                        digest, pack_number, offset, compressed_size, size = line.decode("ascii").split()
+                        location = (int(pack_number), int(offset), int(compressed_size), int(size))
+                    except ValueError:
+                        # Строка, склеенная с недописанной до исправления индекса
+                        continue
+                    self._blobs[digest] = location
+        except FileNotFoundError:
+            pass
+
+    def _current_pack(self):
+        """Возвращает номер пакета для записи нового блоба"""
+        numbers = [int(name[5:9]) for name in os.listdir(self.packs_dir)
+                   if name.startswith("pack-") and name.endswith(".dat")]
+        pack_number = max(numbers, default=1)
+        path = self.pack_path(pack_number)
+        if os.path.exists(path) and os.path.getsize(path) >= PACK_SIZE_LIMIT:
+            pack_number += 1
+        return pack_number
+
+    def _write_blob(self, chunks):
+        """Сжимает и дописывает блоб в пакет, если такого текста еще нет; возвращает хэш и размер
+
+        Вызывается под блокировкой хранилища."""
+        pack_number = self._current_pack()
+        path = self.pack_path(pack_number)
+        with open(path, 'ab'):
+            pass
+
+        with open(path, 'r+b') as f:
+            offset = f.seek(0, os.SEEK_END)
+            # Заголовок с хэшем записывается после данных, когда хэш уже посчитан
+            f.write(BLOB_HEADER.pack(BLOB_MAGIC, bytes(32), 0, 0))
+            digest = hashlib.sha256()
+            compressor = zlib.compressobj(COMPRESSION_LEVEL)
+            size = 0
+            for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                f.write(compressor.compress(chunk))
+            f.write(compressor.flush())
+            compressed_size = f.tell() - offset - BLOB_HEADER.size
+
+            hex_digest = digest.hexdigest()
+            if hex_digest in self._blobs:
+                # Такой текст уже сохранен - убираем дубликат
+                f.truncate(offset)
+                return hex_digest, size
+            f.seek(offset)
+            f.write(BLOB_HEADER.pack(BLOB_MAGIC, digest.digest(), size, compressed_size))
+
+        self._index_pos = append_lines(
+            self.index_path, [f"{hex_digest} {pack_number} {offset} {compressed_size} {size}\n".encode("ascii")]
+        )
+        self._blobs[hex_digest] = (pack_number, offset, compressed_size, size)
+        return hex_digest, size
+
+    def has_blob(self, digest):
+        with self._lock:
+            if digest not in self._blobs:
+                self._refresh_index()
+            return digest in self._blobs
+
+    def iter_text(self, digest, chunk_size=READ_SIZE):
+        """Перебирает текст работы кусками, распаковывая блоб по частям"""
+        with self._lock:
+            if digest not in self._blobs:
+                self._refresh_index()
+            location = self._blobs.get(digest)
+        if location is None:
+            raise KeyError(digest)
+
+        pack_number, offset, compressed_size, _ = location
+        decompressor = zlib.decompressobj()
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        with open(self.pack_path(pack_number), 'rb') as f:
+            f.seek(offset + BLOB_HEADER.size)
+            remaining = compressed_size
+            while remaining:
+                data = f.read(min(chunk_size, remaining))
+                if not data:
+                    raise OSError(f"Пакет {pack_number} обрезан")
+                remaining -= len(data)
+                text = decoder.decode(decompressor.decompress(data))
+                if text:
+                    yield text
+        text = decoder.decode(decompressor.flush(), final=True)
+        if text:
+            yield text
+
+    def read_text(self, digest):
+        """Возвращает текст работы по хэшу"""
+        return "".join(self.iter_text(digest))
+
+    # Сдачи учеников
+
+    def student_index_path(self, student_name):
+        return os.path.join(self.students_dir, _student_key(student_name) + ".jsonl")
+
+    @timed("persist.work_store.put")
+    def put(self, student_name, data, work_type="homework", date=None):
+        """Сохраняет сдачу работы: data - строка, байты или двоичный файл
+
+        Возвращает запись индекса ученика (номер сдачи, дата, тип, хэш и размер текста)."""
+        date = date or datetime.now()
+        with self._lock, self._file_lock:
+            self._refresh_index()
+            digest, size = self._write_blob(_iter_bytes(data))
+
+            index_path = self.student_index_path(student_name)
+            work_id = max((entry["id"] for entry in _read_entries(index_path)), default=0) + 1
+            entry = {
+                "id": work_id,
+                "student": student_name,
+                "date": date.isoformat(),
+                "work_type": work_type,
+                "hash": digest,
+                "size": size
+            }
+            append_lines(index_path, [(json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")])
+        return entry
+
+    def put_file(self, student_name, path, work_type="homework", date=None):
+        """Сохраняет сдачу работы из файла, читая его по частям"""
+        with open(path, 'rb') as f:
+            return self.put(student_name, f, work_type, date)
+
+    def list_works(self, student_name):
+        """Возвращает сдачи ученика из его индекса, от старых к новым"""
+        return _read_entries(self.student_index_path(student_name))
+
+    def get_work(self, student_name, work_id):
+        """Возвращает текст сдачи ученика по ее номеру или None"""
+        for entry in self.list_works(student_name):
+            if entry["id"] == work_id:
+                return self.read_text(entry["hash"])
+        return None
+
+    def iter_all_works(self):
+        """Перебирает сдачи всех учеников"""
+        for filename in sorted(os.listdir(self.students_dir)):
+            if not filename.endswith(".jsonl"):
+                continue
+            yield from _read_entries(os.path.join(self.students_dir, filename))
+
+    def stats(self):
+        """Возвращает число уникальных текстов, их суммарный размер и размер пакетов на диске"""
+        with self._lock:
+            self._refresh_index()
+            packs = [os.path.join(self.packs_dir, name) for name in os.listdir(self.packs_dir)]
+            return {
+                "blobs": len(self._blobs),
+                "text_bytes": sum(location[3] for location in self._blobs.values()),
+                "pack_bytes": sum(os.path.getsize(path) for path in packs)
+            }
+
+    def migrate_legacy(self, folder=LEGACY_WORKS_DIR):
+        """Однократно переносит работы из отдельных файлов старого формата"""
+        if not os.path.isdir(folder):
+            return 0
+
+        # Миграцию могут одновременно начать несколько процессов - выполняет ее первый
+        with FileLock(os.path.join(self.root_dir, "migration.lock")):
+            if not os.path.isdir(folder):
+                return 0
+            migrated = 0
+            # Ученик -> уже сохраненные сдачи: после прерванной миграции файлы не переносятся повторно
+            saved = {}
+            with os.scandir(folder) as entries:
+                files = sorted((entry.name, entry.path) for entry in entries if entry.is_file())
+            for filename, path in files:
+                match = LEGACY_WORK_FILE_RE.match(filename)
+                if not match:
+                    continue
+                try:
+                    date = datetime.strptime(match.group("date"), "%Y%m%d_%H%M%S")
+                except ValueError:
+                    continue
+                student_name = match.group("student")
+                if student_name not in saved:
+                    saved[student_name] = {(entry["date"], entry["work_type"], entry["hash"])
+                                           for entry in self.list_works(student_name)}
+                key = (date.isoformat(), match.group("work_type"), _file_digest(path))
+                if key in saved[student_name]:
+                    continue
+                self.put_file(student_name, path, match.group("work_type"), date)
+                saved[student_name].add(key)
+                migrated += 1
+
+            # Переименовываем старую папку, чтобы миграция не повторялась
+            os.replace(folder, folder + ".migrated")
+            return migrated
+
+
+_default_work_store = None
+
+
+def get_default_work_store():
+    """Возвращает общее хранилище работ приложения"""
+    global _default_work_store
+    if _default_work_store is None:
+        _default_work_store = WorkStore(WORKS_DIR)
+        try:
+            _default_work_store.migrate_legacy(LEGACY_WORKS_DIR)
+        except OSError as e:
+            print(f"Ошибка при миграции работ: {e}")
+    return _default_work_store
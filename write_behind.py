@@ -0,0 +1,149 @@
+import atexit
+import threading
+import time
+
+# Задержка перед записью изменений и размер пачки, после которого запись не откладывается
+FLUSH_DELAY = 2.0
+MAX_BATCH = 20
+
+
+class WriteBehindWriter:
+    """Отложенная запись прогресса: изменения копятся и сохраняются пачкой в фоновом потоке
+
+    Несколько изменений одного ученика объединяются в одну запись в хранилище:
+    одно дописывание в журнал или одно полное сохранение, если журнала нет."""
+
+    def __init__(self, delay=FLUSH_DELAY, max_batch=MAX_BATCH):
+        self.delay = delay
+        self.max_batch = max_batch
+        self._lock = threading.Condition()
+        # Сериализует запись в хранилища, чтобы пачки одного ученика не переставлялись
+        self._write_lock = threading.Lock()
+        # Ключ ученика -> [StudentProgress, записи, время первого изменения, число изменений, число discard]
+        self._pending = {}
+        # Ключ ученика -> число вызовов discard: изменения, сброшенные во время записи, не возвращаются в очередь
+        self._discards = {}
+        self._closed = False
+        self.mutations = 0
+        self.writes = 0
+        self.coalesced = 0
+        self._thread = threading.Thread(target=self._run, name="progress-write-behind", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _key(progress):
+        return id(progress.store), progress.student_name
+
+    def submit(self, progress, records):
+        """Помечает ученика измененным; записи будут сохранены позже"""
+        with self._lock:
+            entry = self._pending.get(self._key(progress))
+            if entry is None:
+                entry = self._pending[self._key(progress)] = [
+                    progress, [], time.monotonic(), 0, self._discards.get(self._key(progress), 0)
+                ]
+            entry[0] = progress
+            entry[1].extend(records)
+            entry[3] += 1
+            self.mutations += 1
+            if len(entry[1]) >= self.max_batch:
+                self._lock.notify()
+
+    def is_dirty(self, progress):
+        """Проверяет, есть ли у ученика несохраненные изменения"""
+        with self._lock:
+            # Пока идет запись, изменения могли еще не дойти до хранилища
+            return self._key(progress) in self._pending or self._write_lock.locked()
+
+    def discard(self, progress):
+        """Забывает несохраненные изменения ученика (например, перед полным сохранением)"""
+        with self._lock:
+            self._pending.pop(self._key(progress), None)
+            self._discards[self._key(progress)] = self._discards.get(self._key(progress), 0) + 1
+
+    def _take(self, due_only):
+        """Забирает из очереди изменения, которые пора сохранить"""
+        with self._lock:
+            now = time.monotonic()
+            keys = [key for key, (_, records, since, _, _) in self._pending.items()
+                    if not due_only or now - since >= self.delay or len(records) >= self.max_batch]
+            return [self._pending.pop(key) for key in keys]
+
+    def _requeue(self, entry):
+        """Возвращает в очередь изменения, которые не удалось сохранить, перед более новыми"""
+        progress, records, _, mutations, discards = entry
+        key = self._key(progress)
+        with self._lock:
+            # После discard изменения уже вошли в полный снимок
+            if self._discards.get(key, 0) != discards:
+                return
+            newer = self._pending.get(key)
+            if newer is not None:
+                progress, records, mutations = newer[0], records + newer[1], mutations + newer[3]
+            # Следующая попытка - не раньше чем через delay
+            self._pending[key] = [progress, records, time.monotonic(), mutations, discards]
+
+    def _write(self, entries):
+        for entry in entries:
+            progress, records, _, mutations, _ = entry
+            try:
+                if hasattr(progress.store, "append"):
+                    progress.write_records(records)
+                else:
+                    with progress.lock:
+                        progress.store.save(progress.student_name, progress.progress_data)
+                with self._lock:
+                    self.writes += 1
+                    self.coalesced += mutations - 1
+            except Exception as e:
+                print(f"Ошибка при сохранении прогресса: {e}")
+                self._requeue(entry)
+
+    def flush(self, progress=None):
+        """Немедленно сохраняет изменения одного ученика или всех учеников"""
+        with self._write_lock:
+            if progress is None:
+                entries = self._take(due_only=False)
+            else:
+                with self._lock:
+                    entry = self._pending.pop(self._key(progress), None)
+                entries = [entry] if entry else []
+            self._write(entries)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+                self._lock.wait(timeout=min(self.delay, 0.5))
+            with self._write_lock:
+                self._write(self._take(due_only=True))
+
+    def close(self):
+        """Сохраняет все изменения и останавливает фоновый поток"""
+        self.flush()
+        with self._lock:
+            self._closed = True
+            self._lock.notify()
+
+    def stats(self):
+        """Возвращает число изменений, фактических записей и сэкономленных объединением записей"""
+        with self._lock:
+            return {
+                "mutations": self.mutations,
+                "writes": self.writes,
+                "coalesced": self.coalesced,
+                "pending": sum(entry[3] for entry in self._pending.values())
+            }
+
+
+_default_writer = None
+
+
+def get_default_writer():
+    """Возвращает общий объект отложенной записи; при выходе из программы он сохраняет все изменения"""
+    global _default_writer
+    if _default_writer is None:
+        _default_writer = WriteBehindWriter()
+        atexit.register(_default_writer.close)
+    return _default_writer